@@ -0,0 +1,113 @@
+"""Check remove_lines against the per-line clear it replaced.
+
+The old clear removed full rows one at a time, bottom first: each row's
+golden cubes, score and buff were settled and the row deleted before the
+rows above it moved down and the next one was cleared. remove_lines does
+every row in one pass and must leave exactly the same game behind.
+
+    python -m pytest -q test_line_clears.py
+"""
+import random
+
+import pytest
+
+from tetris_engine import GRID_WIDTH, GRID_HEIGHT, BUFF_TYPES, COLORS, TetrisGame, pack_board
+
+def clear_one_at_a_time(game, lines):
+    """The old clear_single_line, applied bottom row first as the combo used to"""
+    pending = sorted(lines, reverse=True)
+    while pending:
+        line_y = pending.pop(0)
+        golden_cubes_cleared = bin(game.golden_rows[line_y]).count('1')
+        game.golden_count -= golden_cubes_cleared
+        row = game.grid[line_y]
+        for x in range(GRID_WIDTH):
+            game.remove_open_cell(row, x)
+        
+        del game.grid[line_y]
+        game.grid.insert(0, [None for _ in range(GRID_WIDTH)])
+        del game.golden_rows[line_y]
+        game.golden_rows.insert(0, 0)
+        if game.row_masks is not None:
+            del game.row_masks[line_y]
+            game.row_masks.insert(0, 0)
+        for x, top in enumerate(game.column_tops):
+            if top < line_y:
+                game.column_tops[x] = top + 1
+            elif top == line_y:
+                game.column_tops[x] = game.find_column_top(x, line_y + 1)
+        
+        game.lines_cleared += 1
+        game.golden_cubes_cleared += golden_cubes_cleared
+        multiplier = game.get_score_multiplier() * game.get_line_clear_bonus()
+        game.score += int(100 * game.level * multiplier)
+        if golden_cubes_cleared > 0:
+            game.activate_random_buff()
+        
+        # Rows above the cleared one moved down into its place
+        pending = [y + 1 if y < line_y else y for y in pending]
+    if game.row_masks is not None:
+        game.board_bits = pack_board(game.row_masks)
+
+def random_game(seed, bitboard):
+    """A game with some full rows among random ones, golden cubes and maybe score buffs active"""
+    rng = random.Random(seed)
+    game = TetrisGame(bitboard=bitboard, seed=seed, particle_capacity=0)
+    game.level = rng.randint(1, 10)
+    colors = list(COLORS.values())
+    height = rng.randint(2, 12)
+    full = set(rng.sample(range(GRID_HEIGHT - height, GRID_HEIGHT), rng.randint(1, min(4, height))))
+    for y in range(GRID_HEIGHT - height, GRID_HEIGHT):
+        row = [rng.choice(colors) if rng.random() < 0.7 else None for _ in range(GRID_WIDTH)]
+        if y in full:
+            row = [cell or rng.choice(colors) for cell in row]
+        elif None not in row:
+            row[rng.randrange(GRID_WIDTH)] = None
+        game.grid[y] = row
+    game.rebuild_bitboard()
+    game.rebuild_column_tops()
+    game.rebuild_cell_index()
+    
+    for y in range(GRID_HEIGHT - height, GRID_HEIGHT):
+        for x in range(GRID_WIDTH):
+            if game.grid[y][x] is not None and rng.random() < 0.15:
+                game.spawn_golden_cube(x, y)
+    for buff_type in ('score_multiplier', 'line_clear_bonus'):
+        if rng.random() < 0.3:
+            game.active_buffs[buff_type] = {'start_time': 0, 'duration': BUFF_TYPES[buff_type]['duration']}
+    return game, sorted(full)
+
+def state(game):
+    row_ys = {id(row): y for y, row in enumerate(game.grid)}
+    return {
+        'grid': game.grid,
+        'golden_rows': game.golden_rows,
+        'row_masks': game.row_masks,
+        'board_bits': game.board_bits,
+        'column_tops': game.column_tops,
+        'open_cells': [(row_ys[id(row)], x) for row, x in game.open_cells],
+        'golden_count': game.golden_count,
+        'golden_cubes_cleared': game.golden_cubes_cleared,
+        'score': game.score,
+        'lines_cleared': game.lines_cleared,
+        'active_buffs': game.active_buffs,
+        'buff_activations': game.buff_activations,
+        'fall_speed': game.fall_speed,
+        'can_hold': game.can_hold,
+        'rng': game.rng.getstate(),
+    }
+
+@pytest.mark.parametrize('bitboard', [True, False], ids=['bitboard', 'grid'])
+def test_remove_lines_matches_per_line_clear(bitboard):
+    buffs_mid_clear = 0
+    for seed in range(300):
+        game, lines = random_game(seed, bitboard)
+        baseline = game.clone(particle_capacity=0)
+        clear_one_at_a_time(baseline, lines)
+        game.remove_lines(lines)
+        expected, actual = state(baseline), state(game)
+        assert actual == expected, (seed, [key for key in expected if actual[key] != expected[key]])
+        if len(lines) > 1 and game.buff_activations:
+            buffs_mid_clear += 1
+    # Golden cubes in a lower row start a buff that must already apply to the rows above it
+    assert buffs_mid_clear > 20
@@ -0,0 +1,89 @@
+"""Cross-check enumerate_placements against a brute-force search through the game's own moves.
+
+    python -m pytest -q test_placements.py
+"""
+import random
+from collections import deque
+
+import pytest
+
+from tetris_engine import GRID_WIDTH, GRID_HEIGHT, COLORS, ROTATION_COUNTS, Tetromino, TetrisGame
+from tetris_placements import enumerate_placements
+
+MOVES = (
+    lambda game: game.move_piece(-1, 0),
+    lambda game: game.move_piece(1, 0),
+    lambda game: game.move_piece(0, 1),
+    lambda game: game.rotate_piece(clockwise=True),
+    lambda game: game.rotate_piece(clockwise=False),
+)
+
+def random_board(game, seed, height):
+    """Fill the bottom `height` rows at random, leaving overhangs and tuck spots but no full row"""
+    rng = random.Random(seed)
+    for y in range(GRID_HEIGHT - height, GRID_HEIGHT):
+        row = [(128, 128, 128) if rng.random() < 0.55 else None for _ in range(GRID_WIDTH)]
+        if None not in row:
+            row[rng.randrange(GRID_WIDTH)] = None
+        game.grid[y] = row
+    game.rebuild_bitboard()
+    game.rebuild_column_tops()
+    game.rebuild_cell_index()
+
+def brute_force_placements(game, piece_type):
+    """Every resting (rotation, x, y) found by trying each move_piece and rotate_piece from each state"""
+    start = Tetromino(piece_type)
+    if not game.is_valid_position(start):
+        return set()
+    count = ROTATION_COUNTS[piece_type]
+    seen = {(start.rotation % count, start.x, start.y)}
+    queue = deque(seen)
+    resting = set()
+    while queue:
+        state = queue.popleft()
+        for move in MOVES:
+            game.current_piece = Tetromino(piece_type, state[1], state[2], state[0])
+            if move(game):
+                piece = game.current_piece
+                moved = (piece.rotation % count, piece.x, piece.y)
+                if moved not in seen:
+                    seen.add(moved)
+                    queue.append(moved)
+        game.current_piece = Tetromino(piece_type, state[1], state[2], state[0])
+        if not game.move_piece(0, 1):
+            resting.add(state)
+    return resting
+
+def boards():
+    yield 'empty', None, 0
+    for seed in range(6):
+        yield f'random{seed}', seed, 4 + seed * 2
+
+@pytest.mark.parametrize('bitboard', [True, False], ids=['bitboard', 'grid'])
+@pytest.mark.parametrize('name, seed, height', list(boards()))
+def test_matches_brute_force(bitboard, name, seed, height):
+    game = TetrisGame(bitboard=bitboard, seed=1, particle_capacity=0)
+    if seed is not None:
+        random_board(game, seed, height)
+    for piece_type in COLORS:
+        piece = Tetromino(piece_type)
+        found = {(p.rotation, p.x, p.y) for p in enumerate_placements(game, piece)}
+        assert found == brute_force_placements(game, piece_type), piece_type
+
+@pytest.mark.parametrize('seed', range(4))
+def test_paths_lock_at_placement(seed):
+    game = TetrisGame(bitboard=True, seed=1, particle_capacity=0)
+    random_board(game, seed, 6)
+    for piece_type in COLORS:
+        for placement in enumerate_placements(game, Tetromino(piece_type)):
+            copy = game.clone(particle_capacity=0)
+            copy.current_piece = Tetromino(piece_type)
+            path = placement.path
+            assert path[-1] == 'hard_drop'
+            for action in path:
+                copy.apply_action(action)
+            if copy.lines_cleared != game.lines_cleared:
+                continue  # The placement completed a line and the rows above moved down
+            locked = {(x, y) for y, row in enumerate(copy.grid) for x, cell in enumerate(row)
+                      if cell is not None and game.grid[y][x] is None}
+            assert locked == set(placement.get_cells()), (piece_type, placement, path)
@@ -0,0 +1,380 @@
+"""Microbenchmarks for the engine and renderer hot paths, with JSON baselines.
+
+Every benchmark builds its own board from a fixed seed, so numbers are
+comparable between commits on the same machine. Rendering goes to an
+offscreen display through SDL's dummy video driver.
+
+    python tetris_bench.py                       # run everything and print
+    python tetris_bench.py --save bench.json     # store a baseline
+    python tetris_bench.py --compare bench.json  # exit 1 if anything got >10% slower
+    python tetris_bench.py --compare bench.json --threshold 0.25 -k draw
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+from collections import namedtuple
+
+from tetris_engine import (
+    GRID_WIDTH, GRID_HEIGHT, GAME_WIDTH, GAME_HEIGHT, COLORS, ROTATION_COUNTS, SHAPES,
+    Tetromino, TetrisGame, get_wall_kicks,
+)
+from tetris_particles import PARTICLE_STEP_MS, ParticlePool, ParticleSystem, np
+from tetris_snapshot import SnapshotEncoder
+
+BASELINE_VERSION = 1
+SEED = 1234
+
+# run() is timed; reset(), if given, restores state before every run outside the timing.
+# ops is how many operations one run() performs, results are per operation.
+Case = namedtuple('Case', 'run reset ops', defaults=(None, 1))
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+def seeded_game(bitboard=False, height=12, holes=2, seed=SEED):
+    """A game whose bottom `height` rows are filled except `holes` random cells per row"""
+    game = TetrisGame(bitboard=bitboard, seed=seed)
+    game.settings['particle_effects'] = False
+    rng = random.Random(seed)
+    colors = list(COLORS.values())
+    rows = [[None] * GRID_WIDTH for _ in range(GRID_HEIGHT - height)]
+    for _ in range(height):
+        gaps = rng.sample(range(GRID_WIDTH), holes)
+        rows.append([None if x in gaps else rng.choice(colors) for x in range(GRID_WIDTH)])
+    load_grid(game, rows)
+    return game
+
+def load_grid(game, rows):
+    game.grid = [list(row) for row in rows]
+    game.rebuild_bitboard()
+    game.golden_rows = [0] * GRID_HEIGHT
+    game.rebuild_column_tops()
+    game.rebuild_cell_index()
+
+def fill_rows(rows, count):
+    """Copy of rows with the bottom `count` rows made full"""
+    rows = [list(row) for row in rows]
+    for y in range(GRID_HEIGHT - count, GRID_HEIGHT):
+        rows[y] = [cell if cell is not None else COLORS['I'] for cell in rows[y]]
+    return rows
+
+def random_pieces(count, seed=SEED):
+    rng = random.Random(seed)
+    return [Tetromino(rng.choice(list(SHAPES)), rng.randrange(-1, GRID_WIDTH - 1),
+                      rng.randrange(0, GRID_HEIGHT - 2), rng.randrange(4))
+            for _ in range(count)]
+
+def kick_cases(game, count=32):
+    """Rotations on game's board that need a wall kick beyond the first offset"""
+    rng = random.Random(SEED)
+    cases = []
+    while len(cases) < count:
+        piece = random_pieces(1, rng.random())[0]
+        if not game.is_valid_position(piece) or piece.type == 'O':
+            continue
+        clockwise = rng.random() < 0.5
+        step = 1 if clockwise else -1
+        old_rotation = piece.rotation % ROTATION_COUNTS[piece.type]
+        new_rotation = (old_rotation + step) % ROTATION_COUNTS[piece.type]
+        kicks = get_wall_kicks(piece.type, old_rotation, new_rotation)
+        if not game.is_valid_position(piece, *kicks[0], step):
+            cases.append((piece.type, piece.x, piece.y, piece.rotation, clockwise))
+    return cases
+
+def register_engine_benchmarks(backend):
+    bitboard = backend == 'bitboard'
+    
+    @benchmark(f'is_valid_position/{backend}')
+    def _():
+        game = seeded_game(bitboard)
+        pieces = random_pieces(64)
+        is_valid_position = game.is_valid_position
+        
+        def run():
+            for piece in pieces:
+                is_valid_position(piece)
+        return Case(run, ops=len(pieces))
+    
+    @benchmark(f'rotate_piece/{backend}')
+    def _():
+        game = seeded_game(bitboard, height=4)
+        piece = Tetromino('T', 4, 2)
+        game.current_piece = piece
+        
+        def run():
+            for _ in range(4):
+                game.rotate_piece(clockwise=True)
+        return Case(run, ops=4)
+    
+    @benchmark(f'rotate_piece_kicks/{backend}')
+    def _():
+        game = seeded_game(bitboard, height=14, holes=3)
+        cases = kick_cases(game)
+        piece = Tetromino('T')
+        game.current_piece = piece
+        
+        def run():
+            for piece.type, piece.x, piece.y, piece.rotation, clockwise in cases:
+                game.rotate_piece(clockwise)
+        return Case(run, ops=len(cases))
+    
+    @benchmark(f'get_ghost_position/{backend}')
+    def _():
+        game = seeded_game(bitboard, holes=3)
+        pieces = [Tetromino(piece.type, piece.x, 0, piece.rotation) for piece in random_pieces(64)]
+        pieces = [piece for piece in pieces if game.is_valid_position(piece)]
+        
+        def run():
+            for piece in pieces:
+                game.current_piece = piece
+                game.get_ghost_position()
+        return Case(run, ops=len(pieces))
+    
+    @benchmark(f'clear_lines/{backend}')
+    def _():
+        game = seeded_game(bitboard)
+        rows = fill_rows(game.grid, 1)
+        
+        def reset():
+            load_grid(game, rows)
+        return Case(game.clear_lines, reset)
+    
+    @benchmark(f'spawn_random_golden_cube/{backend}')
+    def _():
+        game = seeded_game(bitboard)
+        rows = game.grid
+        
+        def reset():
+            load_grid(game, rows)
+        return Case(game.spawn_random_golden_cube, reset)
+    
+    @benchmark(f'combo_clear/{backend}')
+    def _():
+        game = seeded_game(bitboard)
+        rows = fill_rows(game.grid, 4)
+        
+        def reset():
+            load_grid(game, rows)
+        
+        def run():
+            game.clear_lines()
+            while game.combo_active:
+                game.update(game.combo_delay)
+        return Case(run, reset)
+
+for _backend in ('grid', 'bitboard'):
+    register_engine_benchmarks(_backend)
+
+def heavy_particles(particles, count=5000, seed=SEED):
+    """Fill a particle backend with `count` long-lived particles"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        particles.emit(rng.uniform(0, GAME_WIDTH), rng.uniform(0, GAME_HEIGHT),
+                       (255, rng.randrange(256), 0), rng.uniform(-4, 4), rng.uniform(-6, 2),
+                       rng.randint(2, 6), 10 ** 9)
+    return particles
+
+def register_particle_benchmark(name, backend):
+    @benchmark(f'update_particles/{name}')
+    def _():
+        game = TetrisGame(seed=SEED)
+        game.particles = heavy_particles(backend(GAME_WIDTH, GAME_HEIGHT, capacity=5000, budget=5000))
+        
+        def run():
+            game.update_particles(PARTICLE_STEP_MS)
+        return Case(run, ops=len(game.particles))
+
+register_particle_benchmark('pool', ParticlePool)
+if np is not None:
+    register_particle_benchmark('numpy', ParticleSystem)
+
+def render_setup():
+    """Offscreen display and a mid-game board with golden cubes and particles"""
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    import tetris_pygame
+    
+    screen = pygame.display.set_mode((tetris_pygame.WINDOW_WIDTH, tetris_pygame.WINDOW_HEIGHT))
+    game = seeded_game(bitboard=True, height=8)
+    for x, y in ((1, GRID_HEIGHT - 1), (5, GRID_HEIGHT - 3), (8, GRID_HEIGHT - 6)):
+        if game.grid[y][x] is not None:
+            game.spawn_golden_cube(x, y)
+    heavy_particles(game.particles, count=300)
+    return tetris_pygame, screen, game
+
+@benchmark('draw_game')
+def _():
+    tetris_pygame, screen, game = render_setup()
+    return Case(lambda: tetris_pygame.draw_game(screen, game))
+
+@benchmark('draw_dirty_rects')
+def _():
+    tetris_pygame, screen, game = render_setup()
+    renderer = tetris_pygame.DirtyRectRenderer()
+    piece = game.current_piece
+    
+    def run():
+        piece.x ^= 1  # Keep the piece moving so every frame has dirty areas
+        renderer.draw(screen, game)
+    return Case(run)
+
+@benchmark('snapshot_delta')
+def _():
+    game = seeded_game(bitboard=True, height=8)
+    encoder = SnapshotEncoder()
+    encoder.encode(game)
+    piece = game.current_piece
+    
+    def run():
+        piece.x ^= 1  # The common tick: the piece moves over an unchanged board
+        encoder.encode(game)
+    return Case(run)
+
+@benchmark('snapshot_board_rows')
+def _():
+    game = seeded_game(bitboard=True, height=8)
+    encoder = SnapshotEncoder()
+    encoder.encode(game)
+    
+    def run():
+        game.board_version += 1  # Every row is rebuilt and compared, as after a lock
+        encoder.encode(game)
+    return Case(run)
+
+@benchmark('game_clone')
+def _():
+    game = seeded_game(bitboard=True, height=8)
+    return Case(game.clone)
+
+@benchmark('game_to_bytes')
+def _():
+    game = seeded_game(bitboard=True, height=8)
+    return Case(game.to_bytes)
+
+@benchmark('game_from_bytes')
+def _():
+    data = seeded_game(bitboard=True, height=8).to_bytes()
+    return Case(lambda: TetrisGame.from_bytes(data))
+
+def measure(case, min_time=0.05, repeat=5):
+    """Best time per operation in nanoseconds over `repeat` measurements of at least min_time each"""
+    run, reset, ops = case
+    
+    def sample(loops):
+        if reset is None:
+            start = time.perf_counter_ns()
+            for _ in range(loops):
+                run()
+            return time.perf_counter_ns() - start
+        total = 0
+        for _ in range(loops):
+            reset()
+            start = time.perf_counter_ns()
+            run()
+            total += time.perf_counter_ns() - start
+        return total
+    
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        run() if reset is None else (reset(), run())  # Warm caches
+        loops = 1
+        while sample(loops) < min_time * 1e9 / repeat and loops < 1 << 20:
+            loops *= 2
+        best = min(sample(loops) for _ in range(repeat))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return best / loops / ops
+
+def environment():
+    import importlib.metadata
+    versions = {}
+    for package in ('pygame', 'numpy'):
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    return {'python': platform.python_version(), 'machine': platform.machine(),
+            'system': platform.system(), **versions}
+
+def run_benchmarks(names, min_time, repeat):
+    results = {}
+    for name in names:
+        ns = measure(BENCHMARKS[name](), min_time, repeat)
+        results[name] = {'ns_per_op': ns}
+        print(f"{name:<34} {ns / 1000:>10.2f} us/op")
+    return results
+
+def compare(results, baseline, threshold):
+    """Return report lines and the names that regressed beyond threshold"""
+    lines = []
+    regressions = []
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            lines.append(f"{name:<34} {result['ns_per_op'] / 1000:>10.2f} us/op  (new)")
+            continue
+        ratio = result['ns_per_op'] / base['ns_per_op']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        lines.append(f"{name:<34} {result['ns_per_op'] / 1000:>10.2f} us/op  "
+                     f"baseline {base['ns_per_op'] / 1000:>10.2f}  {ratio:>5.2f}x{flag}")
+    return lines, regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time engine and renderer hot paths and compare with a baseline")
+    parser.add_argument('-k', '--filter', default='', help="only run benchmarks whose name contains this")
+    parser.add_argument('--list', action='store_true', help="list benchmark names and exit")
+    parser.add_argument('--save', metavar='PATH', help="write results as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="compare with a baseline, exit 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="allowed slowdown before a benchmark counts as regressed (default 0.10 = 10%%)")
+    parser.add_argument('--min-time', type=float, default=0.05, help="seconds spent per benchmark and repeat")
+    parser.add_argument('--repeat', type=int, default=5, help="measurements per benchmark, the best is kept")
+    args = parser.parse_args(argv)
+    
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if args.list:
+        print("\n".join(names))
+        return
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('version') != BASELINE_VERSION:
+            parser.error(f"{args.compare}: unsupported baseline version {baseline.get('version')!r}")
+    
+    results = run_benchmarks(names, args.min_time, args.repeat)
+    
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'version': BASELINE_VERSION, 'environment': environment(), 'results': results}, f, indent=2)
+    
+    if baseline is None:
+        return
+    if baseline.get('environment') != environment():
+        print(f"note: baseline was recorded on {baseline.get('environment')}", file=sys.stderr)
+    lines, regressions = compare(results, baseline, args.threshold)
+    print()
+    print("\n".join(lines))
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}: "
+              f"{', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
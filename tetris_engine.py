@@ -0,0 +1,1508 @@
+"""Headless Tetris engine: board, pieces, scoring, buffs and particle physics.
+
+Nothing in this module touches pygame, so games can be simulated on machines
+without a display and stepped as fast as the CPU allows.
+"""
+import hashlib
+import itertools
+import random
+import math
+import struct
+from types import MappingProxyType
+
+from tetris_particles import (
+    PARTICLE_CAPACITY, PARTICLE_STEP_MS, PRIORITY_GOLDEN, PRIORITY_LANDING, PRIORITY_LINE_CLEAR,
+    make_particle_system,
+)
+
+# Constants
+GRID_WIDTH = 10
+GRID_HEIGHT = 20
+CELL_SIZE = 30
+
+# Playfield dimensions in pixels (particles simulate in this space)
+GAME_WIDTH = GRID_WIDTH * CELL_SIZE
+GAME_HEIGHT = GRID_HEIGHT * CELL_SIZE
+
+# Colors
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+GRAY = (128, 128, 128)
+DARK_GRAY = (64, 64, 64)
+LIGHT_GRAY = (192, 192, 192)
+GOLD = (255, 215, 0)
+BRIGHT_GOLD = (255, 255, 0)
+YELLOW = (255, 255, 0)
+ORANGE = (255, 165, 0)
+RED = (255, 0, 0)
+
+# Line clear particles: colors for plain and golden cells, and the size range
+LINE_CLEAR_COLORS = (WHITE, YELLOW, ORANGE)
+GOLDEN_CLEAR_COLORS = (GOLD, BRIGHT_GOLD, YELLOW)
+LINE_CLEAR_SIZES = (3, 6)
+
+# Tetromino colors
+COLORS = {
+    'I': (0, 255, 255),    # Cyan
+    'O': (255, 255, 0),    # Yellow
+    'T': (255, 0, 255),    # Magenta
+    'S': (0, 255, 0),      # Green
+    'Z': (255, 0, 0),      # Red
+    'J': (0, 0, 255),      # Blue
+    'L': (255, 165, 0),    # Orange
+}
+PIECE_TYPES = tuple(COLORS)
+
+# Tetromino shapes, one 4x4 grid per rotation state
+SHAPES = {
+    'I': (
+        ('..#.',
+         '..#.',
+         '..#.',
+         '..#.'),
+        ('....',
+         '####',
+         '....',
+         '....')
+    ),
+    'O': (
+        ('....',
+         '.##.',
+         '.##.',
+         '....'),
+    ),
+    'T': (
+        ('....',
+         '.#..',
+         '###.',
+         '....'),
+        ('....',
+         '.#..',
+         '.##.',
+         '.#..'),
+        ('....',
+         '....',
+         '###.',
+         '.#..'),
+        ('....',
+         '.#..',
+         '##..',
+         '.#..')
+    ),
+    'S': (
+        ('....',
+         '.##.',
+         '##..',
+         '....'),
+        ('....',
+         '.#..',
+         '.##.',
+         '..#.')
+    ),
+    'Z': (
+        ('....',
+         '##..',
+         '.##.',
+         '....'),
+        ('....',
+         '..#.',
+         '.##.',
+         '.#..')
+    ),
+    'J': (
+        ('....',
+         '.#..',
+         '.#..',
+         '##..'),
+        ('....',
+         '....',
+         '#...',
+         '###.'),
+        ('....',
+         '.##.',
+         '.#..',
+         '.#..'),
+        ('....',
+         '....',
+         '###.',
+         '..#.')
+    ),
+    'L': (
+        ('....',
+         '..#.',
+         '..#.',
+         '.##.'),
+        ('....',
+         '....',
+         '###.',
+         '#...'),
+        ('....',
+         '##..',
+         '.#..',
+         '.#..'),
+        ('....',
+         '....',
+         '..#.',
+         '###.')
+    )
+}
+
+def _shape_offsets(shape):
+    """Convert a 4x4 shape grid into a tuple of (col, row) cell offsets"""
+    return tuple((col_idx, row_idx)
+                 for row_idx, row in enumerate(shape)
+                 for col_idx, cell in enumerate(row)
+                 if cell == '#')
+
+# Cell offsets for every (type, rotation), built once at import and shared by all pieces
+SHAPE_CELLS = MappingProxyType({
+    shape_type: tuple(_shape_offsets(shape) for shape in rotations)
+    for shape_type, rotations in SHAPES.items()
+})
+ROTATION_COUNTS = MappingProxyType({shape_type: len(rotations) for shape_type, rotations in SHAPES.items()})
+
+# Bitboard rows store one bit per column, bit 0 being the leftmost column
+FULL_ROW_MASK = (1 << GRID_WIDTH) - 1
+
+# Packed bitboard: the whole board in one integer, BOARD_STRIDE bits per row with the
+# playfield at bit BOARD_LEFT_PAD and wall bits either side, BOARD_TOP_PAD open rows
+# above (walled, for pieces spawning or kicked over the top) and solid rows below.
+# Walls and floor are occupied bits, so collision with them needs no bounds checks.
+BOARD_STRIDE = 16
+BOARD_LEFT_PAD = 3
+BOARD_TOP_PAD = 8
+BOARD_FLOOR_ROWS = 4
+BOARD_WALL_ROW = ((1 << BOARD_STRIDE) - 1) ^ (FULL_ROW_MASK << BOARD_LEFT_PAD)
+BOARD_SOLID_ROW = (1 << BOARD_STRIDE) - 1
+
+def pack_board(row_masks):
+    """Pack per-row masks, walls and floor into one padded board integer"""
+    rows = [BOARD_WALL_ROW] * BOARD_TOP_PAD
+    rows.extend(BOARD_WALL_ROW | (mask << BOARD_LEFT_PAD) for mask in row_masks)
+    rows.extend([BOARD_SOLID_ROW] * BOARD_FLOOR_ROWS)
+    bits = 0
+    for row in reversed(rows):
+        bits = (bits << BOARD_STRIDE) | row
+    return bits
+
+EMPTY_BOARD = pack_board([0] * GRID_HEIGHT)
+# Past this shift a piece's 4x4 box could reach beyond the floor rows
+BOARD_MAX_SHIFT = (BOARD_TOP_PAD + GRID_HEIGHT + BOARD_FLOOR_ROWS - 3) * BOARD_STRIDE
+
+# Piece cells as one packed mask per (type, rotation), relative to the piece position
+SHAPE_BOARD_MASKS = MappingProxyType({
+    shape_type: tuple(sum(1 << (dy * BOARD_STRIDE + dx) for dx, dy in offsets) for offsets in rotations)
+    for shape_type, rotations in SHAPE_CELLS.items()
+})
+
+def _shape_column_bottoms(offsets):
+    """Convert cell offsets into ((col, lowest_row), ...), one entry per occupied column"""
+    bottoms = {}
+    for col, row in offsets:
+        bottoms[col] = max(bottoms.get(col, row), row)
+    return tuple(sorted(bottoms.items()))
+
+# Lowest cell of each piece column for every (type, rotation), used for drop distances
+SHAPE_COLUMN_BOTTOMS = MappingProxyType({
+    shape_type: tuple(_shape_column_bottoms(offsets) for offsets in rotations)
+    for shape_type, rotations in SHAPE_CELLS.items()
+})
+
+# Buffs a cleared golden cube can grant, durations in milliseconds
+BUFF_TYPES = {
+    'speed_boost': {'name': 'Speed Boost', 'duration': 15000, 'color': (0, 255, 255)},
+    'score_multiplier': {'name': 'Score x2', 'duration': 20000, 'color': (255, 165, 0)},
+    'ghost_mode': {'name': 'Ghost Mode', 'duration': 10000, 'color': (128, 0, 128)},
+    'line_clear_bonus': {'name': 'Line Bonus', 'duration': 25000, 'color': (0, 255, 0)},
+    'hold_reset': {'name': 'Hold Reset', 'duration': 12000, 'color': (255, 192, 203)},
+    'slow_fall': {'name': 'Slow Fall', 'duration': 18000, 'color': (255, 255, 0)}
+}
+
+# SRS Wall Kick Data, keyed by (old_rotation, new_rotation)
+WALL_KICK_DATA = {
+    'JLSTZ': {
+        (0, 1): [(0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)],
+        (1, 0): [(0, 0), (1, 0), (1, -1), (0, 2), (1, 2)],
+        (1, 2): [(0, 0), (1, 0), (1, -1), (0, 2), (1, 2)],
+        (2, 1): [(0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)],
+        (2, 3): [(0, 0), (1, 0), (1, 1), (0, -2), (1, -2)],
+        (3, 2): [(0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)],
+        (3, 0): [(0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)],
+        (0, 3): [(0, 0), (1, 0), (1, 1), (0, -2), (1, -2)],
+    },
+    'I': {
+        (0, 1): [(0, 0), (-2, 0), (1, 0), (-2, -1), (1, 2)],
+        (1, 0): [(0, 0), (2, 0), (-1, 0), (2, 1), (-1, -2)],
+        (1, 2): [(0, 0), (-1, 0), (2, 0), (-1, 2), (2, -1)],
+        (2, 1): [(0, 0), (1, 0), (-2, 0), (1, -2), (-2, 1)],
+        (2, 3): [(0, 0), (2, 0), (-1, 0), (2, 1), (-1, -2)],
+        (3, 2): [(0, 0), (-2, 0), (1, 0), (-2, -1), (1, 2)],
+        (3, 0): [(0, 0), (1, 0), (-2, 0), (1, -2), (-2, 1)],
+        (0, 3): [(0, 0), (-1, 0), (2, 0), (-1, 2), (2, -1)],
+    }
+}
+
+def get_wall_kicks(piece_type, old_rotation, new_rotation):
+    """Offsets rotate_piece tries, in order, when rotating piece_type between two states"""
+    kick_table = 'I' if piece_type == 'I' else 'JLSTZ'
+    return WALL_KICK_DATA[kick_table].get((old_rotation, new_rotation), [(0, 0)])
+
+def _rotation_turn(shape_type, rotation, clockwise):
+    """(new rotation, its board mask, kicks, kicks with their board shift) for rotate_piece"""
+    new_rotation = (rotation + (1 if clockwise else -1)) % ROTATION_COUNTS[shape_type]
+    kicks = tuple([(0, 0)] if shape_type == 'O' else get_wall_kicks(shape_type, rotation, new_rotation))
+    return (new_rotation, SHAPE_BOARD_MASKS[shape_type][new_rotation], kicks,
+            tuple((dx, dy, dy * BOARD_STRIDE + dx) for dx, dy in kicks))
+
+# rotate_piece's turns per type, then direction (counter-clockwise first), then rotation. All
+# four SRS states are included for every type, since the kicks follow the unreduced rotation.
+ROTATION_TURNS = MappingProxyType({
+    shape_type: tuple({rotation: _rotation_turn(shape_type, rotation, clockwise) for rotation in range(4)}
+                      for clockwise in (False, True))
+    for shape_type in ROTATION_COUNTS
+})
+
+def remove_rows(rows, lines, top):
+    """rows without the indices in lines (ascending), the list `top` put in their place above"""
+    start = 0
+    for y in lines:
+        top += rows[start:y]
+        start = y + 1
+    top += rows[start:]
+    return top
+
+class Tetromino:
+    __slots__ = ('type', 'x', 'y', 'rotation')
+
+    def __init__(self, shape_type, x=GRID_WIDTH // 2 - 1, y=0, rotation=0):
+        self.type = shape_type
+        self.x = x
+        self.y = y
+        self.rotation = rotation
+    
+    @property
+    def color(self):
+        return COLORS[self.type]
+    
+    def get_shape(self):
+        return SHAPES[self.type][self.rotation % ROTATION_COUNTS[self.type]]
+    
+    def get_offsets(self):
+        return SHAPE_CELLS[self.type][self.rotation % ROTATION_COUNTS[self.type]]
+    
+    def get_cells(self):
+        x, y = self.x, self.y
+        return [(x + dx, y + dy) for dx, dy in self.get_offsets()]
+
+class SimulationClock:
+    """Game-time clock in milliseconds, advanced explicitly by TetrisGame.update"""
+    __slots__ = ('now_ms',)
+
+    def __init__(self, now_ms=0):
+        self.now_ms = now_ms
+    
+    def __call__(self):
+        return self.now_ms
+    
+    def advance(self, dt):
+        self.now_ms += dt
+
+def copy_random(rng):
+    """A random.Random in rng's state, without seeding it from the OS first"""
+    copy = random.Random.__new__(random.Random)
+    copy.setstate(rng.getstate())
+    return copy
+
+# Board versions are unique across games, so a cached render of one board
+# can never be mistaken for another game or a restarted one
+_board_versions = itertools.count()
+
+# Actions accepted by TetrisGame.apply_action
+ACTIONS = (
+    'left', 'right', 'soft_drop', 'hard_drop', 'rotate_cw', 'rotate_ccw', 'hold',
+    'pause', 'open_settings', 'restart',
+    'menu_up', 'menu_down', 'menu_left', 'menu_right', 'menu_close',
+)
+
+# Actions that auto-repeat while held (see TetrisGame.press)
+HELD_ACTIONS = ('left', 'right', 'soft_drop')
+SHIFT_DIRECTIONS = {'left': -1, 'right': 1}
+
+# Locked cells as small integers: 0 for empty, 1 + COLORS index of the piece color
+CELL_CODES = {None: 0, **{color: i + 1 for i, color in enumerate(COLORS.values())}}
+CELL_COLORS = tuple(CELL_CODES)
+OCCUPIED_DIGITS = bytes.maketrans(bytes(range(len(CELL_CODES))), b'0' + b'1' * len(COLORS))
+PIECE_CODES = {None: 0, **{piece_type: i + 1 for i, piece_type in enumerate(COLORS)}}
+PIECE_NAMES = tuple(PIECE_CODES)
+BUFF_CODES = {buff_type: i for i, buff_type in enumerate(BUFF_TYPES)}
+BUFF_NAMES = tuple(BUFF_CODES)
+HELD_CODES = {action: i for i, action in enumerate(HELD_ACTIONS)}
+
+# Saved game layout (see TetrisGame.to_bytes), little-endian: this header, then
+# the grid as one cell code per byte, golden_rows, the RNG's Mersenne Twister
+# words, open_cells as y * GRID_WIDTH + x bytes in list order, cleared rows
+# and the held actions, active buffs and buff activations in dict order
+STATE_MAGIC = b'TTGS'
+STATE_VERSION = 1
+STATE_HEADER = struct.Struct('<4sBHqqqiiqiiiiqidiiiiiBBBbbBBBdddddHBBBB')
+STATE_GOLDEN_ROWS = struct.Struct(f'<{GRID_HEIGHT}H')
+STATE_RNG = struct.Struct('<625I')  # 624 state words and the position in them
+STATE_CLEARED_ROW = struct.Struct(f'<BH{GRID_WIDTH}s')
+STATE_HELD = struct.Struct('<Bq')
+STATE_BUFF = struct.Struct('<Bqq')
+STATE_ACTIVATIONS = struct.Struct('<Bi')
+
+class TetrisGame:
+    """Pure game logic: no pygame, time comes from an injectable millisecond clock.
+
+    Without a clock the game owns a SimulationClock that update(dt) advances,
+    so it can run headless and faster than real time. Pass a callable such as
+    pygame.time.get_ticks to follow wall-clock time instead.
+    
+    All game randomness (pieces, golden cubes, buffs) comes from self.rng,
+    seeded from `seed`, so a seed plus the same inputs and update() steps
+    replays a game exactly. Particle effects draw from a separate fx_rng and
+    never disturb the game sequence. Headless hosts that never show them can
+    pass particle_capacity=0 to skip allocating the particle arrays.
+    
+    to_bytes() and from_bytes() save and restore a game, clone() copies one
+    in memory; either way the copy plays on exactly as the original would.
+    """
+    def __init__(self, bitboard=False, clock=None, seed=None, particle_capacity=PARTICLE_CAPACITY):
+        self.external_clock = clock
+        self.clock = clock if clock is not None else SimulationClock()
+        self.seed = seed if seed is not None else random.randrange(1 << 32)
+        self.rng = random.Random(self.seed)
+        self.fx_rng = random.Random(f"{self.seed}:particles")
+        
+        self.grid = [[None] * GRID_WIDTH for _ in range(GRID_HEIGHT)]
+        self.board_version = next(_board_versions)  # Changes whenever locked cells change
+        # Optional bitboard backend: one occupancy mask per row for line detection and the
+        # same cells packed into board_bits for collision; grid stays the color layer
+        self.bitboard = bitboard
+        self.row_masks = [0] * GRID_HEIGHT if bitboard else None
+        self.board_bits = EMPTY_BOARD if bitboard else None
+        # Per-column surface: row of the highest locked cell, GRID_HEIGHT when the column is empty
+        self.column_tops = [GRID_HEIGHT] * GRID_WIDTH
+        self.current_piece = None
+        self.next_piece = None
+        self.hold_piece = None
+        self.can_hold = True  # Prevents holding multiple times per piece
+        self.score = 0
+        self.level = 1
+        self.lines_cleared = 0
+        self.fall_timer = 0
+        self.fall_speed = 500  # milliseconds
+        self.game_over = False
+        self.paused = False
+        self.in_settings = False
+        
+        # Held actions, see press and release: action -> game time its next repeat is due
+        self.held_actions = {}
+        self.das = 150  # ms a held shift waits before repeating (delayed auto shift)
+        self.arr = 150  # ms between repeated shifts (auto repeat rate), 0 shifts straight to the wall
+        self.repeat_delay = 150  # ms before and between soft drop repeats
+        
+        # Golden cube system: one bitmask per row, shifted along with grid rows on line clears
+        self.golden_rows = [0] * GRID_HEIGHT
+        self.golden_count = 0
+        # Locked cells that can still turn golden, as (row, x) where row is the grid row list
+        # itself so entries stay valid while rows shift; open_cell_slots maps (id(row), x) to
+        # the entry's index in open_cells
+        self.open_cells = []
+        self.open_cell_slots = {}
+        self.golden_spawn_chance = 0.1  # 10% chance per line clear
+        self.golden_cubes_in_line = 0  # Track golden cubes in current clearing lines
+        
+        # Session statistics
+        self.pieces_placed = 0
+        self.golden_cubes_spawned = 0
+        self.golden_cubes_cleared = 0
+        self.buff_activations = {}  # buff_type -> times activated
+        
+        # Combo system: multi-line clears are resolved at lock time, then play holds while
+        # the rows vanish one by one on screen. A combo_delay of 0 skips the hold.
+        self.combo_active = False
+        self.cleared_rows = []  # (y before the clear, cells, golden mask) of the last clear, bottom first
+        self.clear_step = 0  # Rows of cleared_rows the animation has removed so far
+        self.combo_timer = 0
+        self.combo_delay = 500  # milliseconds between each line clear
+        
+        # Buff system
+        self.active_buffs = {}
+        self.buff_types = BUFF_TYPES
+        
+        # Particle system
+        self.particles = make_particle_system(GAME_WIDTH, GAME_HEIGHT, particle_capacity)
+        self.particle_timer = 0  # Time not yet stepped, see update_particles
+        # Scales particle density and lifetime below the settings (which stay the
+        # ceiling), lowered by the front end's governor when frames run slow
+        self.particle_quality = 1.0
+        
+        # Settings system
+        self.settings = {
+            'particle_density': 1.0,  # 0.0 to 2.0
+            'particle_lifetime': 1.0,  # 0.5 to 2.0
+            'particle_effects': True,
+            'show_particles': True
+        }
+        self.settings_selected = 0
+        self.settings_options = ['particle_density', 'particle_lifetime', 'particle_effects', 'show_particles']
+        self.settings_names = {
+            'particle_density': 'Particle Density',
+            'particle_lifetime': 'Particle Lifetime',
+            'particle_effects': 'Particle Effects',
+            'show_particles': 'Show Particles'
+        }
+        
+        # SRS Wall Kick Data
+        self.wall_kick_data = WALL_KICK_DATA
+        
+        self.spawn_new_piece()
+        
+    def spawn_new_piece(self):
+        if self.next_piece is None:
+            self.next_piece = self.rng.choice(PIECE_TYPES)
+        
+        self.current_piece = Tetromino(self.next_piece)
+        self.next_piece = self.rng.choice(PIECE_TYPES)
+        
+        if not self.is_valid_position(self.current_piece):
+            self.game_over = True
+    
+    def is_valid_position(self, piece, dx=0, dy=0, rotation_offset=0):
+        board = self.board_bits
+        if board is not None:
+            # One AND against the packed board. Rows past the top or floor padding fall
+            # through to the grid check; columns need no check as long as no cell is more
+            # than the 6 wall bits outside the field, which moves and kicks never reach.
+            shift = (piece.y + dy + BOARD_TOP_PAD) * BOARD_STRIDE + piece.x + dx + BOARD_LEFT_PAD
+            if 0 <= shift < BOARD_MAX_SHIFT:
+                masks = SHAPE_BOARD_MASKS[piece.type]
+                return not board & (masks[(piece.rotation + rotation_offset) % len(masks)] << shift)
+        rotations = SHAPE_CELLS[piece.type]
+        offsets = rotations[(piece.rotation + rotation_offset) % len(rotations)]
+        base_x = piece.x + dx
+        base_y = piece.y + dy
+        grid = self.grid
+        
+        for ox, oy in offsets:
+            x = base_x + ox
+            y = base_y + oy
+            if x < 0 or x >= GRID_WIDTH or y >= GRID_HEIGHT:
+                return False
+            if y >= 0 and grid[y][x] is not None:
+                return False
+        return True
+    
+    def place_piece(self):
+        if not self.current_piece:
+            return
+            
+        # Create landing particles
+        self.create_landing_particles()
+        
+        # Place the piece on the grid
+        color = self.current_piece.color
+        grid = self.grid
+        row_masks = self.row_masks
+        column_tops = self.column_tops
+        open_cells = self.open_cells
+        open_cell_slots = self.open_cell_slots
+        cells = 0  # The piece's cells in the packed layout, before padding
+        for x, y in self.current_piece.get_cells():
+            if y >= 0:
+                row = grid[y]
+                row[x] = color
+                # add_open_cell, inlined: this runs for every cell of every piece
+                key = (id(row), x)
+                if key not in open_cell_slots:
+                    open_cell_slots[key] = len(open_cells)
+                    open_cells.append((row, x))
+                if row_masks is not None:
+                    row_masks[y] |= 1 << x
+                    cells |= 1 << (y * BOARD_STRIDE + x)
+                if y < column_tops[x]:
+                    column_tops[x] = y
+        if row_masks is not None:
+            self.board_bits |= cells << (BOARD_TOP_PAD * BOARD_STRIDE + BOARD_LEFT_PAD)
+        self.board_version = next(_board_versions)
+        
+        # Clear current piece reference so it doesn't get drawn during combo
+        self.current_piece = None
+        self.pieces_placed += 1
+        
+        # Only clear lines if not in combo mode
+        if not self.combo_active:
+            self.clear_lines()
+    
+    def create_landing_particles(self):
+        """Create particles when a piece lands"""
+        if not self.current_piece or not self.settings['show_particles'] or not self.settings['particle_effects']:
+            return
+        
+        piece_cells = self.current_piece.get_cells()
+        piece_color = self.current_piece.color
+        density, lifetime_scale = self.particle_scales()
+        
+        # Create particles for each cell of the landed piece
+        for cell_x, cell_y in piece_cells:
+            if cell_y >= 0:
+                # Convert grid coordinates to screen coordinates
+                screen_x = cell_x * CELL_SIZE + CELL_SIZE // 2
+                screen_y = cell_y * CELL_SIZE + CELL_SIZE // 2
+                
+                # Create multiple particles per cell
+                particle_count = int(self.fx_rng.randint(3, 6) * density)
+                for _ in range(max(1, particle_count)):
+                    # Random velocity in different directions
+                    angle = self.fx_rng.uniform(0, 2 * math.pi)
+                    speed = self.fx_rng.uniform(1, 4)
+                    vel_x = math.cos(angle) * speed
+                    vel_y = math.sin(angle) * speed - self.fx_rng.uniform(1, 3)  # Slight upward bias
+                    
+                    # Vary particle properties
+                    size = self.fx_rng.randint(2, 4)
+                    lifetime = self.fx_rng.randint(800, 1500)
+                    
+                    # Create color variations
+                    color_variation = self.fx_rng.randint(-30, 30)
+                    particle_color = tuple(max(0, min(255, c + color_variation)) for c in piece_color)
+                    
+                    self.particles.emit(
+                        screen_x + self.fx_rng.uniform(-CELL_SIZE//4, CELL_SIZE//4),
+                        screen_y + self.fx_rng.uniform(-CELL_SIZE//4, CELL_SIZE//4),
+                        particle_color,
+                        vel_x,
+                        vel_y,
+                        size,
+                        int(lifetime * lifetime_scale),
+                        PRIORITY_LANDING
+                    )
+        self.particles.enforce_budget()
+    
+    def particle_scales(self):
+        """Effective (density, lifetime) multipliers: the settings scaled by particle_quality"""
+        quality = self.particle_quality
+        return (self.settings['particle_density'] * quality,
+                self.settings['particle_lifetime'] * (0.5 + 0.5 * quality))
+    
+    def create_line_clear_particles(self, line_y, golden=0):
+        """Create special particles for a line cleared at line_y, golden being its golden cube mask"""
+        if not self.settings['show_particles'] or not self.settings['particle_effects']:
+            return
+        
+        density, lifetime_scale = self.particle_scales()
+        for x in range(GRID_WIDTH):
+            screen_x = x * CELL_SIZE + CELL_SIZE // 2
+            screen_y = line_y * CELL_SIZE + CELL_SIZE // 2
+                
+            # Create more intense particles for line clears
+            particle_count = int(self.fx_rng.randint(5, 8) * density)
+            for _ in range(max(1, particle_count)):
+                angle = self.fx_rng.uniform(0, 2 * math.pi)
+                speed = self.fx_rng.uniform(2, 6)
+                vel_x = math.cos(angle) * speed
+                vel_y = math.sin(angle) * speed - self.fx_rng.uniform(2, 4)
+                    
+                size = self.fx_rng.randint(*LINE_CLEAR_SIZES)
+                lifetime = self.fx_rng.randint(1000, 2000)
+                    
+                # Golden particles for golden cube lines
+                if golden >> x & 1:
+                    particle_color = self.fx_rng.choice(GOLDEN_CLEAR_COLORS)
+                    priority = PRIORITY_GOLDEN
+                else:
+                    particle_color = self.fx_rng.choice(LINE_CLEAR_COLORS)
+                    priority = PRIORITY_LINE_CLEAR
+                    
+                self.particles.emit(
+                    screen_x + self.fx_rng.uniform(-CELL_SIZE//2, CELL_SIZE//2),
+                    screen_y + self.fx_rng.uniform(-CELL_SIZE//2, CELL_SIZE//2),
+                    particle_color,
+                    vel_x,
+                    vel_y,
+                    size,
+                    int(lifetime * lifetime_scale),
+                    priority
+                )
+        self.particles.enforce_budget()
+    
+    def update_particles(self, dt):
+        """Update all particles and remove dead ones, in fixed PARTICLE_STEP_MS steps whatever dt is"""
+        self.particle_timer += dt
+        if not len(self.particles):
+            # Nothing to step, only keep the phase so new particles start on the same steps
+            self.particle_timer %= PARTICLE_STEP_MS
+            return
+        while self.particle_timer >= PARTICLE_STEP_MS:
+            self.particle_timer -= PARTICLE_STEP_MS
+            self.particles.update(PARTICLE_STEP_MS)
+    
+    def particle_interpolation(self):
+        """How far (0 to 1) game time is between the last two particle steps"""
+        return self.particle_timer / PARTICLE_STEP_MS
+    
+    @property
+    def golden_cubes(self):
+        """Set of (x, y) positions with golden cubes, built from golden_rows"""
+        return {(x, y) for y, mask in enumerate(self.golden_rows) if mask
+                for x in range(GRID_WIDTH) if mask >> x & 1}
+    
+    def spawn_golden_cube(self, x, y):
+        """Add a golden cube at the specified position"""
+        if not self.golden_rows[y] >> x & 1:
+            self.golden_rows[y] |= 1 << x
+            self.golden_count += 1
+        self.remove_open_cell(self.grid[y], x)
+        self.golden_cubes_spawned += 1
+    
+    def add_open_cell(self, row, x):
+        key = (id(row), x)
+        if key not in self.open_cell_slots:
+            self.open_cell_slots[key] = len(self.open_cells)
+            self.open_cells.append((row, x))
+    
+    def remove_open_cell(self, row, x):
+        """Drop a cell from open_cells in O(1) by moving the last entry into its slot"""
+        i = self.open_cell_slots.pop((id(row), x), None)
+        if i is None:
+            return
+        last = self.open_cells.pop()
+        if i < len(self.open_cells):
+            self.open_cells[i] = last
+            self.open_cell_slots[(id(last[0]), last[1])] = i
+    
+    def rebuild_cell_index(self):
+        """Recompute open_cells and golden_count from the grid and golden_rows after bulk board changes"""
+        self.open_cells = []
+        self.open_cell_slots = {}
+        self.golden_count = 0
+        for row, golden in zip(self.grid, self.golden_rows):
+            for x, cell in enumerate(row):
+                if golden >> x & 1:
+                    self.golden_count += 1
+                elif cell is not None:
+                    self.add_open_cell(row, x)
+    
+    def activate_random_buff(self):
+        """Activate a random buff when golden cubes are cleared"""
+        buff_type = self.rng.choice(list(self.buff_types.keys()))
+        current_time = self.clock()
+        self.buff_activations[buff_type] = self.buff_activations.get(buff_type, 0) + 1
+        
+        self.active_buffs[buff_type] = {
+            'start_time': current_time,
+            'duration': self.buff_types[buff_type]['duration']
+        }
+        
+        # Apply immediate buff effects
+        if buff_type == 'speed_boost':
+            self.fall_speed = max(25, self.fall_speed // 2)
+        elif buff_type == 'slow_fall':
+            self.fall_speed = min(1000, self.fall_speed * 2)
+        elif buff_type == 'hold_reset':
+            self.can_hold = True
+    
+    def update_buffs(self):
+        """Update active buffs and remove expired ones"""
+        if not self.active_buffs:
+            return
+        current_time = self.clock()
+        expired_buffs = []
+        
+        for buff_type, buff_data in self.active_buffs.items():
+            if current_time - buff_data['start_time'] >= buff_data['duration']:
+                expired_buffs.append(buff_type)
+        
+        # Remove expired buffs and reset their effects
+        for buff_type in expired_buffs:
+            del self.active_buffs[buff_type]
+            if buff_type == 'speed_boost' or buff_type == 'slow_fall':
+                self.fall_speed = max(50, 500 - (self.level - 1) * 50)
+    
+    def get_score_multiplier(self):
+        """Get current score multiplier based on active buffs"""
+        if 'score_multiplier' in self.active_buffs:
+            return 2
+        return 1
+    
+    def is_ghost_mode_active(self):
+        """Check if ghost mode is active (pieces can pass through some blocks)"""
+        return 'ghost_mode' in self.active_buffs
+    
+    def get_line_clear_bonus(self):
+        """Get bonus multiplier for line clears"""
+        if 'line_clear_bonus' in self.active_buffs:
+            return 1.5
+        return 1.0
+    
+    def clear_lines(self):
+        if self.row_masks is not None:
+            # Most pieces complete no line, and the membership test finds that without a Python loop
+            if FULL_ROW_MASK in self.row_masks:
+                lines_to_clear = [y for y, mask in enumerate(self.row_masks) if mask == FULL_ROW_MASK]
+            else:
+                lines_to_clear = []
+        else:
+            lines_to_clear = []
+            for y in range(GRID_HEIGHT):
+                if all(self.grid[y][x] is not None for x in range(GRID_WIDTH)):
+                    lines_to_clear.append(y)
+        
+        if lines_to_clear:
+            self.remove_lines(lines_to_clear)
+            self.finish_line_clear()
+        else:
+            # No lines to clear - spawn new piece and reset hold
+            self.spawn_new_piece()
+            self.can_hold = True
+    
+    def remove_lines(self, lines):
+        """Score and remove full rows in one compaction pass.
+        
+        Rows are scored bottom first, the order the animation shows them in,
+        so a buff from a golden cube in a lower row already applies to the
+        rows above it. cleared_rows keeps what was removed for the animation.
+        """
+        lines = sorted(lines, reverse=True)
+        self.cleared_rows = []
+        self.clear_step = 0
+        for line_y in lines:
+            row = self.grid[line_y]
+            golden = self.golden_rows[line_y]
+            self.cleared_rows.append((line_y, row, golden))
+            for x in range(GRID_WIDTH):
+                self.remove_open_cell(row, x)
+        
+            golden_cubes_cleared = bin(golden).count('1')
+            self.golden_count -= golden_cubes_cleared
+            self.golden_cubes_cleared += golden_cubes_cleared
+            self.lines_cleared += 1
+            points = 100  # Base points per line in combo
+            
+            # Apply score multiplier and line clear bonus
+            multiplier = self.get_score_multiplier() * self.get_line_clear_bonus()
+            self.score += int(points * self.level * multiplier)
+            
+            # Activate buff if golden cubes were cleared
+            if golden_cubes_cleared > 0:
+                self.activate_random_buff()
+        
+        # Keep the other rows in order under fresh empty ones
+        lines.reverse()
+        empty = len(lines)
+        self.grid = remove_rows(self.grid, lines, [[None for _ in range(GRID_WIDTH)] for _ in range(empty)])
+        self.golden_rows = remove_rows(self.golden_rows, lines, [0] * empty)
+        if self.row_masks is not None:
+            self.row_masks = remove_rows(self.row_masks, lines, [0] * empty)
+            self.board_bits = pack_board(self.row_masks)
+        
+        # Cleared rows are full, so every column tops out on or above the highest of them.
+        # Columns topped above it drop by the cleared count, the rest are rescanned.
+        highest = lines[0]
+        for x, top in enumerate(self.column_tops):
+            if top < highest:
+                self.column_tops[x] = top + empty
+            else:
+                self.column_tops[x] = self.find_column_top(x, top)
+        self.board_version = next(_board_versions)
+        
+    def finish_line_clear(self):
+        """Golden cube spawn and leveling after a clear, then the next piece unless the animation holds it"""
+        # Spawn new golden cubes randomly
+        if self.rng.random() < self.golden_spawn_chance:
+            self.spawn_random_golden_cube()
+        
+        # Level up every 10 lines
+        new_level = self.lines_cleared // 10 + 1
+        if new_level > self.level:
+            self.level = new_level
+            # Don't update fall speed if speed buff is active
+            if 'speed_boost' not in self.active_buffs and 'slow_fall' not in self.active_buffs:
+                self.fall_speed = max(50, 500 - (self.level - 1) * 50)
+        
+        self.combo_timer = 0
+        if len(self.cleared_rows) > 1 and self.combo_delay > 0:
+            # Hold play while the rows vanish one by one, see update
+            self.combo_active = True
+            return
+        for step, (line_y, _, golden) in enumerate(self.cleared_rows):
+            self.create_line_clear_particles(line_y + step, golden)
+        self.end_line_clear()
+    
+    def end_line_clear(self):
+        self.combo_active = False
+        self.cleared_rows = []
+        self.clear_step = 0
+        self.combo_timer = 0
+        self.spawn_new_piece()
+        self.can_hold = True
+    
+    def board_rows(self):
+        """(grid, golden_rows) to draw: the board, or mid-animation the board with the rows still showing put back"""
+        if not self.combo_active:
+            return self.grid, self.golden_rows
+        
+        # Rows vanish bottom first, so the ones still showing sit at their old y once the
+        # vanished rows below them are gone, and everything moves down by the vanished count
+        empty = len(self.cleared_rows)
+        grid = self.grid[empty:]
+        golden_rows = self.golden_rows[empty:]
+        for line_y, row, golden in reversed(self.cleared_rows[self.clear_step:]):
+            grid.insert(line_y, row)
+            golden_rows.insert(line_y, golden)
+        grid[:0] = [[None] * GRID_WIDTH for _ in range(self.clear_step)]
+        golden_rows[:0] = [0] * self.clear_step
+        return grid, golden_rows
+    
+    def spawn_random_golden_cube(self):
+        """Turn a random locked, not yet golden cell into a golden cube"""
+        if self.open_cells:
+            row, x = self.rng.choice(self.open_cells)
+            # Entries only know their row, look up where it sits now
+            y = next(y for y, grid_row in enumerate(self.grid) if grid_row is row)
+            self.spawn_golden_cube(x, y)
+    
+    def move_piece(self, dx, dy):
+        if self.current_piece and self.is_valid_position(self.current_piece, dx, dy):
+            self.current_piece.x += dx
+            self.current_piece.y += dy
+            return True
+        return False
+    
+    def rotate_piece(self, clockwise=True):
+        piece = self.current_piece
+        if not piece:
+            return False
+        
+        # O pieces only try (0, 0), the others their SRS wall kicks, in order
+        turn = ROTATION_TURNS[piece.type][clockwise].get(piece.rotation)
+        if turn is None:
+            turn = _rotation_turn(piece.type, piece.rotation, clockwise)
+        new_rotation, mask, kicks, board_kicks = turn
+        
+        board = self.board_bits
+        if board is not None:
+            # is_valid_position's single AND, with every kick already a board shift
+            base = (piece.y + BOARD_TOP_PAD) * BOARD_STRIDE + piece.x + BOARD_LEFT_PAD
+            for dx, dy, offset in board_kicks:
+                shift = base + offset
+                if 0 <= shift < BOARD_MAX_SHIFT:
+                    if board & (mask << shift):
+                        continue
+                elif not self.is_valid_position(piece, dx, dy, 1 if clockwise else -1):
+                    continue
+                piece.x += dx
+                piece.y += dy
+                piece.rotation = new_rotation
+                return True
+            return False
+        
+        step = 1 if clockwise else -1
+        for dx, dy in kicks:
+            if self.is_valid_position(piece, dx, dy, step):
+                piece.x += dx
+                piece.y += dy
+                piece.rotation = new_rotation
+                return True
+        return False
+    
+    def find_column_top(self, x, start_y=0):
+        """Scan a column downward from start_y for its highest locked cell"""
+        for y in range(start_y, GRID_HEIGHT):
+            if self.grid[y][x] is not None:
+                return y
+        return GRID_HEIGHT
+    
+    def rebuild_column_tops(self):
+        """Recompute column_tops from the grid after bulk board changes"""
+        self.column_tops = [self.find_column_top(x) for x in range(GRID_WIDTH)]
+    
+    def rebuild_bitboard(self):
+        """Recompute row_masks and board_bits from the grid after bulk board changes"""
+        if self.row_masks is not None:
+            self.row_masks = [sum(1 << x for x, cell in enumerate(row) if cell is not None) for row in self.grid]
+            self.board_bits = pack_board(self.row_masks)
+    
+    def get_drop_distance(self, piece):
+        """Number of rows the piece can fall before it lands.
+        
+        When every piece column sits above that column's surface the answer
+        comes straight from column_tops. A piece tucked under an overhang
+        falls back to stepping through is_valid_position.
+        """
+        rotations = SHAPE_COLUMN_BOTTOMS[piece.type]
+        bottoms = rotations[piece.rotation % len(rotations)]
+        column_tops = self.column_tops
+        distance = GRID_HEIGHT
+        for col, bottom in bottoms:
+            gap = column_tops[piece.x + col] - (piece.y + bottom) - 1
+            if gap < 0:
+                return self.scan_drop_distance(piece)
+            if gap < distance:
+                distance = gap
+        return distance
+    
+    def scan_drop_distance(self, piece):
+        drop = 0
+        while self.is_valid_position(piece, dy=drop + 1):
+            drop += 1
+        return drop
+    
+    def get_ghost_position(self):
+        if not self.current_piece:
+            return None
+        
+        # Find the lowest possible position
+        return self.current_piece.y + self.get_drop_distance(self.current_piece)
+    
+    def hold_current_piece(self):
+        if not self.current_piece or not self.can_hold:
+            return False
+        
+        if self.hold_piece is None:
+            # First time holding - store current piece and spawn new one
+            self.hold_piece = self.current_piece.type
+            self.spawn_new_piece()
+        else:
+            # Swap current piece with held piece
+            old_hold = self.hold_piece
+            self.hold_piece = self.current_piece.type
+            
+            # Create new piece from held piece
+            self.current_piece = Tetromino(old_hold)
+            self.current_piece.x = GRID_WIDTH // 2 - 1
+            self.current_piece.y = 0
+            
+            # Check if the swapped piece can be placed
+            if not self.is_valid_position(self.current_piece):
+                self.game_over = True
+                return False
+        
+        self.can_hold = False  # Can't hold again until next piece
+        return True
+    
+    def hard_drop(self):
+        if not self.current_piece:
+            return
+        
+        drop_distance = self.get_drop_distance(self.current_piece)
+        self.current_piece.y += drop_distance
+        
+        self.score += drop_distance * 2 * self.get_score_multiplier()
+        self.place_piece()
+    
+    def place_resolved(self, x, rotation, drop, board_bits, row_masks, column_tops):
+        """hard_drop for callers that resolved the placement in bulk, such as VecTetrisEnv.
+        
+        The current piece turns to `rotation` at column x, falls `drop` rows
+        and locks, scoring as hard_drop does. The caller has already checked
+        that it fits there, lands after exactly `drop` rows and completes no
+        line, and passes the bitboard layers with it locked in. Only the
+        colors, open_cells and counters are left to do here before the next
+        piece spawns.
+        """
+        piece = self.current_piece
+        piece.x = x
+        piece.rotation = rotation
+        piece.y += drop
+        self.score += drop * 2 * self.get_score_multiplier()
+        self.create_landing_particles()
+        
+        color = COLORS[piece.type]
+        grid = self.grid
+        open_cells = self.open_cells
+        open_cell_slots = self.open_cell_slots
+        left, top = x, piece.y
+        for dx, dy in SHAPE_CELLS[piece.type][rotation % ROTATION_COUNTS[piece.type]]:
+            y = top + dy
+            if y >= 0:
+                x = left + dx
+                row = grid[y]
+                row[x] = color
+                key = (id(row), x)
+                if key not in open_cell_slots:
+                    open_cell_slots[key] = len(open_cells)
+                    open_cells.append((row, x))
+        self.board_bits = board_bits
+        self.row_masks = row_masks
+        self.column_tops = column_tops
+        self.board_version = next(_board_versions)
+        
+        self.current_piece = None
+        self.pieces_placed += 1
+        self.spawn_new_piece()
+        self.can_hold = True
+    
+    def soft_drop(self):
+        if self.move_piece(0, 1):
+            self.score += 1 * self.get_score_multiplier()
+        else:
+            self.place_piece()
+    
+    def update(self, dt, gravity=True):
+        """Advance the simulation by dt milliseconds.
+        
+        gravity=False holds the current piece where it is while everything
+        else (buffs, the clear animation, spawning) moves on, for bots that
+        choose a placement as a piece appears and let game time pass between
+        pieces rather than under them.
+        """
+        if self.external_clock is None:
+            self.clock.advance(dt)
+        
+        # Auto-repeat held actions that fell due during this step
+        self.update_held_actions()
+        
+        if self.game_over or self.paused:
+            # Update particles even when paused/game over
+            self.update_particles(dt)
+            return
+        
+        # Update buffs
+        self.update_buffs()
+        
+        # Update particles
+        self.update_particles(dt)
+        
+        # Play out the clear animation, one row every combo_delay and then the next piece
+        if self.combo_active:
+            self.combo_timer += dt
+            shown = min(len(self.cleared_rows), int(self.combo_timer // self.combo_delay))
+            while self.clear_step < shown:
+                line_y, _, golden = self.cleared_rows[self.clear_step]
+                self.create_line_clear_particles(line_y + self.clear_step, golden)
+                self.clear_step += 1
+                self.board_version = next(_board_versions)
+            if self.combo_timer >= (len(self.cleared_rows) + 1) * self.combo_delay:
+                self.end_line_clear()
+            return  # Don't update piece during combo
+        
+        if not self.current_piece or not gravity:
+            return
+        
+        # Gravity keeps the leftover time, so it falls at the same rate whatever dt is
+        self.fall_timer += dt
+        while self.fall_timer >= self.fall_speed:
+            self.fall_timer -= self.fall_speed
+            if not self.move_piece(0, 1):
+                self.place_piece()
+                self.fall_timer = 0
+                break
+    
+    def next_update_due(self):
+        """Game time at which update() next changes something on its own, None if only input can.
+        
+        Covers gravity, held action repeats, buff expiry, the clear animation
+        and live particles. A host that moves games along with advance_to()
+        only at these times and on input gets exactly the game that updating
+        every millisecond gives, and can leave idle games alone in between.
+        """
+        now = self.clock()
+        due = []
+        shift = self.active_shift()
+        # Repeats that fall due while input is not accepted are skipped, so a finished,
+        # paused or animating game need not wake for held keys; the clear animation and
+        # the input that resumes play wake it anyway
+        held_actions = self.held_actions.items() if self.accepts_held_input() else ()
+        for action, at in held_actions:
+            if action in SHIFT_DIRECTIONS:
+                if action != shift:
+                    continue
+                if self.arr == 0 and at <= now:
+                    # A charged instant shift slides again on the next update once there is room
+                    piece = self.current_piece
+                    if piece and self.is_valid_position(piece, SHIFT_DIRECTIONS[action], 0):
+                        due.append(now + 1)
+                    continue
+            due.append(at)
+        if len(self.particles):
+            due.append(now + math.ceil(PARTICLE_STEP_MS - self.particle_timer))
+        
+        if not (self.game_over or self.paused):
+            for data in self.active_buffs.values():
+                due.append(data['start_time'] + data['duration'])
+            if self.combo_active:
+                due.append(now + self.combo_delay * (self.clear_step + 1) - self.combo_timer)
+            elif self.current_piece:
+                due.append(now + self.fall_speed - self.fall_timer)
+        return min(due) if due else None
+    
+    def advance_to(self, at):
+        """Update up to game time `at` as if in 1 ms steps, given nothing falls due before it.
+        
+        The span before the last millisecond only accumulates timers, so it
+        goes in one update() and the last millisecond, where things happen,
+        in another.
+        """
+        dt = at - self.clock()
+        if dt > 1:
+            self.update(dt - 1)
+            dt = 1
+        if dt > 0:
+            self.update(dt)
+    
+    def press(self, action, at=None):
+        """Start holding one of HELD_ACTIONS at game time `at` (default: now).
+        
+        It fires once straight away, then repeats from update() at the exact
+        times it falls due: shifts after das and then every arr, soft drop
+        every repeat_delay. Of left and right only the one pressed last moves.
+        """
+        at = self.clock() if at is None else at
+        self.held_actions.pop(action, None)  # Re-inserted so the newest press comes last
+        self.held_actions[action] = at + (self.das if action in SHIFT_DIRECTIONS else self.repeat_delay)
+        if self.accepts_held_input():
+            self.apply_held_action(action)
+    
+    def release(self, action, at=None):
+        at = self.clock() if at is None else at
+        was_active = action == self.active_shift()
+        self.held_actions.pop(action, None)
+        # The other direction, if still held, takes over and charges DAS again
+        other = self.active_shift()
+        if was_active and other is not None:
+            self.held_actions[other] = at + self.das
+    
+    def active_shift(self):
+        """The held direction that moves the piece, the later pressed of left and right"""
+        active = None
+        for action in self.held_actions:
+            if action in SHIFT_DIRECTIONS:
+                active = action
+        return active
+    
+    def accepts_held_input(self):
+        return not (self.game_over or self.paused or self.in_settings or self.combo_active)
+    
+    def update_held_actions(self):
+        """Fire every repeat that fell due by now, several in one call when the step was long"""
+        if not self.held_actions:
+            return
+        now = self.clock()
+        shift = self.active_shift()
+        for action, due in self.held_actions.items():
+            if action in SHIFT_DIRECTIONS:
+                if action != shift:
+                    continue
+                if self.arr == 0:
+                    if due <= now and self.accepts_held_input():
+                        self.shift_to_wall(SHIFT_DIRECTIONS[action])
+                    continue
+                interval = self.arr
+            else:
+                interval = self.repeat_delay
+            # Repeats that fall due while play is on hold are skipped, not saved up
+            while due <= now:
+                if self.accepts_held_input():
+                    self.apply_held_action(action)
+                due += interval
+            self.held_actions[action] = due
+    
+    def shift_to_wall(self, dx):
+        """Move the current piece sideways as far as it fits in one sweep"""
+        piece = self.current_piece
+        if not piece:
+            return
+        distance = 0
+        while self.is_valid_position(piece, distance + dx, 0):
+            distance += dx
+        piece.x += distance
+    
+    def apply_held_action(self, action):
+        if action == 'left':
+            self.move_piece(-1, 0)
+        elif action == 'right':
+            self.move_piece(1, 0)
+        elif action == 'soft_drop':
+            self.soft_drop()
+    
+    def apply_action(self, action):
+        """Apply a single discrete action, honoring pause, settings, game over and combo states"""
+        if action == 'pause':  # Pause toggle
+            if self.in_settings:
+                self.in_settings = False
+            else:
+                self.paused = not self.paused
+            return
+        
+        if self.game_over:
+            if action == 'restart':
+                self.restart()
+            return
+        
+        if self.in_settings:
+            self.handle_settings_action(action)
+            return
+        
+        if self.paused:
+            if action == 'open_settings':
+                self.in_settings = True
+            return
+        
+        # Don't accept input during combo
+        if self.combo_active:
+            return
+        
+        if action == 'rotate_cw':
+            self.rotate_piece(clockwise=True)
+        elif action == 'rotate_ccw':
+            self.rotate_piece(clockwise=False)
+        elif action == 'hard_drop':
+            self.hard_drop()
+        elif action == 'hold':
+            self.hold_current_piece()
+        elif action in HELD_ACTIONS:
+            self.apply_held_action(action)
+    
+    def restart(self):
+        """Start a fresh game with the same clock and board backend, seeded from this game's RNG"""
+        clock = self.clock
+        held = self.held_actions
+        timings = self.das, self.arr, self.repeat_delay
+        self.__init__(bitboard=self.bitboard, clock=self.external_clock, seed=self.rng.randrange(1 << 32),
+                      particle_capacity=self.particles.capacity)
+        self.clock = clock  # Game time keeps running across restarts, recordings rely on it
+        # Keys held through the restart stay held, repeating again once they recharge
+        self.das, self.arr, self.repeat_delay = timings
+        now = clock()
+        self.held_actions = {action: now + (self.das if action in SHIFT_DIRECTIONS else self.repeat_delay)
+                             for action in held}
+    
+    def state_digest(self):
+        """Hash of everything that decides how the game plays on, for checking that a replay matches"""
+        piece = self.current_piece
+        state = (
+            self.seed, self.clock(), self.grid, self.golden_rows,
+            (piece.type, piece.x, piece.y, piece.rotation) if piece else None,
+            self.next_piece, self.hold_piece, self.can_hold,
+            self.score, self.level, self.lines_cleared, self.fall_timer, self.fall_speed,
+            self.game_over, self.paused, self.in_settings,
+            self.combo_active, [(line_y, golden) for line_y, _, golden in self.cleared_rows],
+            self.clear_step, self.combo_timer, list(self.held_actions.items()),
+            sorted((buff_type, data['start_time']) for buff_type, data in self.active_buffs.items()),
+            self.rng.getstate(),
+        )
+        return hashlib.sha256(repr(state).encode()).hexdigest()
+    
+    def to_bytes(self):
+        """Pack the whole game state into a few kilobytes, from_bytes restores it.
+        
+        Everything that decides how the game plays on is kept, the RNG state
+        included, so a restored game continues exactly as this one would.
+        Live particles are effects only and are left out. Game times are
+        whole milliseconds, stored as they read on the game clock.
+        
+        ValueError if the game cannot be stored exactly: a seed that is not
+        a 64-bit integer, or game times made fractional by a float dt.
+        """
+        if not isinstance(self.seed, int) or not -1 << 63 <= self.seed < 1 << 63:
+            raise ValueError(f"Only games with a 64-bit integer seed can be saved, not {self.seed!r}")
+        times = [('clock', self.clock()), ('fall_timer', self.fall_timer), ('combo_timer', self.combo_timer)]
+        times += [(f"{action} repeat", due) for action, due in self.held_actions.items()]
+        times += [(f"{buff_type} start", data['start_time']) for buff_type, data in self.active_buffs.items()]
+        for name, value in times:
+            if not isinstance(value, int):
+                raise ValueError(f"Game times must be whole milliseconds to save, {name} is {value!r}; "
+                                 "step the game with integer dt")
+        try:
+            return self.pack_state()
+        except struct.error as error:
+            raise ValueError(f"Game state does not fit the save format: {error}") from None
+    
+    def pack_state(self):
+        piece = self.current_piece
+        settings = self.settings
+        _, words, gauss_next = self.rng.getstate()
+        flags = (self.bitboard | self.game_over << 1 | self.paused << 2 | self.in_settings << 3
+                 | self.can_hold << 4 | self.combo_active << 5 | settings['particle_effects'] << 6
+                 | settings['show_particles'] << 7 | (gauss_next is not None) << 8)
+        row_ys = {id(row): y for y, row in enumerate(self.grid)}
+        buffer = bytearray(STATE_HEADER.pack(
+            STATE_MAGIC, STATE_VERSION, flags, self.seed, self.clock(),
+            self.score, self.level, self.lines_cleared, self.fall_timer, self.fall_speed,
+            self.das, self.arr, self.repeat_delay, self.combo_timer, self.combo_delay, self.particle_timer,
+            self.pieces_placed, self.golden_count, self.golden_cubes_spawned, self.golden_cubes_cleared,
+            self.golden_cubes_in_line, self.clear_step, self.settings_selected,
+            PIECE_CODES[piece.type if piece else None], piece.x if piece else 0, piece.y if piece else 0,
+            piece.rotation if piece else 0, PIECE_CODES[self.next_piece], PIECE_CODES[self.hold_piece],
+            self.golden_spawn_chance, settings['particle_density'], settings['particle_lifetime'],
+            self.particle_quality, gauss_next or 0.0,
+            len(self.open_cells), len(self.cleared_rows), len(self.held_actions), len(self.active_buffs),
+            len(self.buff_activations),
+        ))
+        codes = CELL_CODES
+        buffer += bytes([codes[cell] for row in self.grid for cell in row])
+        buffer += STATE_GOLDEN_ROWS.pack(*self.golden_rows)
+        buffer += STATE_RNG.pack(*words)
+        buffer += bytes([row_ys[id(row)] * GRID_WIDTH + x for row, x in self.open_cells])
+        for line_y, row, golden in self.cleared_rows:
+            buffer += STATE_CLEARED_ROW.pack(line_y, golden, bytes([codes[cell] for cell in row]))
+        for action, due in self.held_actions.items():
+            buffer += STATE_HELD.pack(HELD_CODES[action], due)
+        for buff_type, data in self.active_buffs.items():
+            buffer += STATE_BUFF.pack(BUFF_CODES[buff_type], data['start_time'], data['duration'])
+        for buff_type, count in self.buff_activations.items():
+            buffer += STATE_ACTIVATIONS.pack(BUFF_CODES[buff_type], count)
+        return bytes(buffer)
+    
+    @classmethod
+    def from_bytes(cls, data, clock=None, particle_capacity=PARTICLE_CAPACITY):
+        """Restore a game saved by to_bytes; ValueError if data is not one.
+        
+        Without a clock the game's own clock resumes at the saved time. An
+        external clock should read the saved time too, buffs and held keys
+        are stamped with absolute game times.
+        """
+        try:
+            (magic, version, flags, seed, now, score, level, lines_cleared, fall_timer, fall_speed,
+             das, arr, repeat_delay, combo_timer, combo_delay, particle_timer, pieces_placed, golden_count,
+             golden_spawned, golden_cleared, golden_in_line, clear_step, settings_selected,
+             piece_code, piece_x, piece_y, piece_rotation, next_code, hold_code,
+             golden_spawn_chance, particle_density, particle_lifetime, particle_quality, gauss_next,
+             open_count, cleared_count, held_count, buff_count, activation_count) = STATE_HEADER.unpack_from(data)
+        except struct.error:
+            raise ValueError("not a saved TetrisGame state") from None
+        if magic != STATE_MAGIC:
+            raise ValueError("not a saved TetrisGame state")
+        if version != STATE_VERSION:
+            raise ValueError(f"unsupported saved state version {version}")
+        size = (STATE_HEADER.size + GRID_WIDTH * GRID_HEIGHT + STATE_GOLDEN_ROWS.size + STATE_RNG.size + open_count
+                + cleared_count * STATE_CLEARED_ROW.size + held_count * STATE_HELD.size
+                + buff_count * STATE_BUFF.size + activation_count * STATE_ACTIVATIONS.size)
+        if len(data) != size:
+            raise ValueError(f"saved state is {len(data)} bytes, its header describes {size}")
+        
+        game = cls(bitboard=bool(flags & 1), clock=clock, seed=seed, particle_capacity=particle_capacity)
+        if clock is None:
+            game.clock.now_ms = now
+        game.game_over = bool(flags & 2)
+        game.paused = bool(flags & 4)
+        game.in_settings = bool(flags & 8)
+        game.can_hold = bool(flags & 16)
+        game.combo_active = bool(flags & 32)
+        game.settings.update(particle_effects=bool(flags & 64), show_particles=bool(flags & 128),
+                             particle_density=particle_density, particle_lifetime=particle_lifetime)
+        game.score, game.level, game.lines_cleared = score, level, lines_cleared
+        game.fall_timer, game.fall_speed = fall_timer, fall_speed
+        game.das, game.arr, game.repeat_delay = das, arr, repeat_delay
+        game.combo_timer, game.combo_delay, game.clear_step = combo_timer, combo_delay, clear_step
+        game.particle_timer, game.particle_quality = particle_timer, particle_quality
+        game.pieces_placed, game.golden_count = pieces_placed, golden_count
+        game.golden_cubes_spawned, game.golden_cubes_cleared = golden_spawned, golden_cleared
+        game.golden_cubes_in_line, game.golden_spawn_chance = golden_in_line, golden_spawn_chance
+        game.settings_selected = settings_selected
+        game.current_piece = Tetromino(PIECE_NAMES[piece_code], piece_x, piece_y, piece_rotation) if piece_code else None
+        game.next_piece = PIECE_NAMES[next_code]
+        game.hold_piece = PIECE_NAMES[hold_code]
+        
+        pos = STATE_HEADER.size
+        cells = data[pos:pos + GRID_WIDTH * GRID_HEIGHT]
+        pos += GRID_WIDTH * GRID_HEIGHT
+        colors = CELL_COLORS
+        game.grid = [[colors[code] for code in cells[y * GRID_WIDTH:(y + 1) * GRID_WIDTH]] for y in range(GRID_HEIGHT)]
+        if game.row_masks is not None:
+            # Cell codes as binary digits, last column first, read as an int give the row's mask
+            game.row_masks = [int(cells[y * GRID_WIDTH:(y + 1) * GRID_WIDTH][::-1].translate(OCCUPIED_DIGITS), 2)
+                              for y in range(GRID_HEIGHT)]
+            game.board_bits = pack_board(game.row_masks)
+        game.rebuild_column_tops()
+        game.golden_rows = list(STATE_GOLDEN_ROWS.unpack_from(data, pos))
+        pos += STATE_GOLDEN_ROWS.size
+        game.rng.setstate((3, STATE_RNG.unpack_from(data, pos), gauss_next if flags & 256 else None))
+        pos += STATE_RNG.size
+        game.open_cells = [(game.grid[cell // GRID_WIDTH], cell % GRID_WIDTH) for cell in data[pos:pos + open_count]]
+        game.open_cell_slots = {(id(row), x): i for i, (row, x) in enumerate(game.open_cells)}
+        pos += open_count
+        game.cleared_rows = []
+        for _ in range(cleared_count):
+            line_y, golden, row = STATE_CLEARED_ROW.unpack_from(data, pos)
+            game.cleared_rows.append((line_y, [colors[code] for code in row], golden))
+            pos += STATE_CLEARED_ROW.size
+        game.held_actions = {}
+        for _ in range(held_count):
+            code, due = STATE_HELD.unpack_from(data, pos)
+            game.held_actions[HELD_ACTIONS[code]] = due
+            pos += STATE_HELD.size
+        game.active_buffs = {}
+        for _ in range(buff_count):
+            code, start_time, duration = STATE_BUFF.unpack_from(data, pos)
+            game.active_buffs[BUFF_NAMES[code]] = {'start_time': start_time, 'duration': duration}
+            pos += STATE_BUFF.size
+        game.buff_activations = {}
+        for _ in range(activation_count):
+            code, count = STATE_ACTIVATIONS.unpack_from(data, pos)
+            game.buff_activations[BUFF_NAMES[code]] = count
+            pos += STATE_ACTIVATIONS.size
+        return game
+    
+    def clone(self, particle_capacity=0):
+        """Independent copy of this game that plays on exactly as it would.
+        
+        Much cheaper than copy.deepcopy: immutable attributes are shared and
+        only mutable state is copied, so a new mutable attribute needs a line
+        here as well as in to_bytes. The copy has its own board_version and
+        starts without live particles; copies are mostly for lookahead, so it
+        gets no particle arrays unless particle_capacity asks for them.
+        """
+        game = object.__new__(type(self))
+        game.__dict__.update(self.__dict__)
+        game.board_version = next(_board_versions)
+        if self.external_clock is None:
+            game.clock = SimulationClock(self.clock())
+        game.rng = copy_random(self.rng)
+        game.fx_rng = copy_random(self.fx_rng)
+        
+        rows = {}
+        grid = []
+        for row in self.grid:
+            copy = row[:]
+            rows[id(row)] = copy
+            grid.append(copy)
+        game.grid = grid
+        game.open_cells = [(rows[id(row)], x) for row, x in self.open_cells]
+        game.open_cell_slots = {(id(row), x): i for i, (row, x) in enumerate(game.open_cells)}
+        game.golden_rows = self.golden_rows[:]
+        if self.row_masks is not None:
+            game.row_masks = self.row_masks[:]
+        game.column_tops = self.column_tops[:]
+        game.cleared_rows = [(line_y, row[:], golden) for line_y, row, golden in self.cleared_rows]
+        
+        piece = self.current_piece
+        if piece is not None:
+            game.current_piece = Tetromino(piece.type, piece.x, piece.y, piece.rotation)
+        game.held_actions = self.held_actions.copy()
+        game.active_buffs = {buff_type: data.copy() for buff_type, data in self.active_buffs.items()}
+        game.buff_activations = self.buff_activations.copy()
+        game.settings = self.settings.copy()
+        game.particles = make_particle_system(GAME_WIDTH, GAME_HEIGHT, particle_capacity)
+        return game
+    
+    def handle_settings_action(self, action):
+        """Handle input in settings menu"""
+        if action == 'menu_up':
+            self.settings_selected = (self.settings_selected - 1) % len(self.settings_options)
+        elif action == 'menu_down':
+            self.settings_selected = (self.settings_selected + 1) % len(self.settings_options)
+        elif action == 'menu_left':
+            self.adjust_setting(-1)
+        elif action == 'menu_right':
+            self.adjust_setting(1)
+        elif action == 'menu_close':
+            self.in_settings = False
+    
+    def adjust_setting(self, direction):
+        """Adjust the currently selected setting"""
+        current_option = self.settings_options[self.settings_selected]
+        
+        if current_option == 'particle_density':
+            self.settings['particle_density'] = max(0.0, min(2.0, 
+                self.settings['particle_density'] + direction * 0.1))
+        elif current_option == 'particle_lifetime':
+            self.settings['particle_lifetime'] = max(0.5, min(2.0, 
+                self.settings['particle_lifetime'] + direction * 0.1))
+        elif current_option == 'particle_effects':
+            self.settings['particle_effects'] = not self.settings['particle_effects']
+        elif current_option == 'show_particles':
+            self.settings['show_particles'] = not self.settings['show_particles']
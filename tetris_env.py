@@ -0,0 +1,391 @@
+"""Vectorized training environment: N TetrisGame boards stepped as one batch.
+
+VecTetrisEnv follows the Gymnasium vector API without depending on it:
+reset() returns (observations, infos) and step(actions) returns
+(observations, rewards, terminated, truncated, infos), every value a NumPy
+array with one row per board. Finished boards reset themselves, their last
+episode's score, length and observation are reported in infos.
+
+Observations are a dict of arrays, refreshed in place every step:
+
+    board     (N, H, W) uint8   locked cells
+    golden    (N, H, W) uint8   golden cubes
+    pieces    (N, 3)    int8    current, next and hold piece as PIECE_TYPES index, -1 for none
+    pose      (N, 3)    int8    current piece x, y and rotation
+    buffs     (N, B)    float32 seconds left of each BUFF_TYPES buff, 0 when inactive
+
+Actions are one integer per board. In 'placement' mode an action picks a
+(rotation, x) from PLACEMENTS: the piece is put there at its current height
+if it fits and hard dropped, and the game clock then moves on by
+ms_per_step with the next piece held at its spawn, so each step's reward
+is the score of exactly that placement. In 'input' mode an action is one
+of INPUT_ACTIONS, applied before an update(ms_per_step). Rewards are score
+deltas.
+
+The env keeps every board's packed rows, column tops and pieces in NumPy
+arrays as well. In placement mode the fit test, drop distance, lock and
+full row check run on those arrays for the whole batch, and each game is
+only handed the result (TetrisGame.place_resolved). Line clears, active
+buffs and pieces tucked under an overhang are left to the game's own
+hard_drop, as is everything in input mode; the arrays are then reloaded
+from those games.
+
+    python tetris_env.py --envs 256 --steps 20000
+    python tetris_env.py --mode input --envs 64
+"""
+import argparse
+import time
+
+import numpy as np
+
+from tetris_engine import (
+    GRID_WIDTH, GRID_HEIGHT, BOARD_STRIDE, BOARD_LEFT_PAD, BOARD_TOP_PAD, BOARD_FLOOR_ROWS, BUFF_TYPES,
+    FULL_ROW_MASK, PIECE_TYPES, ROTATION_COUNTS, SHAPE_BOARD_MASKS, SHAPE_CELLS, Tetromino, TetrisGame,
+)
+
+PIECE_INDEX = {piece_type: i for i, piece_type in enumerate(PIECE_TYPES)}
+PIECE_SLOTS = {None: -1, **PIECE_INDEX}  # For next and hold, which may be empty
+# Leftmost x any piece can reach: the I piece's first rotation starts two columns in
+PLACEMENT_XS = range(-2, GRID_WIDTH)
+PLACEMENTS = tuple((rotation, x) for rotation in range(4) for x in PLACEMENT_XS)
+PLACEMENT_ROTATION = np.array([rotation for rotation, _ in PLACEMENTS])
+PLACEMENT_X = np.array([x for _, x in PLACEMENTS])
+INPUT_ACTIONS = ('noop', 'left', 'right', 'soft_drop', 'rotate_cw', 'rotate_ccw', 'hard_drop', 'hold')
+BUFF_INDEX = {buff_type: i for i, buff_type in enumerate(BUFF_TYPES)}
+
+# Games keep their board packed into board_bits (see tetris_engine), read here as
+# BOARD_ROWS little-endian 16-bit rows
+BOARD_ROWS = BOARD_TOP_PAD + GRID_HEIGHT + BOARD_FLOOR_ROWS
+BOARD_BYTES = BOARD_ROWS * BOARD_STRIDE // 8
+FIELD_ROWS = slice(BOARD_TOP_PAD, BOARD_TOP_PAD + GRID_HEIGHT)
+FIELD_MASK = FULL_ROW_MASK << BOARD_LEFT_PAD
+
+# Placement fit tests against the 4 board rows a piece spans, taken as one uint64:
+# every (piece, rotation) mask shifted to every placement column, which stays
+# within 64 bits since no mask reaches past bit 51 and no shift past 12
+PLACEMENT_MASKS = np.array([
+    [[SHAPE_BOARD_MASKS[piece_type][rotation] << (x + BOARD_LEFT_PAD) if rotation < ROTATION_COUNTS[piece_type] else 0
+      for x in PLACEMENT_XS] for rotation in range(4)]
+    for piece_type in PIECE_TYPES
+], dtype=np.uint64).reshape(len(PIECE_TYPES), len(PLACEMENTS))
+# Rotations a piece does not have never count as fitting
+PLACEMENT_ROTATIONS = np.array([
+    [rotation < ROTATION_COUNTS[piece_type] for rotation, _ in PLACEMENTS] for piece_type in PIECE_TYPES
+])
+
+NO_CELL = -1
+
+def _piece_tables():
+    """Per (piece, rotation): each of the 4 rows of its mask, to be shifted by x + BOARD_LEFT_PAD,
+    then the highest and the lowest cell of each of its 4 columns, NO_CELL where a column is empty"""
+    shape = (len(PIECE_TYPES), 4, 4)
+    rows = np.zeros(shape, dtype=np.uint16)
+    tops = np.full(shape, NO_CELL, dtype=np.int16)
+    bottoms = np.full(shape, NO_CELL, dtype=np.int16)
+    for i, piece_type in enumerate(PIECE_TYPES):
+        for rotation in range(4):
+            for col, row in SHAPE_CELLS[piece_type][rotation % ROTATION_COUNTS[piece_type]]:
+                rows[i, rotation, row] |= 1 << col
+                if tops[i, rotation, col] == NO_CELL:
+                    tops[i, rotation, col] = row
+                bottoms[i, rotation, col] = max(bottoms[i, rotation, col], row)
+    return rows, tops, bottoms
+
+PIECE_ROWS, PIECE_COLUMN_TOPS, PIECE_COLUMN_BOTTOMS = _piece_tables()
+# Where Tetromino puts a new piece
+SPAWN_POSE = tuple(getattr(Tetromino(PIECE_TYPES[0]), name) for name in ('x', 'y', 'rotation'))
+
+def board_windows(boards, rows):
+    """The 4 board rows from rows[i] down of each board i, as one uint64 each"""
+    index = rows[:, None] + np.arange(4)
+    return boards[np.arange(len(boards))[:, None], index].view('<u8')[:, 0]
+
+class VecTetrisEnv:
+    """A batch of num_envs games, board i of the first episode seeded with seed + i"""
+    def __init__(self, num_envs, mode='placement', seed=0, max_pieces=None, ms_per_step=None):
+        if mode not in ('placement', 'input'):
+            raise ValueError(f"Unknown mode {mode!r}, expected 'placement' or 'input'")
+        self.num_envs = num_envs
+        self.mode = mode
+        self.num_actions = len(PLACEMENTS) if mode == 'placement' else len(INPUT_ACTIONS)
+        self.max_pieces = max_pieces
+        # A piece every second, or a 60 Hz frame per input
+        self.ms_per_step = ms_per_step if ms_per_step is not None else (1000 if mode == 'placement' else 16)
+        self.next_seed = seed
+        self.games = [None] * num_envs
+        
+        self.observations = {
+            'board': np.zeros((num_envs, GRID_HEIGHT, GRID_WIDTH), dtype=np.uint8),
+            'golden': np.zeros((num_envs, GRID_HEIGHT, GRID_WIDTH), dtype=np.uint8),
+            'pieces': np.zeros((num_envs, 3), dtype=np.int8),
+            'pose': np.zeros((num_envs, 3), dtype=np.int8),
+            'buffs': np.zeros((num_envs, len(BUFF_TYPES)), dtype=np.float32),
+        }
+        self.bit_shifts = np.arange(GRID_WIDTH, dtype=np.uint16)
+        self.episode_steps = np.zeros(num_envs, dtype=np.int64)
+        self.pieces = [Tetromino(piece_type) for piece_type in PIECE_TYPES]  # Scratch pieces for fit checks
+        
+        # The games' state as arrays, see sync
+        self.boards = np.zeros((num_envs, BOARD_ROWS), dtype='<u2')
+        self.golden_rows = np.zeros((num_envs, GRID_HEIGHT), dtype=np.uint16)
+        self.column_tops = np.zeros((num_envs, GRID_WIDTH), dtype=np.int16)
+        self.piece_slots = np.zeros((num_envs, 3), dtype=np.int8)  # As the 'pieces' observation
+        self.poses = np.zeros((num_envs, 3), dtype=np.int16)
+        self.buffs = np.zeros((num_envs, len(BUFF_TYPES)), dtype=np.float32)
+        self.scores = np.zeros(num_envs, dtype=np.int64)
+        self.pieces_placed = np.zeros(num_envs, dtype=np.int64)
+        self.game_over = np.zeros(num_envs, dtype=bool)
+        # Boards whose next placement the game has to resolve itself: buffs, held keys,
+        # a pause or animation, or no piece in play
+        self.engine_only = np.zeros(num_envs, dtype=bool)
+    
+    def new_game(self):
+        # Nothing renders particles, so the game needs no arrays for them
+        game = TetrisGame(bitboard=True, seed=self.next_seed, particle_capacity=0)
+        self.next_seed += 1
+        game.settings['particle_effects'] = False
+        game.combo_delay = 0  # Nor the line clear animation
+        return game
+    
+    def reset(self, seed=None):
+        if seed is not None:
+            self.next_seed = seed
+        self.games = [self.new_game() for _ in range(self.num_envs)]
+        self.episode_steps[:] = 0
+        self.sync(np.arange(self.num_envs))
+        return self.observe(), {}
+    
+    def sync(self, rows):
+        """Reload the arrays of the boards in `rows` (an index array) from their games.
+        
+        step and reset keep them current; code that changes or swaps games
+        between steps calls this for the boards it touched.
+        """
+        games = [self.games[i] for i in rows.tolist()]
+        if not games:
+            return
+        self.boards[rows] = np.frombuffer(b''.join(game.board_bits.to_bytes(BOARD_BYTES, 'little') for game in games),
+                                          dtype='<u2').reshape(len(games), BOARD_ROWS)
+        self.golden_rows[rows] = [game.golden_rows for game in games]
+        # Column tops and engine_only only serve placements
+        placement = self.mode == 'placement'
+        if placement:
+            self.column_tops[rows] = [game.column_tops for game in games]
+        
+        index = PIECE_SLOTS
+        states = []
+        buffs = np.zeros((len(games), len(BUFF_TYPES)), dtype=np.float32)
+        for i, game in enumerate(games):
+            piece = game.current_piece
+            if piece is not None:
+                current, x, y, rotation = index[piece.type], piece.x, piece.y, piece.rotation
+            else:
+                current, x, y, rotation = -1, 0, 0, 0
+            engine_only = placement and (piece is None or not 0 <= y < GRID_HEIGHT or game.game_over or game.paused
+                                         or game.in_settings or game.combo_active or game.held_actions
+                                         or game.active_buffs)
+            states.append((current, index[game.next_piece], index[game.hold_piece], x, y, rotation,
+                           game.score, game.pieces_placed, game.game_over, bool(engine_only)))
+            if game.active_buffs:
+                now = game.clock()
+                for buff_type, data in game.active_buffs.items():
+                    buffs[i, BUFF_INDEX[buff_type]] = (data['duration'] - (now - data['start_time'])) / 1000
+        states = np.array(states, dtype=np.int64)
+        self.piece_slots[rows] = states[:, 0:3]
+        self.poses[rows] = states[:, 3:6]
+        self.scores[rows] = states[:, 6]
+        self.pieces_placed[rows] = states[:, 7]
+        self.game_over[rows] = states[:, 8]
+        self.engine_only[rows] = states[:, 9]
+        self.buffs[rows] = buffs
+    
+    def step(self, actions):
+        actions = np.asarray(actions)
+        previous_scores = self.scores.copy()
+        if self.mode == 'placement':
+            engine_rows = self.place(actions)
+        else:
+            for game, action in zip(self.games, actions.tolist()):
+                if action:
+                    game.apply_action(INPUT_ACTIONS[action])
+                game.update(self.ms_per_step)
+            engine_rows = np.arange(self.num_envs)
+        self.sync(engine_rows)
+        
+        rewards = (self.scores - previous_scores).astype(np.float32)
+        self.episode_steps += 1
+        terminated = self.game_over.copy()
+        if self.max_pieces is not None:
+            truncated = ~terminated & (self.pieces_placed >= self.max_pieces)
+        else:
+            truncated = np.zeros(self.num_envs, dtype=bool)
+        
+        infos = {}
+        done = terminated | truncated
+        if done.any():
+            finished = np.flatnonzero(done)
+            infos['final_score'] = np.where(done, self.scores, 0)
+            infos['final_steps'] = np.where(done, self.episode_steps, 0)
+            # Taken before the reset replaces them, read the rows where done is set
+            infos['final_observation'] = {key: array.copy() for key, array in self.observe().items()}
+            for i in finished.tolist():
+                self.games[i] = self.new_game()
+            self.episode_steps[finished] = 0
+            self.sync(finished)
+        return self.observe(), rewards, terminated, truncated, infos
+    
+    def place(self, actions):
+        """Carry out one placement on every board, return the boards their games resolved"""
+        n = self.num_envs
+        boards = self.boards
+        types = self.piece_slots[:, 0].astype(np.intp)
+        # The games resolve engine-only boards, which only need to stay inside the arrays here
+        x, y, rotation = np.where(self.engine_only, 0, self.poses.T).astype(np.intp)
+        
+        # Move to the chosen (rotation, x) where it fits at the current height
+        windows = board_windows(boards, y + BOARD_TOP_PAD)
+        fits = ((windows & PLACEMENT_MASKS[types, actions]) == 0) & PLACEMENT_ROTATIONS[types, actions]
+        x = np.where(fits, PLACEMENT_X[actions], x)
+        rotation = np.where(fits, PLACEMENT_ROTATION[actions], rotation)
+        
+        # Drop distance from the column tops, the piece columns laid over the board's
+        offsets = np.arange(GRID_WIDTH) - x[:, None]
+        in_piece = (offsets >= 0) & (offsets < 4)
+        offsets = offsets.clip(0, 3)
+        bottoms = PIECE_COLUMN_BOTTOMS[types[:, None], rotation[:, None], offsets]
+        occupied = in_piece & (bottoms != NO_CELL)
+        gaps = np.where(occupied, self.column_tops - (y[:, None] + bottoms) - 1, GRID_HEIGHT)
+        drop = gaps.min(axis=1)
+        landing = y + drop
+        
+        # Lock into the 4 rows the piece spans and look for full ones
+        rows = landing[:, None] + BOARD_TOP_PAD + np.arange(4)
+        piece_rows = PIECE_ROWS[types, rotation] << (x + BOARD_LEFT_PAD)[:, None].astype(np.uint16)
+        locked_rows = boards[np.arange(n)[:, None], rows] | piece_rows
+        completes_line = (((locked_rows & FIELD_MASK) == FIELD_MASK) & (piece_rows != 0)).any(axis=1)
+        
+        # A negative gap is a piece column under an overhang, where hard_drop scans instead
+        resolved = ~(self.engine_only | completes_line | (drop < 0))
+        engine_rows = np.flatnonzero(~resolved)
+        self.place_in_games(engine_rows, actions)
+        
+        rows_resolved = np.flatnonzero(resolved)
+        if len(rows_resolved):
+            self.lock(rows_resolved, x, rotation, drop, landing, rows, locked_rows, types, offsets, occupied)
+        return engine_rows
+    
+    def lock(self, resolved, x, rotation, drop, landing, rows, locked_rows, types, offsets, occupied):
+        """Write the placements of the boards in `resolved` into the arrays, then hand them to the games"""
+        boards = self.boards
+        boards[resolved[:, None], rows[resolved]] = locked_rows[resolved]
+        tops = PIECE_COLUMN_TOPS[types[resolved, None], rotation[resolved, None], offsets[resolved]]
+        column_tops = self.column_tops[resolved]
+        np.minimum(column_tops, np.where(occupied[resolved], landing[resolved, None] + tops, GRID_HEIGHT),
+                   out=column_tops)
+        self.column_tops[resolved] = column_tops
+        
+        field = (boards[resolved, FIELD_ROWS] >> BOARD_LEFT_PAD) & FULL_ROW_MASK
+        packed = boards[resolved].tobytes()
+        nexts = []
+        overs = []
+        ms_per_step = self.ms_per_step
+        games = self.games
+        for k, (i, piece_x, piece_rotation, piece_drop, row_masks, tops) in enumerate(zip(
+                resolved.tolist(), x[resolved].tolist(), rotation[resolved].tolist(), drop[resolved].tolist(),
+                field.tolist(), column_tops.tolist())):
+            game = games[i]
+            board_bits = int.from_bytes(packed[k * BOARD_BYTES:(k + 1) * BOARD_BYTES], 'little')
+            game.place_resolved(piece_x, piece_rotation, piece_drop, board_bits, row_masks, tops)
+            game.update(ms_per_step, gravity=False)
+            nexts.append(PIECE_SLOTS[game.next_piece])
+            overs.append(game.game_over)
+        
+        # No buffs are active on these boards, so the score multiplier is 1
+        self.scores[resolved] += 2 * drop[resolved]
+        self.pieces_placed[resolved] += 1
+        self.piece_slots[resolved, 0] = self.piece_slots[resolved, 1]
+        self.piece_slots[resolved, 1] = nexts
+        self.poses[resolved] = SPAWN_POSE
+        self.game_over[resolved] = overs
+        self.engine_only[resolved] = overs
+    
+    def place_in_games(self, rows, actions):
+        """The placement step done by each game of `rows` itself"""
+        pieces = self.pieces
+        games = self.games
+        for i, action in zip(rows.tolist(), actions[rows].tolist()):
+            game = games[i]
+            piece = game.current_piece
+            if piece is not None:
+                rotation, x = PLACEMENTS[action]
+                candidate = pieces[PIECE_INDEX[piece.type]]
+                candidate.x, candidate.y, candidate.rotation = x, piece.y, rotation
+                if rotation < ROTATION_COUNTS[piece.type] and game.is_valid_position(candidate):
+                    piece.x, piece.rotation = x, rotation
+                game.hard_drop()
+            # Time passes between pieces: the next one waits at its spawn for the next
+            # action instead of falling, or locking, under gravity in this step
+            game.update(self.ms_per_step, gravity=False)
+    
+    def observe(self):
+        """Refresh the observation arrays from the boards' arrays"""
+        obs = self.observations
+        shifts = self.bit_shifts
+        row_masks = self.boards[:, FIELD_ROWS] >> BOARD_LEFT_PAD
+        np.bitwise_and(row_masks[:, :, None] >> shifts, 1, out=obs['board'], casting='unsafe')
+        np.bitwise_and(self.golden_rows[:, :, None] >> shifts, 1, out=obs['golden'], casting='unsafe')
+        obs['pieces'][:] = self.piece_slots
+        obs['pose'][:] = self.poses
+        obs['buffs'][:] = self.buffs
+        return obs
+    
+    def action_masks(self):
+        """(N, num_actions) bool array, True where an action does what it says.
+        
+        For placements that is a rotation the piece has and an x where it fits
+        at its current height; every input is always allowed.
+        """
+        if self.mode == 'input':
+            return np.ones((self.num_envs, self.num_actions), dtype=bool)
+        types = self.piece_slots[:, 0].astype(np.intp)
+        windows = board_windows(self.boards, self.poses[:, 1].astype(np.intp) + BOARD_TOP_PAD)
+        masks = ((windows[:, None] & PLACEMENT_MASKS[types]) == 0) & PLACEMENT_ROTATIONS[types]
+        masks[types < 0] = False
+        return masks
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure VecTetrisEnv throughput with random actions")
+    parser.add_argument('--envs', type=int, default=256, help="boards in the batch")
+    parser.add_argument('--steps', type=int, default=20000, help="board steps to run in total")
+    parser.add_argument('--mode', choices=('placement', 'input'), default='placement')
+    parser.add_argument('--masked', action='store_true', help="sample only actions allowed by action_masks()")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    
+    env = VecTetrisEnv(args.envs, args.mode, seed=args.seed)
+    env.reset()
+    rng = np.random.default_rng(args.seed)
+    batches = max(1, args.steps // args.envs)
+    episodes = 0
+    total_score = 0
+    start = time.perf_counter()
+    for _ in range(batches):
+        if args.masked:
+            masks = env.action_masks()
+            actions = (rng.random(masks.shape) * masks).argmax(axis=1)
+        else:
+            actions = rng.integers(env.num_actions, size=args.envs)
+        _, _, terminated, truncated, infos = env.step(actions)
+        if 'final_score' in infos:
+            done = terminated | truncated
+            episodes += int(done.sum())
+            total_score += int(infos['final_score'][done].sum())
+    elapsed = time.perf_counter() - start
+    
+    steps = batches * args.envs
+    print(f"{steps} steps over {args.envs} boards in {elapsed:.2f}s ({steps / elapsed:.0f} steps/s)")
+    if episodes:
+        print(f"{episodes} episodes finished, mean score {total_score / episodes:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Load test for tetris_server.py: many simulated players against one server.
+
+Each player is a coroutine on one connection. It sends inputs at random
+intervals (an average of --rate per second, most players being idle most
+of the time) and asks for the game state every --state-every seconds,
+timing the round trip. A player whose game ends restarts it. At the end
+the server's own stats are fetched and printed with the client numbers.
+
+    python tetris_server.py &
+    python tetris_loadtest.py --clients 2000 --duration 30
+    python tetris_loadtest.py --spawn-server --clients 5000 --rate 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from tetris_engine import HELD_ACTIONS
+from tetris_server import DEFAULT_PORT
+
+TAP_ACTIONS = ('left', 'right', 'rotate_cw', 'rotate_ccw', 'hard_drop', 'hold', 'soft_drop')
+
+class Totals:
+    def __init__(self):
+        self.connected = 0
+        self.refused = 0
+        self.inputs = 0
+        self.games_over = 0
+        self.errors = 0
+        self.round_trips = []  # State request latencies in seconds
+
+def encode(message):
+    return json.dumps(message, separators=(',', ':')).encode() + b'\n'
+
+async def connect(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+async def player(args, totals, rng, stop_at):
+    try:
+        reader, writer = await connect(args)
+        welcome = json.loads(await reader.readline() or b'{}')
+    except OSError:
+        totals.refused += 1
+        return
+    if welcome.get('op') != 'welcome':
+        totals.refused += 1
+        writer.close()
+        return
+    totals.connected += 1
+    pending = []  # Send times of state requests waiting for their reply
+    
+    async def read_replies():
+        async for line in reader:
+            message = json.loads(line)
+            op = message['op']
+            if op == 'state':
+                totals.round_trips.append(time.perf_counter() - pending.pop(0))
+            elif op == 'game_over':
+                totals.games_over += 1
+                writer.write(encode({'op': 'action', 'action': 'restart'}))
+            elif op == 'error':
+                totals.errors += 1
+    
+    replies = asyncio.create_task(read_replies())
+    held = set()
+    next_state = time.perf_counter() + rng.uniform(0, args.state_every)
+    try:
+        while True:
+            now = time.perf_counter()
+            wait = min(rng.expovariate(args.rate), next_state - now, stop_at - now)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            if now >= next_state:
+                pending.append(now)
+                writer.write(encode({'op': 'state'}))
+                next_state = now + args.state_every
+            elif rng.random() < 0.7:
+                writer.write(encode({'op': 'action', 'action': rng.choice(TAP_ACTIONS)}))
+                totals.inputs += 1
+            else:
+                action = rng.choice(HELD_ACTIONS)
+                writer.write(encode({'op': 'release' if action in held else 'press', 'action': action}))
+                held ^= {action}
+                totals.inputs += 1
+            await writer.drain()
+    except ConnectionError:
+        totals.errors += 1
+    finally:
+        replies.cancel()
+        writer.close()
+
+async def server_stats(args):
+    reader, writer = await connect(args)
+    await reader.readline()  # Welcome
+    writer.write(encode({'op': 'stats'}))
+    stats = json.loads(await reader.readline())
+    writer.close()
+    return stats
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else 0.0
+
+async def run(args):
+    totals = Totals()
+    before = await server_stats(args)
+    start = time.perf_counter()
+    stop_at = start + args.duration
+    players = []
+    for i in range(args.clients):
+        players.append(asyncio.create_task(player(args, totals, random.Random(args.seed + i), stop_at)))
+        if args.ramp and i % args.ramp == args.ramp - 1:
+            await asyncio.sleep(0.01)  # Connect in batches, the listen backlog is finite
+    # Poll the server while every player is still connected. Scheduler lag is
+    # reported per poll, the connection burst at the start is left out.
+    peak = None
+    lags = []
+    settled = False
+    while time.perf_counter() < stop_at - 1:
+        await asyncio.sleep(min(1, stop_at - 1 - time.perf_counter()))
+        peak = await server_stats(args)
+        if settled:
+            lags.append(peak['max_lag_ms'])
+        settled = totals.connected + totals.refused == args.clients
+    await asyncio.gather(*players)
+    after = peak or await server_stats(args)
+    elapsed = time.perf_counter() - start
+    
+    wall = (after['uptime_ms'] - before['uptime_ms']) / 1000
+    print(f"{totals.connected}/{args.clients} players connected ({totals.refused} refused), "
+          f"{totals.inputs} inputs in {elapsed:.1f}s ({totals.inputs / elapsed:.0f}/s), "
+          f"{totals.games_over} games over, {totals.errors} errors")
+    rtt = [t * 1000 for t in totals.round_trips]
+    print(f"state round trip ms: p50 {percentile(rtt, 50):.2f}  p95 {percentile(rtt, 95):.2f}  "
+          f"p99 {percentile(rtt, 99):.2f}  max {max(rtt, default=0):.2f}  ({len(rtt)} requests)")
+    print(f"server: {after['sessions']} sessions, {after['scheduled']} scheduled, "
+          f"{after['updates'] - before['updates']} updates, "
+          f"cpu {(after['cpu_seconds'] - before['cpu_seconds']) / wall:.0%} of one core, "
+          f"scheduler lag ms: median {percentile(lags, 50)}  max {max(lags, default=0)}")
+    print(f"memory: {after['mean_session_bytes']} bytes of game state per session, "
+          f"max RSS {after.get('max_rss_bytes', 0) / 2**20:.1f} MiB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate many players against tetris_server.py")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help="connect over a Unix socket instead of TCP")
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=20, help="seconds every player stays connected")
+    parser.add_argument('--rate', type=float, default=0.5, help="mean inputs per second per player")
+    parser.add_argument('--state-every', type=float, default=2.0, help="seconds between state requests per player")
+    parser.add_argument('--ramp', type=int, default=200, help="players connecting per 10 ms, 0 for all at once")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--spawn-server', action='store_true',
+                        help="start tetris_server.py for the run and stop it afterwards")
+    args = parser.parse_args(argv)
+    
+    server = None
+    if args.spawn_server:
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tetris_server.py')
+        command = [sys.executable, script, '--max-sessions', str(args.clients + 10)]
+        command += ['--unix', args.unix] if args.unix else ['--host', args.host, '--port', str(args.port)]
+        server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        server.stdout.readline()  # "listening on ..."
+    try:
+        asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""Particle simulation for landing and line clear effects.
+
+Two interchangeable backends share the same interface (emit, update,
+draw_items, stats, len): a NumPy structure-of-arrays system that steps
+every particle with a handful of array operations, and a pool of reused
+Particle records used when NumPy is not installed. Both are allocated
+once at a fixed capacity; emits past it are dropped and counted as
+overflow.
+
+The physics is tuned per step of PARTICLE_STEP_MS, so callers advance
+particles in steps of that size whatever their own frame rate. Both
+backends remember the previous step's positions, and draw_items() can
+blend between the two for smooth motion at render rates above 60 Hz.
+
+Each backend holds at most `budget` particles. enforce_budget() culls the
+excess by priority, lowest first and oldest first within a priority, so
+a burst of line clear particles pushes out old landing dust first.
+"""
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, fall back to per-object particles
+    np = None
+
+PARTICLE_GRAVITY = 0.2
+PARTICLE_BOUNCE = 0.7
+PARTICLE_FRICTION = 0.9
+PARTICLE_STEP_MS = 1000 / 60
+PARTICLE_BUDGET = 1500
+# Room for a full budget plus the largest burst emitted before it is enforced
+PARTICLE_CAPACITY = 2 * PARTICLE_BUDGET
+
+# Culling priorities, lower priorities are dropped first
+PRIORITY_LANDING = 0
+PRIORITY_LINE_CLEAR = 1
+PRIORITY_GOLDEN = 2
+
+class Particle:
+    """One particle record, reset() reuses it for a new particle"""
+    __slots__ = ('x', 'y', 'prev_x', 'prev_y', 'color', 'velocity_x', 'velocity_y',
+                 'size', 'lifetime', 'max_lifetime', 'priority')
+    
+    def __init__(self, x=0.0, y=0.0, color=(0, 0, 0), velocity_x=0, velocity_y=0, size=3, lifetime=1000,
+                 priority=PRIORITY_LANDING):
+        self.reset(x, y, color, velocity_x, velocity_y, size, lifetime, priority)
+    
+    def reset(self, x, y, color, velocity_x, velocity_y, size, lifetime, priority):
+        self.x = x
+        self.y = y
+        self.prev_x = x
+        self.prev_y = y
+        self.color = color
+        self.velocity_x = velocity_x
+        self.velocity_y = velocity_y
+        self.size = size
+        self.lifetime = lifetime
+        self.max_lifetime = lifetime
+        self.priority = priority
+    
+    def update(self, dt, width, height):
+        self.lifetime -= dt
+        self.prev_x = self.x
+        self.prev_y = self.y
+        
+        # Apply gravity
+        self.velocity_y += PARTICLE_GRAVITY
+        
+        # Update position
+        self.x += self.velocity_x
+        self.y += self.velocity_y
+        
+        # Bounce off bottom
+        if self.y > height - self.size:
+            self.y = height - self.size
+            self.velocity_y *= -PARTICLE_BOUNCE
+            self.velocity_x *= PARTICLE_FRICTION  # Friction
+        
+        # Bounce off sides
+        if self.x < 0 or self.x > width - self.size:
+            self.velocity_x *= -PARTICLE_BOUNCE
+            self.x = max(0, min(width - self.size, self.x))
+        
+        return self.lifetime > 0
+
+class ParticlePool:
+    """Particle backend over a fixed set of preallocated Particle records.
+    
+    Live records are packed at the front of `records` in emission order and
+    the records past `count` are the free list: emit() resets the first free
+    record and update() compacts survivors in place by swapping records, so
+    neither allocates per particle.
+    """
+    def __init__(self, width, height, capacity=PARTICLE_CAPACITY, budget=PARTICLE_BUDGET):
+        self.width = width
+        self.height = height
+        self.capacity = capacity
+        self.budget = budget
+        self.records = [Particle() for _ in range(capacity)]
+        self.count = 0
+        self.peak = 0  # Most live particles seen at once
+        self.overflow = 0  # Emits dropped because the pool was full
+        self.culled = 0  # Particles dropped to stay within budget
+    
+    def __len__(self):
+        return self.count
+    
+    def emit(self, x, y, color, velocity_x, velocity_y, size, lifetime, priority=PRIORITY_LANDING):
+        i = self.count
+        if i == self.capacity:
+            self.overflow += 1
+            return
+        self.records[i].reset(x, y, color, velocity_x, velocity_y, size, lifetime, priority)
+        self.count = i + 1
+        if i >= self.peak:
+            self.peak = i + 1
+    
+    def enforce_budget(self):
+        """Drop the lowest priority, oldest particles beyond the budget"""
+        excess = self.count - self.budget
+        if excess <= 0:
+            return
+        records = self.records
+        dropped = set()
+        for level in sorted({records[i].priority for i in range(self.count)}):
+            for i in range(self.count):
+                if records[i].priority == level:
+                    dropped.add(i)
+                    if len(dropped) == excess:
+                        break
+            if len(dropped) == excess:
+                break
+        live = 0
+        for i in range(self.count):
+            if i not in dropped:
+                records[live], records[i] = records[i], records[live]
+                live += 1
+        self.count = live
+        self.culled += excess
+    
+    def update(self, dt):
+        width, height = self.width, self.height
+        records = self.records
+        live = 0
+        for i in range(self.count):
+            p = records[i]
+            if p.update(dt, width, height):
+                if i != live:
+                    records[live], records[i] = p, records[live]
+                live += 1
+        self.count = live
+    
+    def clear(self):
+        self.count = 0
+    
+    def stats(self):
+        return {'live': self.count, 'capacity': self.capacity, 'peak': self.peak,
+                'overflow': self.overflow, 'culled': self.culled}
+    
+    def draw_items(self, interpolation=1.0):
+        """Yield (x, y, size, color, alpha) for every live particle, positions blended from the previous step"""
+        records = self.records
+        if interpolation >= 1.0:
+            for i in range(self.count):
+                p = records[i]
+                yield p.x, p.y, p.size, p.color, int(255 * (p.lifetime / p.max_lifetime))
+            return
+        for i in range(self.count):
+            p = records[i]
+            yield (p.prev_x + (p.x - p.prev_x) * interpolation, p.prev_y + (p.y - p.prev_y) * interpolation,
+                   p.size, p.color, int(255 * (p.lifetime / p.max_lifetime)))
+
+class ParticleSystem:
+    """Structure-of-arrays particle backend over preallocated NumPy arrays.
+    
+    Live particles always occupy indices [0, count) in emission order.
+    update() applies the same per-step physics as Particle.update to all of
+    them at once and then compacts the survivors to the front in a single
+    pass. Both work in preallocated scratch arrays, so stepping particles
+    allocates no new arrays.
+    """
+    def __init__(self, width, height, capacity=PARTICLE_CAPACITY, budget=PARTICLE_BUDGET):
+        self.width = width
+        self.height = height
+        self.capacity = capacity
+        self.budget = budget
+        self.count = 0
+        self.peak = 0  # Most live particles seen at once
+        self.overflow = 0  # Emits dropped because the arrays were full
+        self.culled = 0  # Particles dropped to stay within budget
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.prev_x = np.zeros(capacity)
+        self.prev_y = np.zeros(capacity)
+        self.velocity_x = np.zeros(capacity)
+        self.velocity_y = np.zeros(capacity)
+        self.size = np.zeros(capacity)
+        self.lifetime = np.zeros(capacity)
+        self.max_lifetime = np.ones(capacity)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+        self.priority = np.zeros(capacity, dtype=np.uint8)
+        # Scratch space for update() and _compact()
+        self._bound = np.zeros(capacity)
+        self._hit = np.zeros(capacity, dtype=bool)
+        self._hit_right = np.zeros(capacity, dtype=bool)
+        self._keep = np.zeros(capacity, dtype=bool)
+        self._order = np.arange(capacity)
+        self._positions = np.zeros(capacity, dtype=np.intp)
+        self._kept = np.zeros(capacity + 1, dtype=np.intp)  # The extra slot collects the dropped particles
+        self._scratch = {np.dtype(float): np.zeros(capacity), np.dtype(np.uint8): np.zeros(capacity, dtype=np.uint8),
+                         'color': np.zeros((capacity, 3), dtype=np.uint8)}
+    
+    def _arrays(self):
+        return (self.x, self.y, self.prev_x, self.prev_y, self.velocity_x, self.velocity_y,
+                self.size, self.lifetime, self.max_lifetime, self.color, self.priority)
+    
+    def __len__(self):
+        return self.count
+    
+    def emit(self, x, y, color, velocity_x, velocity_y, size, lifetime, priority=PRIORITY_LANDING):
+        i = self.count
+        if i == self.capacity:
+            self.overflow += 1
+            return
+        self.x[i] = self.prev_x[i] = x
+        self.y[i] = self.prev_y[i] = y
+        self.velocity_x[i] = velocity_x
+        self.velocity_y[i] = velocity_y
+        self.size[i] = size
+        self.lifetime[i] = lifetime
+        self.max_lifetime[i] = lifetime
+        self.color[i] = color
+        self.priority[i] = priority
+        self.count = i + 1
+        if i >= self.peak:
+            self.peak = i + 1
+    
+    def enforce_budget(self):
+        """Drop the lowest priority, oldest particles beyond the budget"""
+        n = self.count
+        excess = n - self.budget
+        if excess <= 0:
+            return
+        priority = self.priority[:n]
+        keep = self._keep[:n]
+        keep.fill(True)
+        remaining = excess
+        for level in np.unique(priority):
+            oldest = np.flatnonzero(priority == level)[:remaining]
+            keep[oldest] = False
+            remaining -= len(oldest)
+            if remaining == 0:
+                break
+        self._compact(keep)
+        self.culled += excess
+    
+    def update(self, dt):
+        n = self.count
+        if n == 0:
+            return
+        
+        x = self.x[:n]
+        y = self.y[:n]
+        vx = self.velocity_x[:n]
+        vy = self.velocity_y[:n]
+        size = self.size[:n]
+        lifetime = self.lifetime[:n]
+        
+        lifetime -= dt
+        self.prev_x[:n] = x
+        self.prev_y[:n] = y
+        
+        # Apply gravity and update position
+        vy += PARTICLE_GRAVITY
+        x += vx
+        y += vy
+        
+        # Bounce off bottom
+        floor = np.subtract(self.height, size, out=self._bound[:n])
+        hit = np.greater(y, floor, out=self._hit[:n])
+        np.copyto(y, floor, where=hit)
+        np.multiply(vy, -PARTICLE_BOUNCE, out=vy, where=hit)
+        np.multiply(vx, PARTICLE_FRICTION, out=vx, where=hit)
+        
+        # Bounce off sides
+        right_wall = np.subtract(self.width, size, out=self._bound[:n])
+        np.less(x, 0, out=hit)
+        np.logical_or(hit, np.greater(x, right_wall, out=self._hit_right[:n]), out=hit)
+        np.multiply(vx, -PARTICLE_BOUNCE, out=vx, where=hit)
+        np.clip(x, 0, right_wall, out=x)
+        
+        self._compact(np.greater(lifetime, 0, out=self._keep[:n]))
+    
+    def _compact(self, keep):
+        """Move the particles selected by the boolean mask `keep` to the front, in order"""
+        n = self.count
+        live_count = int(np.count_nonzero(keep))
+        if live_count < n:
+            # Each survivor's new index is the running count of survivors before it
+            positions = self._positions[:n]
+            np.copyto(positions, keep)
+            np.cumsum(positions, out=positions)  # In place, a bool input would be cast through a temporary
+            positions -= 1
+            np.copyto(positions, self.capacity, where=np.logical_not(keep, out=self._hit[:n]))
+            np.put(self._kept, positions, self._order[:n])
+            kept = self._kept[:live_count]
+            scratch = self._scratch
+            for array in self._arrays():
+                moved = scratch['color' if array.ndim == 2 else array.dtype][:live_count]
+                np.take(array[:n], kept, axis=0, out=moved, mode='clip')
+                array[:live_count] = moved
+        self.count = live_count
+    
+    def clear(self):
+        self.count = 0
+    
+    def stats(self):
+        return {'live': self.count, 'capacity': self.capacity, 'peak': self.peak,
+                'overflow': self.overflow, 'culled': self.culled}
+    
+    def draw_items(self, interpolation=1.0):
+        """Yield (x, y, size, color, alpha) for every live particle, positions blended from the previous step"""
+        n = self.count
+        if n == 0:
+            return
+        x = self.x[:n]
+        y = self.y[:n]
+        if interpolation < 1.0:
+            prev_x = self.prev_x[:n]
+            prev_y = self.prev_y[:n]
+            x = prev_x + (x - prev_x) * interpolation
+            y = prev_y + (y - prev_y) * interpolation
+        alpha = (255 * (self.lifetime[:n] / self.max_lifetime[:n])).astype(np.int64)
+        yield from zip(x.tolist(), y.tolist(),
+                       self.size[:n].astype(np.int64).tolist(),
+                       map(tuple, self.color[:n].tolist()), alpha.tolist())
+
+def make_particle_system(width, height, capacity=PARTICLE_CAPACITY, budget=PARTICLE_BUDGET):
+    """Create the fastest particle backend available for a width x height pixel area"""
+    if np is not None and capacity:  # With no room for particles the pool allocates nothing
+        return ParticleSystem(width, height, capacity, budget)
+    return ParticlePool(width, height, capacity, budget)
+
+class ParticleGovernor:
+    """Turns particle quality down while frames run over budget and back up once they recover.
+    
+    record() takes the work time of each frame. After `window` frames it
+    compares their average with target_ms: over target multiplies quality
+    by `decrease`, comfortably under it (below headroom * target) adds
+    `increase`. Quality stays within [min_quality, 1] and scales the
+    player's settings, which remain the ceiling.
+    """
+    def __init__(self, target_ms=1000 / 60, window=30, min_quality=0.1,
+                 decrease=0.7, increase=0.05, headroom=0.75):
+        self.target_ms = target_ms
+        self.min_quality = min_quality
+        self.decrease = decrease
+        self.increase = increase
+        self.headroom = headroom
+        self.samples = deque(maxlen=window)
+        self.quality = 1.0
+    
+    def record(self, frame_ms):
+        """Add one frame's work time and return the current quality"""
+        samples = self.samples
+        samples.append(frame_ms)
+        if len(samples) < samples.maxlen:
+            return self.quality
+        average = sum(samples) / len(samples)
+        if average > self.target_ms:
+            self.quality = max(self.min_quality, self.quality * self.decrease)
+        elif average < self.target_ms * self.headroom and self.quality < 1.0:
+            self.quality = min(1.0, self.quality + self.increase)
+        samples.clear()  # Judge the next window on frames drawn at the new quality
+        return self.quality
@@ -0,0 +1,296 @@
+"""Enumerate every resting placement the current piece can reach.
+
+Movement follows the game's own rules: single-column shifts as in
+move_piece, soft drops (so tucks and slides under overhangs are found) and
+rotations that try the same SRS kicks, in the same order, as rotate_piece.
+
+The board, walls and floor are packed into one integer with ROW_STRIDE
+bits per row (bitboard games keep it ready in board_bits), so a piece
+position is a single bit index. For each rotation the set of positions
+where the piece fits is built with four shifts, and reachability is a
+flood fill over those bitsets: left, right and down moves spread with
+logarithmic fills and rotations move whole sets at once. The shortest
+input path to a placement comes from a regular breadth-first search, run
+only when a path is first asked for.
+
+O pieces are the quickest to enumerate and J, L and T (four rotations and
+the most placements) the slowest; run this module to time it on the
+current machine. test_placements.py checks the results against a
+brute-force search through move_piece and rotate_piece.
+"""
+import time
+from collections import deque
+
+from tetris_engine import (
+    GRID_HEIGHT, ROTATION_COUNTS, SHAPE_CELLS, TetrisGame, get_wall_kicks, pack_board,
+    BOARD_STRIDE as ROW_STRIDE, BOARD_LEFT_PAD as LEFT_PAD, BOARD_TOP_PAD as TOP_PAD,
+    BOARD_FLOOR_ROWS as FLOOR_ROWS,
+)
+
+# Padded board layout, the one bitboard games keep in board_bits: every row is
+# ROW_STRIDE bits, the playfield sits at bit LEFT_PAD and the remaining bits of
+# each row are wall, with TOP_PAD walled rows above the board that kicks may lift
+# a piece into and FLOOR_ROWS solid rows below it
+BOARD_ROWS = TOP_PAD + GRID_HEIGHT + FLOOR_ROWS
+
+# Bit offsets of each piece cell in the padded layout, per (type, rotation)
+PIECE_CELL_SHIFTS = {
+    shape_type: tuple(tuple(dy * ROW_STRIDE + dx for dx, dy in offsets) for offsets in rotations)
+    for shape_type, rotations in SHAPE_CELLS.items()
+}
+
+def _rotation_moves(piece_type):
+    """Per rotation: (action, new_rotation, kicks as (dx, dy, bit offset)), none for O whose cells never change"""
+    count = ROTATION_COUNTS[piece_type]
+    moves = [[] for _ in range(count)]
+    if piece_type != 'O':
+        for rotation in range(count):
+            for action, step in (('rotate_cw', 1), ('rotate_ccw', -1)):
+                new_rotation = (rotation + step) % count
+                kicks = get_wall_kicks(piece_type, rotation, new_rotation)
+                moves[rotation].append((action, new_rotation, tuple((dx, dy, dy * ROW_STRIDE + dx) for dx, dy in kicks)))
+    return moves
+
+# Built once, searches share them
+ROTATION_MOVES = {piece_type: _rotation_moves(piece_type) for piece_type in ROTATION_COUNTS}
+
+def board_bits(game):
+    """Pack the game's locked cells, walls and floor into one integer"""
+    if game.board_bits is not None:
+        return game.board_bits, BOARD_ROWS
+    row_masks = [sum(1 << x for x, cell in enumerate(row) if cell is not None) for row in game.grid]
+    return pack_board(row_masks), BOARD_ROWS
+
+def position_bit(x, y):
+    return (y + TOP_PAD) * ROW_STRIDE + x + LEFT_PAD
+
+_row_positions = {}
+
+def row_positions(bits):
+    """x of every position set in one ROW_STRIDE-bit row of a position bitset"""
+    xs = _row_positions.get(bits)
+    if xs is None:
+        xs = _row_positions[bits] = tuple(x - LEFT_PAD for x in range(ROW_STRIDE) if bits >> x & 1)
+    return xs
+
+def _fill(seeds, open_bits, step):
+    """Spread seeds through open_bits in one direction (Kogge-Stone occluded fill)"""
+    shift = step if step > 0 else -step
+    if step > 0:
+        seeds |= open_bits & (seeds << shift)
+        open_bits &= open_bits << shift
+        seeds |= open_bits & (seeds << 2 * shift)
+        open_bits &= open_bits << 2 * shift
+        seeds |= open_bits & (seeds << 4 * shift)
+        open_bits &= open_bits << 4 * shift
+        seeds |= open_bits & (seeds << 8 * shift)
+        open_bits &= open_bits << 8 * shift
+        seeds |= open_bits & (seeds << 16 * shift)
+    else:
+        seeds |= open_bits & (seeds >> shift)
+        open_bits &= open_bits >> shift
+        seeds |= open_bits & (seeds >> 2 * shift)
+        open_bits &= open_bits >> 2 * shift
+        seeds |= open_bits & (seeds >> 4 * shift)
+        open_bits &= open_bits >> 4 * shift
+        seeds |= open_bits & (seeds >> 8 * shift)
+        open_bits &= open_bits >> 8 * shift
+        seeds |= open_bits & (seeds >> 16 * shift)
+    return seeds
+
+class Placement:
+    """A resting position (rotation, x, y); path is the fewest actions that lock the piece there"""
+    __slots__ = ('rotation', 'x', 'y', 'search')
+    
+    def __init__(self, rotation, x, y, search):
+        self.rotation = rotation
+        self.x = x
+        self.y = y
+        self.search = search
+    
+    def __repr__(self):
+        return f"Placement(rotation={self.rotation}, x={self.x}, y={self.y})"
+    
+    @property
+    def path(self):
+        """Tuple of TetrisGame action names ending in 'hard_drop'"""
+        return self.search.path_to(self)
+    
+    def get_cells(self):
+        offsets = SHAPE_CELLS[self.search.piece_type][self.rotation]
+        return [(self.x + dx, self.y + dy) for dx, dy in offsets]
+
+class PlacementSearch:
+    """Reachability of one piece on one board, see the module docstring"""
+    def __init__(self, game, piece=None):
+        piece = piece if piece is not None else game.current_piece
+        self.piece_type = piece.type
+        self.rotation_count = ROTATION_COUNTS[piece.type]
+        self.start = (piece.rotation % self.rotation_count, piece.x, piece.y)
+        self.board, rows = board_bits(game)
+        self.paths = None
+        
+        # Positions where each rotation fits
+        all_positions = (1 << (rows * ROW_STRIDE)) - 1
+        self.free = []
+        for shifts in PIECE_CELL_SHIFTS[piece.type]:
+            blocked = 0
+            for shift in shifts:
+                blocked |= self.board >> shift
+            self.free.append(all_positions & ~blocked)
+        
+        self.rotation_moves = ROTATION_MOVES[piece.type]
+    
+    def fits(self, rotation, x, y):
+        if y < -TOP_PAD:
+            return False
+        bit = position_bit(x, y)
+        return bit >= 0 and bool((self.free[rotation] >> bit) & 1)
+    
+    def reachable(self):
+        """Per-rotation bitsets of every position the piece can be moved to"""
+        reach = [0] * self.rotation_count
+        rotation, x, y = self.start
+        if not self.fits(rotation, x, y):
+            return reach
+        reach[rotation] = 1 << position_bit(x, y)
+        
+        pending = {rotation}
+        while pending:
+            rotation = pending.pop()
+            free = self.free[rotation]
+            
+            # Close under left, right and down moves. A row fill leaves a set closed under
+            # left and right, so it is done once down moves stop adding anything.
+            current = _fill(_fill(reach[rotation], free, 1), free, -1)
+            while True:
+                spread = _fill(current, free, ROW_STRIDE)
+                if spread == current:
+                    break
+                current = _fill(_fill(spread, free, 1), free, -1)
+                if current == spread:
+                    break
+            reach[rotation] = current
+            
+            # Each position rotates with the first kick that fits, like rotate_piece
+            for action, new_rotation, kicks in self.rotation_moves[rotation]:
+                target_free = self.free[new_rotation]
+                remaining = current
+                moved = 0
+                for _, _, kick in kicks:
+                    if kick >= 0:
+                        kicked = remaining & (target_free >> kick)
+                        if kicked:
+                            moved |= kicked << kick
+                            remaining &= ~kicked
+                    else:
+                        kicked = remaining & (target_free << -kick)
+                        if kicked:
+                            moved |= kicked >> -kick
+                            remaining &= ~kicked
+                    if not remaining:
+                        break
+                new = moved & ~reach[new_rotation]
+                if new:
+                    reach[new_rotation] |= new
+                    pending.add(new_rotation)
+        return reach
+    
+    def placements(self):
+        """Every reachable position the piece cannot fall from"""
+        result = []
+        row_mask = (1 << ROW_STRIDE) - 1
+        for rotation, reach in enumerate(self.reachable()):
+            resting = reach & ~(self.free[rotation] >> ROW_STRIDE)
+            # A row at a time: bit tricks on the whole board integer cost the same for any bit
+            while resting:
+                row = ((resting & -resting).bit_length() - 1) // ROW_STRIDE
+                shift = row * ROW_STRIDE
+                bits = resting >> shift & row_mask
+                resting ^= bits << shift
+                y = row - TOP_PAD
+                for x in row_positions(bits):
+                    result.append(Placement(rotation, x, y, self))
+        return result
+    
+    def path_to(self, placement):
+        if self.paths is None:
+            self.paths = self.shortest_paths()
+        return self.paths.get((placement.rotation, placement.x, placement.y))
+    
+    def shortest_paths(self):
+        """Breadth-first search over single inputs, hard drop being one input that also locks"""
+        fits = self.fits
+        start = self.start
+        if not fits(*start):
+            return {}
+        
+        parents = {start: None}
+        landings = {}
+        origins = {}  # landing -> closest state that hard drops onto it
+        queue = deque([start])
+        
+        while queue:
+            state = queue.popleft()
+            rotation, x, y = state
+            
+            # Where a hard drop from here lands, sharing work with states above
+            landing = state
+            trail = []
+            while landing not in landings and fits(landing[0], landing[1], landing[2] + 1):
+                trail.append(landing)
+                landing = (landing[0], landing[1], landing[2] + 1)
+            landing = landings.get(landing, landing)
+            for visited in trail:
+                landings[visited] = landing
+            landings[state] = landing
+            if landing not in origins:
+                origins[landing] = state
+            
+            neighbors = [
+                ('left', (rotation, x - 1, y)),
+                ('right', (rotation, x + 1, y)),
+                ('soft_drop', (rotation, x, y + 1)),
+            ]
+            for action, new_rotation, kicks in self.rotation_moves[rotation]:
+                for dx, dy, _ in kicks:
+                    if fits(new_rotation, x + dx, y + dy):
+                        neighbors.append((action, (new_rotation, x + dx, y + dy)))
+                        break
+            
+            for action, neighbor in neighbors:
+                if neighbor not in parents and fits(*neighbor):
+                    parents[neighbor] = (state, action)
+                    queue.append(neighbor)
+        
+        paths = {}
+        for landing, origin in origins.items():
+            path = ['hard_drop']
+            step = parents[origin]
+            while step is not None:
+                origin, action = step
+                path.append(action)
+                step = parents[origin]
+            path.reverse()
+            paths[landing] = tuple(path)
+        return paths
+
+def enumerate_placements(game, piece=None):
+    """Return a Placement for every distinct resting position `piece` (default: the current piece) can reach"""
+    piece = piece if piece is not None else game.current_piece
+    if piece is None:
+        return []
+    return PlacementSearch(game, piece).placements()
+
+def main():
+    game = TetrisGame(bitboard=True)
+    runs = 5000
+    start = time.perf_counter()
+    for _ in range(runs):
+        placements = enumerate_placements(game)
+    elapsed = time.perf_counter() - start
+    print(f"{len(placements)} placements for {game.current_piece.type}, "
+          f"{runs / elapsed:.0f} enumerations/s")
+
+if __name__ == "__main__":
+    main()
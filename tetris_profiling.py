@@ -0,0 +1,116 @@
+"""Per-phase frame timing for the pygame front end.
+
+FrameProfiler keeps the last `capacity` frames in a preallocated ring
+buffer, one row per frame with the whole frame time and the time spent in
+each phase. NULL_PROFILER has the same interface and does nothing, so the
+timing hooks stay in the frame loop at almost no cost when profiling is off.
+StartupTimer times the steps before the first frame.
+
+    token = profiler.start()
+    game.update(dt)
+    profiler.stop('update', token)
+    ...
+    profiler.end_frame()
+"""
+import csv
+import time
+
+# Phases of the main loop, then sub-phases timed inside them
+FRAME_PHASES = ('input', 'update', 'draw', 'present')
+SUB_PHASES = ('ghost', 'particles', 'ui')
+PHASES = FRAME_PHASES + SUB_PHASES
+COLUMNS = ('frame',) + PHASES
+
+class FrameProfiler:
+    """Ring buffer of per-frame phase timings, in seconds.
+    
+    A phase timed several times in one frame accumulates. The frame time
+    runs from one end_frame() to the next, so it includes frame pacing.
+    """
+    enabled = True
+    
+    def __init__(self, capacity=1024, timer=time.perf_counter):
+        self.capacity = capacity
+        self.timer = timer
+        self.columns = {name: i for i, name in enumerate(COLUMNS)}
+        self.samples = [[0.0] * len(COLUMNS) for _ in range(capacity)]
+        self.zero_row = [0.0] * len(COLUMNS)
+        self.count = 0  # Frames recorded so far, the buffer holds the last `capacity`
+        self.current = self.samples[0]
+        self.frame_start = timer()
+    
+    def start(self):
+        return self.timer()
+    
+    def stop(self, phase, start):
+        self.current[self.columns[phase]] += self.timer() - start
+    
+    def end_frame(self):
+        now = self.timer()
+        self.current[0] = now - self.frame_start
+        self.frame_start = now
+        self.count += 1
+        self.current = self.samples[self.count % self.capacity]
+        self.current[:] = self.zero_row
+    
+    def frames(self):
+        """Recorded rows, oldest first"""
+        if self.count <= self.capacity:
+            return self.samples[:self.count]
+        split = self.count % self.capacity
+        return self.samples[split:] + self.samples[:split]
+    
+    def percentiles(self, column, quantiles=(50, 95, 99)):
+        """Nearest-rank percentiles of one column, in milliseconds"""
+        index = self.columns[column]
+        values = sorted(row[index] for row in self.frames())
+        if not values:
+            return tuple(0.0 for _ in quantiles)
+        last = len(values) - 1
+        return tuple(values[min(last, int(q / 100 * len(values)))] * 1000 for q in quantiles)
+    
+    def write_csv(self, path):
+        """Write every recorded frame as one row of milliseconds"""
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([f"{name}_ms" for name in COLUMNS])
+            for row in self.frames():
+                writer.writerow([f"{value * 1000:.4f}" for value in row])
+
+class NullProfiler:
+    """Stand-in used while profiling is off, every hook is a no-op"""
+    enabled = False
+    count = 0
+    
+    def start(self):
+        return 0.0
+    
+    def stop(self, phase, start):
+        pass
+    
+    def end_frame(self):
+        pass
+
+NULL_PROFILER = NullProfiler()
+
+class StartupTimer:
+    """Marks the steps from launch to the first frame on screen.
+    
+    mark(step) records the time since `start`, report() lists each step's
+    own time and the running total in milliseconds, one step per line.
+    """
+    def __init__(self, start=None, timer=time.perf_counter):
+        self.timer = timer
+        self.start = timer() if start is None else start
+        self.marks = []
+    
+    def mark(self, step):
+        self.marks.append((step, self.timer() - self.start))
+    
+    def report(self):
+        lines = [f"{'startup':<12} {'step_ms':>9} {'total_ms':>9}"]
+        previous = 0.0
+        for step, at in self.marks:
+            lines.append(f"{step:<12} {(at - previous) * 1000:>9.1f} {at * 1000:>9.1f}")
+            previous = at
+        return "\n".join(lines)
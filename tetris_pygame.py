@@ -1,824 +1,258 @@
-import pygame
-import random
-import sys
 import time
-import math
-from enum import Enum
+STARTUP_BEGIN = time.perf_counter()  # Taken before the imports so the startup report includes them
+
+import argparse
+import sys
+from collections import OrderedDict, deque
 
-pygame.init()
+# pygame.pkgdata imports pkg_resources only to look up its default font and falls back
+# to the file path without it, as in frozen builds. That import is about a third of the
+# time to first frame, so it is blocked while pygame loads and unblocked right after.
+_block_pkg_resources = 'pkg_resources' not in sys.modules
+if _block_pkg_resources:
+    sys.modules['pkg_resources'] = None
+try:
+    import pygame
+finally:
+    if _block_pkg_resources:
+        del sys.modules['pkg_resources']
+
+from tetris_engine import (
+    GRID_WIDTH, GRID_HEIGHT, CELL_SIZE, GAME_WIDTH, GAME_HEIGHT,
+    BLACK, WHITE, DARK_GRAY, LIGHT_GRAY, GOLD, BRIGHT_GOLD,
+    COLORS, SHAPE_CELLS, LINE_CLEAR_COLORS, GOLDEN_CLEAR_COLORS, LINE_CLEAR_SIZES, TetrisGame,
+)
+from tetris_particles import ParticleGovernor
+from tetris_profiling import FRAME_PHASES, SUB_PHASES, NULL_PROFILER, FrameProfiler, StartupTimer
 
-# Constants
-GRID_WIDTH = 10
-GRID_HEIGHT = 20
-CELL_SIZE = 30
 BORDER_WIDTH = 2
 
 # Window dimensions
-GAME_WIDTH = GRID_WIDTH * CELL_SIZE
-GAME_HEIGHT = GRID_HEIGHT * CELL_SIZE
 SIDEBAR_WIDTH = 200
 WINDOW_WIDTH = GAME_WIDTH + SIDEBAR_WIDTH + BORDER_WIDTH * 3
 WINDOW_HEIGHT = GAME_HEIGHT + BORDER_WIDTH * 2
+SIDEBAR_X = GAME_WIDTH + BORDER_WIDTH * 2 + 10
 
-# Colors
-BLACK = (0, 0, 0)
-WHITE = (255, 255, 255)
-GRAY = (128, 128, 128)
-DARK_GRAY = (64, 64, 64)
-LIGHT_GRAY = (192, 192, 192)
-GOLD = (255, 215, 0)
-BRIGHT_GOLD = (255, 255, 0)
-YELLOW = (255, 255, 0)
-ORANGE = (255, 165, 0)
-RED = (255, 0, 0)
-
-# Tetromino colors
-COLORS = {
-    'I': (0, 255, 255),    # Cyan
-    'O': (255, 255, 0),    # Yellow
-    'T': (255, 0, 255),    # Magenta
-    'S': (0, 255, 0),      # Green
-    'Z': (255, 0, 0),      # Red
-    'J': (0, 0, 255),      # Blue
-    'L': (255, 165, 0),    # Orange
+# Key bindings, translated into TetrisGame actions
+GAME_KEY_ACTIONS = {
+    pygame.K_w: 'rotate_cw',
+    pygame.K_UP: 'rotate_cw',
+    pygame.K_z: 'rotate_ccw',  # Counter-clockwise rotation
+    pygame.K_q: 'hard_drop',
+    pygame.K_SPACE: 'hard_drop',
+    pygame.K_c: 'hold',
+}
+SETTINGS_KEY_ACTIONS = {
+    pygame.K_UP: 'menu_up',
+    pygame.K_w: 'menu_up',
+    pygame.K_DOWN: 'menu_down',
+    pygame.K_s: 'menu_down',
+    pygame.K_LEFT: 'menu_left',
+    pygame.K_a: 'menu_left',
+    pygame.K_RIGHT: 'menu_right',
+    pygame.K_d: 'menu_right',
+    pygame.K_ESCAPE: 'menu_close',
 }
+HELD_KEY_ACTIONS = {
+    'left': (pygame.K_a, pygame.K_LEFT),
+    'right': (pygame.K_d, pygame.K_RIGHT),
+    'soft_drop': (pygame.K_s, pygame.K_DOWN),
+}
+HELD_KEYS = {key: action for action, keys in HELD_KEY_ACTIONS.items() for key in keys}
 
-class Tetromino:
-    def __init__(self, shape_type):
-        self.type = shape_type
-        self.color = COLORS[shape_type]
-        self.x = GRID_WIDTH // 2 - 1
-        self.y = 0
-        self.rotation = 0
-        
-        # Define tetromino shapes
-        self.shapes = {
-            'I': [
-                ['..#.',
-                 '..#.',
-                 '..#.',
-                 '..#.'],
-                ['....',
-                 '####',
-                 '....',
-                 '....']
-            ],
-            'O': [
-                ['....',
-                 '.##.',
-                 '.##.',
-                 '....']
-            ],
-            'T': [
-                ['....',
-                 '.#..',
-                 '###.',
-                 '....'],
-                ['....',
-                 '.#..',
-                 '.##.',
-                 '.#..'],
-                ['....',
-                 '....',
-                 '###.',
-                 '.#..'],
-                ['....',
-                 '.#..',
-                 '##..',
-                 '.#..']
-            ],
-            'S': [
-                ['....',
-                 '.##.',
-                 '##..',
-                 '....'],
-                ['....',
-                 '.#..',
-                 '.##.',
-                 '..#.']
-            ],
-            'Z': [
-                ['....',
-                 '##..',
-                 '.##.',
-                 '....'],
-                ['....',
-                 '..#.',
-                 '.##.',
-                 '.#..']
-            ],
-            'J': [
-                ['....',
-                 '.#..',
-                 '.#..',
-                 '##..'],
-                ['....',
-                 '....',
-                 '#...',
-                 '###.'],
-                ['....',
-                 '.##.',
-                 '.#..',
-                 '.#..'],
-                ['....',
-                 '....',
-                 '###.',
-                 '..#.']
-            ],
-            'L': [
-                ['....',
-                 '..#.',
-                 '..#.',
-                 '.##.'],
-                ['....',
-                 '....',
-                 '###.',
-                 '#...'],
-                ['....',
-                 '##..',
-                 '.#..',
-                 '.#..'],
-                ['....',
-                 '....',
-                 '..#.',
-                 '###.']
-            ]
-        }
-    
-    def get_shape(self):
-        return self.shapes[self.type][self.rotation % len(self.shapes[self.type])]
-    
-    def get_cells(self):
-        shape = self.get_shape()
-        cells = []
-        for row_idx, row in enumerate(shape):
-            for col_idx, cell in enumerate(row):
-                if cell == '#':
-                    cells.append((self.x + col_idx, self.y + row_idx))
-        return cells
+def key_to_action(game, key):
+    """Map a pressed key to a game action for the current menu state"""
+    if key == pygame.K_p:  # Pause toggle
+        return 'pause'
+    if game.game_over:
+        return 'restart' if key == pygame.K_r else None
+    if game.in_settings:
+        return SETTINGS_KEY_ACTIONS.get(key)
+    if game.paused:
+        return 'open_settings' if key == pygame.K_c else None  # Open settings
+    return GAME_KEY_ACTIONS.get(key)
 
-class Particle:
-    def __init__(self, x, y, color, velocity_x=0, velocity_y=0, size=3, lifetime=1000):
-        self.x = x
-        self.y = y
-        self.color = color
-        self.velocity_x = velocity_x
-        self.velocity_y = velocity_y
-        self.size = size
-        self.lifetime = lifetime
-        self.max_lifetime = lifetime
-        self.gravity = 0.2
-        self.bounce_factor = 0.7
-        
-    def update(self, dt):
-        self.lifetime -= dt
-        
-        # Apply gravity
-        self.velocity_y += self.gravity
-        
-        # Update position
-        self.x += self.velocity_x
-        self.y += self.velocity_y
-        
-        # Bounce off bottom
-        if self.y > GAME_HEIGHT - self.size:
-            self.y = GAME_HEIGHT - self.size
-            self.velocity_y *= -self.bounce_factor
-            self.velocity_x *= 0.9  # Friction
-        
-        # Bounce off sides
-        if self.x < 0 or self.x > GAME_WIDTH - self.size:
-            self.velocity_x *= -self.bounce_factor
-            self.x = max(0, min(GAME_WIDTH - self.size, self.x))
-        
-        return self.lifetime > 0
-    
-    def draw(self, screen):
-        # Fade out over time
-        alpha = int(255 * (self.lifetime / self.max_lifetime))
-        if alpha > 0:
-            # Create a surface for alpha blending
-            particle_surface = pygame.Surface((self.size * 2, self.size * 2))
-            particle_surface.set_alpha(alpha)
-            
-            # Draw particle with gradient effect
-            center_color = self.color
-            edge_color = tuple(max(0, c - 50) for c in self.color)
-            
-            pygame.draw.circle(particle_surface, center_color, (self.size, self.size), self.size)
-            pygame.draw.circle(particle_surface, edge_color, (self.size, self.size), self.size, 1)
-            
-            screen.blit(particle_surface, (BORDER_WIDTH + self.x - self.size, BORDER_WIDTH + self.y - self.size))
+def handle_key_down(game, key, recorder=None):
+    action = key_to_action(game, key)
+    if action is not None:
+        if recorder is not None:
+            recorder.record_action(action)
+        game.apply_action(action)
 
-class TetrisGame:
-    def __init__(self):
-        self.grid = [[None for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-        self.current_piece = None
-        self.next_piece = None
-        self.hold_piece = None
-        self.can_hold = True  # Prevents holding multiple times per piece
-        self.score = 0
-        self.level = 1
-        self.lines_cleared = 0
-        self.fall_timer = 0
-        self.fall_speed = 500  # milliseconds
-        self.game_over = False
-        self.paused = False
-        self.in_settings = False
-        
-        # Key press tracking
-        self.keys_held = set()
-        self.key_timers = {}
-        self.repeat_delay = 150  # milliseconds
-        
-        # Golden cube system
-        self.golden_cubes = set()  # Set of (x, y) positions with golden cubes
-        self.golden_spawn_chance = 0.1  # 10% chance per line clear
-        self.golden_cubes_in_line = 0  # Track golden cubes in current clearing lines
-        
-        # Combo system
-        self.combo_active = False
-        self.combo_lines = []  # Lines to clear sequentially
-        self.combo_timer = 0
-        self.combo_delay = 500  # milliseconds between each line clear
-        
-        # Buff system
-        self.active_buffs = {}
-        self.buff_types = {
-            'speed_boost': {'name': 'Speed Boost', 'duration': 15000, 'color': (0, 255, 255)},
-            'score_multiplier': {'name': 'Score x2', 'duration': 20000, 'color': (255, 165, 0)},
-            'ghost_mode': {'name': 'Ghost Mode', 'duration': 10000, 'color': (128, 0, 128)},
-            'line_clear_bonus': {'name': 'Line Bonus', 'duration': 25000, 'color': (0, 255, 0)},
-            'hold_reset': {'name': 'Hold Reset', 'duration': 12000, 'color': (255, 192, 203)},
-            'slow_fall': {'name': 'Slow Fall', 'duration': 18000, 'color': (255, 255, 0)}
-        }
-        
-        # Particle system
-        self.particles = []
-        
-        # Settings system
-        self.settings = {
-            'particle_density': 1.0,  # 0.0 to 2.0
-            'particle_lifetime': 1.0,  # 0.5 to 2.0
-            'particle_effects': True,
-            'show_particles': True
-        }
-        self.settings_selected = 0
-        self.settings_options = ['particle_density', 'particle_lifetime', 'particle_effects', 'show_particles']
-        self.settings_names = {
-            'particle_density': 'Particle Density',
-            'particle_lifetime': 'Particle Lifetime',
-            'particle_effects': 'Particle Effects',
-            'show_particles': 'Show Particles'
-        }
-        
-        # SRS Wall Kick Data
-        self.wall_kick_data = {
-            'JLSTZ': {
-                (0, 1): [(0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)],
-                (1, 0): [(0, 0), (1, 0), (1, -1), (0, 2), (1, 2)],
-                (1, 2): [(0, 0), (1, 0), (1, -1), (0, 2), (1, 2)],
-                (2, 1): [(0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)],
-                (2, 3): [(0, 0), (1, 0), (1, 1), (0, -2), (1, -2)],
-                (3, 2): [(0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)],
-                (3, 0): [(0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)],
-                (0, 3): [(0, 0), (1, 0), (1, 1), (0, -2), (1, -2)],
-            },
-            'I': {
-                (0, 1): [(0, 0), (-2, 0), (1, 0), (-2, -1), (1, 2)],
-                (1, 0): [(0, 0), (2, 0), (-1, 0), (2, 1), (-1, -2)],
-                (1, 2): [(0, 0), (-1, 0), (2, 0), (-1, 2), (2, -1)],
-                (2, 1): [(0, 0), (1, 0), (-2, 0), (1, -2), (-2, 1)],
-                (2, 3): [(0, 0), (2, 0), (-1, 0), (2, 1), (-1, -2)],
-                (3, 2): [(0, 0), (-2, 0), (1, 0), (-2, -1), (1, 2)],
-                (3, 0): [(0, 0), (1, 0), (-2, 0), (1, -2), (-2, 1)],
-                (0, 3): [(0, 0), (-1, 0), (2, 0), (-1, 2), (2, -1)],
-            }
-        }
-        
-        self.spawn_new_piece()
-        
-    def spawn_new_piece(self):
-        if self.next_piece is None:
-            self.next_piece = random.choice(list(COLORS.keys()))
-        
-        self.current_piece = Tetromino(self.next_piece)
-        self.next_piece = random.choice(list(COLORS.keys()))
-        
-        if not self.is_valid_position(self.current_piece):
-            self.game_over = True
-    
-    def is_valid_position(self, piece, dx=0, dy=0, rotation_offset=0):
-        test_piece = Tetromino(piece.type)
-        test_piece.x = piece.x + dx
-        test_piece.y = piece.y + dy
-        test_piece.rotation = (piece.rotation + rotation_offset) % len(piece.shapes[piece.type])
-        
-        for x, y in test_piece.get_cells():
-            if x < 0 or x >= GRID_WIDTH or y >= GRID_HEIGHT:
-                return False
-            if y >= 0 and self.grid[y][x] is not None:
-                return False
-        return True
-    
-    def place_piece(self):
-        if not self.current_piece:
-            return
-            
-        # Create landing particles
-        self.create_landing_particles()
-        
-        # Place the piece on the grid
-        for x, y in self.current_piece.get_cells():
-            if y >= 0:
-                self.grid[y][x] = self.current_piece.color
-        
-        # Clear current piece reference so it doesn't get drawn during combo
-        self.current_piece = None
-        
-        # Only clear lines if not in combo mode
-        if not self.combo_active:
-            self.clear_lines()
-    
-    def create_landing_particles(self):
-        """Create particles when a piece lands"""
-        if not self.current_piece or not self.settings['show_particles'] or not self.settings['particle_effects']:
-            return
-        
-        piece_cells = self.current_piece.get_cells()
-        piece_color = self.current_piece.color
-        
-        # Create particles for each cell of the landed piece
-        for cell_x, cell_y in piece_cells:
-            if cell_y >= 0:
-                # Convert grid coordinates to screen coordinates
-                screen_x = cell_x * CELL_SIZE + CELL_SIZE // 2
-                screen_y = cell_y * CELL_SIZE + CELL_SIZE // 2
-                
-                # Create multiple particles per cell
-                particle_count = int(random.randint(3, 6) * self.settings['particle_density'])
-                for _ in range(max(1, particle_count)):
-                    # Random velocity in different directions
-                    angle = random.uniform(0, 2 * math.pi)
-                    speed = random.uniform(1, 4)
-                    vel_x = math.cos(angle) * speed
-                    vel_y = math.sin(angle) * speed - random.uniform(1, 3)  # Slight upward bias
-                    
-                    # Vary particle properties
-                    size = random.randint(2, 4)
-                    lifetime = random.randint(800, 1500)
-                    
-                    # Create color variations
-                    color_variation = random.randint(-30, 30)
-                    particle_color = tuple(max(0, min(255, c + color_variation)) for c in piece_color)
-                    
-                    particle = Particle(
-                        screen_x + random.uniform(-CELL_SIZE//4, CELL_SIZE//4),
-                        screen_y + random.uniform(-CELL_SIZE//4, CELL_SIZE//4),
-                        particle_color,
-                        vel_x,
-                        vel_y,
-                        size,
-                        int(lifetime * self.settings['particle_lifetime'])
-                    )
-                    self.particles.append(particle)
-    
-    def create_line_clear_particles(self, cleared_lines):
-        """Create special particles when lines are cleared"""
-        if not self.settings['show_particles'] or not self.settings['particle_effects']:
-            return
-        
-        for line_y in cleared_lines:
-            for x in range(GRID_WIDTH):
-                screen_x = x * CELL_SIZE + CELL_SIZE // 2
-                screen_y = line_y * CELL_SIZE + CELL_SIZE // 2
-                
-                # Create more intense particles for line clears
-                particle_count = int(random.randint(5, 8) * self.settings['particle_density'])
-                for _ in range(max(1, particle_count)):
-                    angle = random.uniform(0, 2 * math.pi)
-                    speed = random.uniform(2, 6)
-                    vel_x = math.cos(angle) * speed
-                    vel_y = math.sin(angle) * speed - random.uniform(2, 4)
-                    
-                    size = random.randint(3, 6)
-                    lifetime = random.randint(1000, 2000)
-                    
-                    # Golden particles for golden cube lines
-                    if (x, line_y) in self.golden_cubes:
-                        particle_color = random.choice([GOLD, BRIGHT_GOLD, YELLOW])
-                    else:
-                        particle_color = random.choice([WHITE, YELLOW, ORANGE])
-                    
-                    particle = Particle(
-                        screen_x + random.uniform(-CELL_SIZE//2, CELL_SIZE//2),
-                        screen_y + random.uniform(-CELL_SIZE//2, CELL_SIZE//2),
-                        particle_color,
-                        vel_x,
-                        vel_y,
-                        size,
-                        int(lifetime * self.settings['particle_lifetime'])
-                    )
-                    self.particles.append(particle)
-    
-    def update_particles(self, dt):
-        """Update all particles and remove dead ones"""
-        self.particles = [p for p in self.particles if p.update(dt)]
-    
-    def spawn_golden_cube(self, x, y):
-        """Add a golden cube at the specified position"""
-        self.golden_cubes.add((x, y))
-    
-    def activate_random_buff(self):
-        """Activate a random buff when golden cubes are cleared"""
-        buff_type = random.choice(list(self.buff_types.keys()))
-        current_time = pygame.time.get_ticks()
-        
-        self.active_buffs[buff_type] = {
-            'start_time': current_time,
-            'duration': self.buff_types[buff_type]['duration']
-        }
-        
-        # Apply immediate buff effects
-        if buff_type == 'speed_boost':
-            self.fall_speed = max(25, self.fall_speed // 2)
-        elif buff_type == 'slow_fall':
-            self.fall_speed = min(1000, self.fall_speed * 2)
-        elif buff_type == 'hold_reset':
-            self.can_hold = True
-    
-    def update_buffs(self):
-        """Update active buffs and remove expired ones"""
-        current_time = pygame.time.get_ticks()
-        expired_buffs = []
-        
-        for buff_type, buff_data in self.active_buffs.items():
-            if current_time - buff_data['start_time'] >= buff_data['duration']:
-                expired_buffs.append(buff_type)
-        
-        # Remove expired buffs and reset their effects
-        for buff_type in expired_buffs:
-            del self.active_buffs[buff_type]
-            if buff_type == 'speed_boost' or buff_type == 'slow_fall':
-                self.fall_speed = max(50, 500 - (self.level - 1) * 50)
-    
-    def get_score_multiplier(self):
-        """Get current score multiplier based on active buffs"""
-        if 'score_multiplier' in self.active_buffs:
-            return 2
-        return 1
-    
-    def is_ghost_mode_active(self):
-        """Check if ghost mode is active (pieces can pass through some blocks)"""
-        return 'ghost_mode' in self.active_buffs
-    
-    def get_line_clear_bonus(self):
-        """Get bonus multiplier for line clears"""
-        if 'line_clear_bonus' in self.active_buffs:
-            return 1.5
-        return 1.0
-    
-    def clear_lines(self):
-        lines_to_clear = []
-        for y in range(GRID_HEIGHT):
-            if all(self.grid[y][x] is not None for x in range(GRID_WIDTH)):
-                lines_to_clear.append(y)
-        
-        if lines_to_clear:
-            if len(lines_to_clear) > 1:
-                # Multiple lines - start combo mode with delay
-                self.combo_active = True
-                self.combo_lines = sorted(lines_to_clear, reverse=True)  # Start from bottom
-                self.combo_timer = 0
-                # Don't clear the first line immediately - wait for timer
-            else:
-                # Single line - clear immediately
-                self.clear_single_line(lines_to_clear[0])
-                self.finish_line_clear()
-        else:
-            # No lines to clear - spawn new piece and reset hold
-            self.spawn_new_piece()
-            self.can_hold = True
-    
-    def clear_single_line(self, line_y):
-        """Clear a single line and handle particles/golden cubes"""
-        # Create line clear particles before clearing
-        self.create_line_clear_particles([line_y])
-        
-        # Check for golden cubes in this line
-        golden_cubes_cleared = 0
-        for x in range(GRID_WIDTH):
-            if (x, line_y) in self.golden_cubes:
-                golden_cubes_cleared += 1
-                self.golden_cubes.remove((x, line_y))
-        
-        # Clear the line and move everything above it down
-        del self.grid[line_y]
-        self.grid.insert(0, [None for _ in range(GRID_WIDTH)])
-        
-        # Update golden cube positions (move down by 1 only for cubes above the cleared line)
-        golden_cubes_to_update = []
-        for x, y in list(self.golden_cubes):
-            if y < line_y:  # Only cubes above the cleared line need to move down
-                golden_cubes_to_update.append((x, y))
-        
-        for x, y in golden_cubes_to_update:
-            self.golden_cubes.remove((x, y))
-            self.golden_cubes.add((x, y + 1))
-        
-        # Update score and stats
-        self.lines_cleared += 1
-        points = 100  # Base points per line in combo
-        
-        # Apply score multiplier and line clear bonus
-        multiplier = self.get_score_multiplier() * self.get_line_clear_bonus()
-        self.score += int(points * self.level * multiplier)
-        
-        # Activate buff if golden cubes were cleared
-        if golden_cubes_cleared > 0:
-            self.activate_random_buff()
-        
-        # Remove the line we just cleared first
-        if line_y in self.combo_lines:
-            self.combo_lines.remove(line_y)
-        
-        # Update remaining combo lines positions (since we removed a line above them)
-        # Only lines above the cleared line need to move down
-        self.combo_lines = [y + 1 if y < line_y else y for y in self.combo_lines]
-    
-    def finish_line_clear(self):
-        """Finish line clearing process"""
-        # Spawn new golden cubes randomly
-        if random.random() < self.golden_spawn_chance:
-            self.spawn_random_golden_cube()
-        
-        # Level up every 10 lines
-        new_level = self.lines_cleared // 10 + 1
-        if new_level > self.level:
-            self.level = new_level
-            # Don't update fall speed if speed buff is active
-            if 'speed_boost' not in self.active_buffs and 'slow_fall' not in self.active_buffs:
-                self.fall_speed = max(50, 500 - (self.level - 1) * 50)
-        
-        # Reset combo state and spawn new piece
-        self.combo_active = False
-        self.combo_lines = []
-        self.combo_timer = 0
-        self.spawn_new_piece()
-        self.can_hold = True
-    
-    def spawn_random_golden_cube(self):
-        """Spawn a golden cube at a random position in the grid"""
-        # Find empty positions
-        empty_positions = []
-        for y in range(GRID_HEIGHT):
-            for x in range(GRID_WIDTH):
-                if self.grid[y][x] is not None and (x, y) not in self.golden_cubes:
-                    empty_positions.append((x, y))
-        
-        if empty_positions:
-            x, y = random.choice(empty_positions)
-            self.spawn_golden_cube(x, y)
+def handle_key_event(game, event, at, keys_down, recorder=None):
+    """Feed a KEYDOWN or KEYUP to the game, held actions stamped with game time `at`.
+    
+    keys_down is the set of held-action keys currently down, so an action
+    bound to two keys is pressed by the first and released by the last.
+    """
+    if event.type == pygame.KEYDOWN:
+        handle_key_down(game, event.key, recorder)
+    action = HELD_KEYS.get(event.key)
+    if action is None:
+        return
+    was_held = any(key in keys_down for key in HELD_KEY_ACTIONS[action])
+    if event.type == pygame.KEYDOWN:
+        keys_down.add(event.key)
+    else:
+        keys_down.discard(event.key)
+    held = any(key in keys_down for key in HELD_KEY_ACTIONS[action])
+    if held and not was_held:
+        if recorder is not None:
+            recorder.record_press(action, at)
+        game.press(action, at)
+    elif was_held and not held:
+        if recorder is not None:
+            recorder.record_release(action, at)
+        game.release(action, at)
+
+class InputQueue:
+    """Window events stamped with the perf_counter time they were taken off SDL's queue.
     
-    def move_piece(self, dx, dy):
-        if self.current_piece and self.is_valid_position(self.current_piece, dx, dy):
-            self.current_piece.x += dx
-            self.current_piece.y += dy
-            return True
-        return False
+    pygame events carry no timestamp of their own, so the main loop collects
+    them about once a millisecond while it waits for the next frame.
+    """
+    def __init__(self):
+        self.events = deque()
     
-    def rotate_piece(self, clockwise=True):
-        if not self.current_piece:
-            return False
-        
-        old_rotation = self.current_piece.rotation
-        new_rotation = (old_rotation + (1 if clockwise else -1)) % len(self.current_piece.shapes[self.current_piece.type])
-        
-        # Get wall kick data
-        kick_table = 'I' if self.current_piece.type == 'I' else 'JLSTZ'
-        if self.current_piece.type == 'O':
-            # O piece doesn't need wall kicks
-            if self.is_valid_position(self.current_piece, rotation_offset=(1 if clockwise else -1)):
-                self.current_piece.rotation = new_rotation
-                return True
-            return False
-        
-        kick_tests = self.wall_kick_data[kick_table].get((old_rotation, new_rotation), [(0, 0)])
-        
-        # Try each wall kick offset
-        for dx, dy in kick_tests:
-            if self.is_valid_position(self.current_piece, dx, dy, (1 if clockwise else -1)):
-                self.current_piece.x += dx
-                self.current_piece.y += dy
-                self.current_piece.rotation = new_rotation
-                return True
-        
-        return False
+    def collect(self):
+        stamp = time.perf_counter()
+        for event in pygame.event.get():
+            self.events.append((stamp, event))
     
-    def get_ghost_position(self):
-        if not self.current_piece:
-            return None
-        
-        # Create a copy of the current piece
-        ghost_y = self.current_piece.y
-        
-        # Find the lowest possible position
+    def wait_until(self, deadline):
+        """Sleep until perf_counter reaches deadline, collecting events as they arrive"""
         while True:
-            test_piece = Tetromino(self.current_piece.type)
-            test_piece.x = self.current_piece.x
-            test_piece.y = ghost_y + 1
-            test_piece.rotation = self.current_piece.rotation
-            
-            if not self.is_valid_position(test_piece):
-                break
-            ghost_y += 1
-        
-        return ghost_y
-    
-    def hold_current_piece(self):
-        if not self.current_piece or not self.can_hold:
-            return False
-        
-        if self.hold_piece is None:
-            # First time holding - store current piece and spawn new one
-            self.hold_piece = self.current_piece.type
-            self.spawn_new_piece()
-        else:
-            # Swap current piece with held piece
-            old_hold = self.hold_piece
-            self.hold_piece = self.current_piece.type
-            
-            # Create new piece from held piece
-            self.current_piece = Tetromino(old_hold)
-            self.current_piece.x = GRID_WIDTH // 2 - 1
-            self.current_piece.y = 0
-            
-            # Check if the swapped piece can be placed
-            if not self.is_valid_position(self.current_piece):
-                self.game_over = True
-                return False
-        
-        self.can_hold = False  # Can't hold again until next piece
-        return True
-    
-    def hard_drop(self):
-        if not self.current_piece:
-            return
-        
-        drop_distance = 0
-        while self.move_piece(0, 1):
-            drop_distance += 1
-        
-        self.score += drop_distance * 2 * self.get_score_multiplier()
-        self.place_piece()
-    
-    def soft_drop(self):
-        if self.move_piece(0, 1):
-            self.score += 1 * self.get_score_multiplier()
-        else:
-            self.place_piece()
-    
-    def update(self, dt):
-        if self.game_over or self.paused:
-            # Update particles even when paused/game over
-            self.update_particles(dt)
-            return
-        
-        # Update buffs
-        self.update_buffs()
-        
-        # Update particles
-        self.update_particles(dt)
-        
-        # Handle combo system
-        if self.combo_active:
-            self.combo_timer += dt
-            if self.combo_timer >= self.combo_delay:
-                if self.combo_lines:
-                    # Clear next line in combo
-                    self.clear_single_line(self.combo_lines[0])
-                    self.combo_timer = 0
-                else:
-                    # Combo finished
-                    self.finish_line_clear()
-            return  # Don't update piece during combo
-        
-        if not self.current_piece:
-            return
-        
-        self.fall_timer += dt
-        if self.fall_timer >= self.fall_speed:
-            if not self.move_piece(0, 1):
-                self.place_piece()
-            self.fall_timer = 0
-    
-    def handle_input(self, keys_pressed, dt):
-        if self.game_over or self.paused or self.in_settings or self.combo_active:
-            return
-        
-        current_time = pygame.time.get_ticks()
-        
-        # Handle left movement
-        if keys_pressed[pygame.K_a] or keys_pressed[pygame.K_LEFT]:
-            key = 'left'
-            if key not in self.key_timers:
-                self.move_piece(-1, 0)
-                self.key_timers[key] = current_time
-            elif current_time - self.key_timers[key] >= self.repeat_delay:
-                self.move_piece(-1, 0)
-                self.key_timers[key] = current_time
-        else:
-            if 'left' in self.key_timers:
-                del self.key_timers['left']
-        
-        # Handle right movement
-        if keys_pressed[pygame.K_d] or keys_pressed[pygame.K_RIGHT]:
-            key = 'right'
-            if key not in self.key_timers:
-                self.move_piece(1, 0)
-                self.key_timers[key] = current_time
-            elif current_time - self.key_timers[key] >= self.repeat_delay:
-                self.move_piece(1, 0)
-                self.key_timers[key] = current_time
+            self.collect()
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 0.001))
+    
+    def drain(self):
+        while self.events:
+            yield self.events.popleft()
+
+# Particle sprites fade through this many pre-rendered alpha steps
+PARTICLE_ALPHA_LEVELS = 16
+
+class ParticleSpriteCache:
+    """LRU cache of pre-rendered particle sprites keyed by (color, size).
+
+    Each entry holds one sprite per quantized alpha level, rendered on first
+    use, so a particle costs a dict lookup and a blit instead of a new
+    surface and two circle draws every frame.
+    """
+    def __init__(self, max_entries=256, alpha_levels=PARTICLE_ALPHA_LEVELS):
+        self.max_entries = max_entries
+        self.alpha_levels = alpha_levels
+        self.entries = OrderedDict()
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def get(self, color, size, alpha):
+        """Return the sprite for a particle, alpha being 1 to 255"""
+        key = (color, size)
+        sprites = self.entries.get(key)
+        if sprites is None:
+            sprites = [None] * self.alpha_levels
+            self.entries[key] = sprites
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
         else:
-            if 'right' in self.key_timers:
-                del self.key_timers['right']
-        
-        # Handle down movement
-        if keys_pressed[pygame.K_s] or keys_pressed[pygame.K_DOWN]:
-            key = 'down'
-            if key not in self.key_timers:
-                self.soft_drop()
-                self.key_timers[key] = current_time
-            elif current_time - self.key_timers[key] >= self.repeat_delay:
-                self.soft_drop()
-                self.key_timers[key] = current_time
+            self.entries.move_to_end(key)
+        
+        # Round up so a particle stays visible until its lifetime ends
+        level = min(self.alpha_levels, (alpha * self.alpha_levels + 254) // 255) - 1
+        sprite = sprites[level]
+        if sprite is None:
+            sprite = self.render(color, size)
+            sprite.set_alpha((level + 1) * 255 // self.alpha_levels)
+            sprites[level] = sprite
+        return sprite
+    
+    def render(self, color, size):
+        sprite = pygame.Surface((size * 2, size * 2))
+        
+        # Draw particle with gradient effect
+        edge_color = tuple(max(0, c - 50) for c in color)
+        pygame.draw.circle(sprite, color, (size, size), size)
+        pygame.draw.circle(sprite, edge_color, (size, size), size, 1)
+        
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert()
+        return sprite
+    
+    def prerender(self, color, size):
+        """Render every alpha level of a sprite ahead of its first use"""
+        for level in range(self.alpha_levels):
+            self.get(color, size, (level + 1) * 255 // self.alpha_levels)
+    
+    def clear(self):
+        self.entries.clear()
+
+particle_sprites = ParticleSpriteCache()
+
+# Font sizes used by the UI
+FONT_LARGE = 36
+FONT_MEDIUM = 24
+FONT_SMALL = 18
+
+class TextCache:
+    """Loads each font size once and keeps rendered text surfaces.
+    
+    Labels are keyed by (text, size, color), so static text renders once
+    and a changing label such as the score re-renders only when its value
+    changes. Least recently used surfaces are evicted past max_entries.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+    
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            if not pygame.font.get_init():  # main() does this up front, other users get it on first use
+                pygame.font.init()
+            font = pygame.font.Font(None, size)
+            self.fonts[size] = font
+        return font
+    
+    def render(self, text, size, color):
+        key = (text, size, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.font(size).render(text, True, color)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.max_entries:
+                self.surfaces.popitem(last=False)
         else:
-            if 'down' in self.key_timers:
-                del self.key_timers['down']
-    
-    def handle_key_down(self, key):
-        if key == pygame.K_p:  # Pause toggle
-            if self.in_settings:
-                self.in_settings = False
-            else:
-                self.paused = not self.paused
-            return
-        
-        if self.game_over:
-            if key == pygame.K_r:
-                self.__init__()  # Restart game
-            return
-        
-        if self.in_settings:
-            self.handle_settings_input(key)
-            return
-        
-        if self.paused:
-            if key == pygame.K_c:  # Open settings
-                self.in_settings = True
-            return
-        
-        # Don't accept input during combo
-        if self.combo_active:
-            return
-        
-        if key == pygame.K_w or key == pygame.K_UP:
-            self.rotate_piece(clockwise=True)
-        elif key == pygame.K_z:  # Counter-clockwise rotation
-            self.rotate_piece(clockwise=False)
-        elif key == pygame.K_q or key == pygame.K_SPACE:
-            self.hard_drop()
-        elif key == pygame.K_c:  # Hold piece
-            self.hold_current_piece()
-    
-    def handle_settings_input(self, key):
-        """Handle input in settings menu"""
-        if key == pygame.K_UP or key == pygame.K_w:
-            self.settings_selected = (self.settings_selected - 1) % len(self.settings_options)
-        elif key == pygame.K_DOWN or key == pygame.K_s:
-            self.settings_selected = (self.settings_selected + 1) % len(self.settings_options)
-        elif key == pygame.K_LEFT or key == pygame.K_a:
-            self.adjust_setting(-1)
-        elif key == pygame.K_RIGHT or key == pygame.K_d:
-            self.adjust_setting(1)
-        elif key == pygame.K_ESCAPE:
-            self.in_settings = False
-    
-    def adjust_setting(self, direction):
-        """Adjust the currently selected setting"""
-        current_option = self.settings_options[self.settings_selected]
-        
-        if current_option == 'particle_density':
-            self.settings['particle_density'] = max(0.0, min(2.0, 
-                self.settings['particle_density'] + direction * 0.1))
-        elif current_option == 'particle_lifetime':
-            self.settings['particle_lifetime'] = max(0.5, min(2.0, 
-                self.settings['particle_lifetime'] + direction * 0.1))
-        elif current_option == 'particle_effects':
-            self.settings['particle_effects'] = not self.settings['particle_effects']
-        elif current_option == 'show_particles':
-            self.settings['show_particles'] = not self.settings['show_particles']
+            self.surfaces.move_to_end(key)
+        return surface
+
+text_cache = TextCache()
+
+# Frame phase timer, main() swaps in a FrameProfiler when profiling is on
+profiler = NULL_PROFILER
+
+_dim_overlays = {}
+
+def dim_overlay(alpha):
+    """Full-window black surface at the given alpha, created once per alpha"""
+    overlay = _dim_overlays.get(alpha)
+    if overlay is None:
+        overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+        overlay.set_alpha(alpha)
+        overlay.fill(BLACK)
+        _dim_overlays[alpha] = overlay
+    return overlay
+
+def draw_particle(screen, x, y, size, color, alpha):
+    # Fade out over time
+    if alpha > 0:
+        sprite = particle_sprites.get(color, size, alpha)
+        screen.blit(sprite, (BORDER_WIDTH + x - size, BORDER_WIDTH + y - size))
 
 def draw_grid(screen):
     # Draw game area border
@@ -838,9 +272,7 @@ def draw_grid(screen):
                         (BORDER_WIDTH + GAME_WIDTH, BORDER_WIDTH + y * CELL_SIZE))
 
 def draw_cell(screen, x, y, color, alpha=255, is_golden=False):
-    rect = pygame.Rect(BORDER_WIDTH + x * CELL_SIZE + 1, 
-                      BORDER_WIDTH + y * CELL_SIZE + 1,
-                      CELL_SIZE - 1, CELL_SIZE - 1)
+    rect = cell_rect(x, y)
     
     if alpha < 255:
         # Create a surface for transparent drawing
@@ -869,44 +301,53 @@ def draw_cell(screen, x, y, color, alpha=255, is_golden=False):
         
         # Draw golden cube effect
         if is_golden:
-            # Animated golden sparkle effect
-            current_time = pygame.time.get_ticks()
-            sparkle_alpha = int(abs(255 * (0.5 + 0.5 * (current_time % 1000) / 1000 - 0.5)))
+            draw_golden_overlay(screen, rect)
             
-            # Create golden overlay
-            gold_surface = pygame.Surface((CELL_SIZE - 1, CELL_SIZE - 1))
-            gold_surface.set_alpha(sparkle_alpha)
-            gold_surface.fill(BRIGHT_GOLD)
-            screen.blit(gold_surface, rect.topleft)
+def cell_rect(x, y):
+    return pygame.Rect(BORDER_WIDTH + x * CELL_SIZE + 1,
+                       BORDER_WIDTH + y * CELL_SIZE + 1,
+                       CELL_SIZE - 1, CELL_SIZE - 1)
             
-            # Draw golden border
-            pygame.draw.rect(screen, GOLD, rect, 3)
+def draw_golden_overlay(screen, rect):
+    # Animated golden sparkle effect
+    current_time = int(time.perf_counter() * 1000)  # pygame's timer is not initialized
+    sparkle_alpha = int(abs(255 * (0.5 + 0.5 * (current_time % 1000) / 1000 - 0.5)))
+    
+    # Create golden overlay
+    gold_surface = pygame.Surface((CELL_SIZE - 1, CELL_SIZE - 1))
+    gold_surface.set_alpha(sparkle_alpha)
+    gold_surface.fill(BRIGHT_GOLD)
+    screen.blit(gold_surface, rect.topleft)
+    
+    # Draw golden border
+    pygame.draw.rect(screen, GOLD, rect, 3)
 
-def draw_game(screen, game):
+def draw_game(screen, game, interpolation=1.0):
     screen.fill(BLACK)
     
     # Draw grid
     draw_grid(screen)
     
     # Draw placed pieces
+    grid, golden_rows = game.board_rows()
     for y in range(GRID_HEIGHT):
+        row = grid[y]
+        golden = golden_rows[y]
         for x in range(GRID_WIDTH):
-            if game.grid[y][x] is not None:
-                is_golden = (x, y) in game.golden_cubes
-                draw_cell(screen, x, y, game.grid[y][x], is_golden=is_golden)
+            if row[x] is not None:
+                draw_cell(screen, x, y, row[x], is_golden=golden >> x & 1)
     
     # Draw ghost piece (hard drop preview)
     if game.current_piece:
+        token = profiler.start()
         ghost_y = game.get_ghost_position()
         if ghost_y is not None and ghost_y != game.current_piece.y:
-            ghost_piece = Tetromino(game.current_piece.type)
-            ghost_piece.x = game.current_piece.x
-            ghost_piece.y = ghost_y
-            ghost_piece.rotation = game.current_piece.rotation
-            
-            for x, y in ghost_piece.get_cells():
+            ghost_x = game.current_piece.x
+            for dx, dy in game.current_piece.get_offsets():
+                x, y = ghost_x + dx, ghost_y + dy
                 if 0 <= x < GRID_WIDTH and y >= 0:
                     draw_cell(screen, x, y, game.current_piece.color, alpha=80)
+        profiler.stop('ghost', token)
     
     # Draw current piece
     if game.current_piece:
@@ -916,55 +357,63 @@ def draw_game(screen, game):
     
     # Draw particles
     if game.settings['show_particles']:
-        for particle in game.particles:
-            particle.draw(screen)
+        token = profiler.start()
+        for x, y, size, color, alpha in game.particles.draw_items(interpolation):
+            draw_particle(screen, x, y, size, color, alpha)
+        profiler.stop('particles', token)
     
     # Draw UI
+    token = profiler.start()
     draw_ui(screen, game)
+    profiler.stop('ui', token)
 
 def draw_ui(screen, game):
-    font_large = pygame.font.Font(None, 36)
-    font_medium = pygame.font.Font(None, 24)
-    font_small = pygame.font.Font(None, 18)
+    draw_sidebar(screen, game)
+    draw_overlay(screen, game)
+
+def draw_sidebar(screen, game):
+    screen.blit(sidebar_cache.get(game), (SIDEBAR_X, 0))
     
-    ui_x = GAME_WIDTH + BORDER_WIDTH * 2 + 10
+def render_sidebar(screen, game):
+    """Draw the sidebar contents onto a surface whose left edge is SIDEBAR_X"""
+    ui_x = 0
     
     # Title
-    title = font_large.render("TETRIS", True, WHITE)
+    title = text_cache.render("TETRIS", FONT_LARGE, WHITE)
     screen.blit(title, (ui_x, 20))
     
     # Score
-    score_text = font_medium.render(f"Score: {game.score}", True, WHITE)
+    score_text = text_cache.render(f"Score: {game.score}", FONT_MEDIUM, WHITE)
     screen.blit(score_text, (ui_x, 70))
     
     # Level
-    level_text = font_medium.render(f"Level: {game.level}", True, WHITE)
+    level_text = text_cache.render(f"Level: {game.level}", FONT_MEDIUM, WHITE)
     screen.blit(level_text, (ui_x, 100))
     
     # Lines
-    lines_text = font_medium.render(f"Lines: {game.lines_cleared}", True, WHITE)
+    lines_text = text_cache.render(f"Lines: {game.lines_cleared}", FONT_MEDIUM, WHITE)
     screen.blit(lines_text, (ui_x, 130))
     
     # Active buffs
     buff_y = 160
     if game.active_buffs:
-        buff_title = font_medium.render("Active Buffs:", True, GOLD)
+        buff_title = text_cache.render("Active Buffs:", FONT_MEDIUM, GOLD)
         screen.blit(buff_title, (ui_x, buff_y))
         buff_y += 25
         
-        current_time = pygame.time.get_ticks()
+        current_time = game.clock()
         for buff_type, buff_data in game.active_buffs.items():
             buff_info = game.buff_types[buff_type]
             remaining_time = (buff_data['duration'] - (current_time - buff_data['start_time'])) / 1000
             
             if remaining_time > 0:
-                buff_text = font_small.render(f"{buff_info['name']}: {remaining_time:.1f}s", True, buff_info['color'])
+                buff_text = text_cache.render(f"{buff_info['name']}: {remaining_time:.1f}s", FONT_SMALL, buff_info['color'])
                 screen.blit(buff_text, (ui_x, buff_y))
                 buff_y += 18
     
     # Golden cubes count
-    if game.golden_cubes:
-        golden_text = font_small.render(f"Golden Cubes: {len(game.golden_cubes)}", True, GOLD)
+    if game.golden_count:
+        golden_text = text_cache.render(f"Golden Cubes: {game.golden_count}", FONT_SMALL, GOLD)
         screen.blit(golden_text, (ui_x, buff_y))
         buff_y += 25
     
@@ -972,37 +421,28 @@ def draw_ui(screen, game):
     hold_y = buff_y + 10
     
     # Hold piece
-    hold_text = font_medium.render("Hold:", True, WHITE)
+    hold_text = text_cache.render("Hold:", FONT_MEDIUM, WHITE)
     screen.blit(hold_text, (ui_x, hold_y))
     
     if game.hold_piece:
-        hold_tetromino = Tetromino(game.hold_piece)
-        hold_shape = hold_tetromino.get_shape()
-        hold_color = hold_tetromino.color if game.can_hold else tuple(c // 2 for c in hold_tetromino.color)
+        hold_color = COLORS[game.hold_piece] if game.can_hold else tuple(c // 2 for c in COLORS[game.hold_piece])
         
-        for row_idx, row in enumerate(hold_shape):
-            for col_idx, cell in enumerate(row):
-                if cell == '#':
-                    x = ui_x + col_idx * 20
-                    y = hold_y + 30 + row_idx * 20
-                    pygame.draw.rect(screen, hold_color, (x, y, 18, 18))
+        for col_idx, row_idx in SHAPE_CELLS[game.hold_piece][0]:
+            x = ui_x + col_idx * 20
+            y = hold_y + 30 + row_idx * 20
+            pygame.draw.rect(screen, hold_color, (x, y, 18, 18))
     
     # Next piece
     next_y = hold_y + 100
-    next_text = font_medium.render("Next:", True, WHITE)
+    next_text = text_cache.render("Next:", FONT_MEDIUM, WHITE)
     screen.blit(next_text, (ui_x, next_y))
     
     if game.next_piece:
-        next_tetromino = Tetromino(game.next_piece)
-        next_shape = next_tetromino.get_shape()
-        
-        for row_idx, row in enumerate(next_shape):
-            for col_idx, cell in enumerate(row):
-                if cell == '#':
-                    x = ui_x + col_idx * 20
-                    y = next_y + 30 + row_idx * 20
-                    pygame.draw.rect(screen, next_tetromino.color,
-                                   (x, y, 18, 18))
+        for col_idx, row_idx in SHAPE_CELLS[game.next_piece][0]:
+            x = ui_x + col_idx * 20
+            y = next_y + 30 + row_idx * 20
+            pygame.draw.rect(screen, COLORS[game.next_piece],
+                           (x, y, 18, 18))
     
     # Controls
     controls_y = next_y + 120
@@ -1029,20 +469,41 @@ def draw_ui(screen, game):
     
     for i, text in enumerate(controls):
         color = WHITE if i == 0 else LIGHT_GRAY
-        font = font_medium if i == 0 else font_small
-        control_text = font.render(text, True, color)
+        font_size = FONT_MEDIUM if i == 0 else FONT_SMALL
+        control_text = text_cache.render(text, font_size, color)
         screen.blit(control_text, (ui_x, controls_y + i * 20))
+
+class SidebarCache:
+    """Keeps the rendered sidebar, hold and next previews included, until sidebar_state() changes"""
+    def __init__(self):
+        self.surface = None
+        self.key = None
+    
+    def get(self, game):
+        key = sidebar_state(game)
+        if self.surface is None or key != self.key:
+            if self.surface is None:
+                self.surface = pygame.Surface((WINDOW_WIDTH - SIDEBAR_X, WINDOW_HEIGHT))
+                if pygame.display.get_surface() is not None:
+                    self.surface = self.surface.convert()
+            self.surface.fill(BLACK)
+            render_sidebar(self.surface, game)
+            self.key = key
+        return self.surface
+
+sidebar_cache = SidebarCache()
     
+def has_overlay(game):
+    return game.paused or game.in_settings or game.game_over
+
+def draw_overlay(screen, game):
     # Pause overlay
     if game.paused and not game.in_settings:
-        overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
-        overlay.set_alpha(128)
-        overlay.fill(BLACK)
-        screen.blit(overlay, (0, 0))
+        screen.blit(dim_overlay(128), (0, 0))
         
-        pause_text = font_large.render("PAUSED", True, WHITE)
-        resume_text = font_medium.render("Press P to resume", True, WHITE)
-        settings_text = font_medium.render("Press C for settings", True, WHITE)
+        pause_text = text_cache.render("PAUSED", FONT_LARGE, WHITE)
+        resume_text = text_cache.render("Press P to resume", FONT_MEDIUM, WHITE)
+        settings_text = text_cache.render("Press C for settings", FONT_MEDIUM, WHITE)
         
         text_rect = pause_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 40))
         resume_rect = resume_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2))
@@ -1058,13 +519,10 @@ def draw_ui(screen, game):
     
     # Game over
     elif game.game_over:
-        overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
-        overlay.set_alpha(128)
-        overlay.fill(BLACK)
-        screen.blit(overlay, (0, 0))
+        screen.blit(dim_overlay(128), (0, 0))
         
-        game_over_text = font_large.render("GAME OVER", True, WHITE)
-        restart_text = font_medium.render("Press R to restart", True, WHITE)
+        game_over_text = text_cache.render("GAME OVER", FONT_LARGE, WHITE)
+        restart_text = text_cache.render("Press R to restart", FONT_MEDIUM, WHITE)
         
         text_rect = game_over_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 20))
         restart_rect = restart_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 + 20))
@@ -1072,17 +530,181 @@ def draw_ui(screen, game):
         screen.blit(game_over_text, text_rect)
         screen.blit(restart_text, restart_rect)
 
+def sidebar_state(game):
+    """Everything the sidebar shows, so it is only redrawn when this changes"""
+    current_time = game.clock()
+    buffs = tuple((buff_type, f"{(buff_data['duration'] - (current_time - buff_data['start_time'])) / 1000:.1f}")
+                  for buff_type, buff_data in game.active_buffs.items())
+    return (game.score, game.level, game.lines_cleared, game.hold_piece, game.can_hold,
+            game.next_piece, game.golden_count, buffs)
+
+class DirtyRectRenderer:
+    """Render mode that redraws only what changed since the previous frame.
+    
+    Grid lines, locked cells and the sidebar live on an off-screen static
+    layer. The board part is rebuilt only when game.board_version changes
+    (place_piece, line clears and each clear animation step), the sidebar
+    only when sidebar_state() does. Each frame restores the areas covered
+    last frame from that layer, draws golden sparkles, ghost, active piece
+    and particles on top, and returns the rectangles for
+    pygame.display.update.
+    """
+    # Past this many particle rects one bounding rect is cheaper to push
+    MAX_PARTICLE_RECTS = 32
+    # Cell shading lines are 2px wide and spill just outside the cell rect
+    CELL_MARGIN = 4
+    SIDEBAR_RECT = pygame.Rect(GAME_WIDTH + BORDER_WIDTH * 2, 0,
+                               SIDEBAR_WIDTH + BORDER_WIDTH, WINDOW_HEIGHT)
+    
+    def __init__(self):
+        self.static_layer = None
+        self.static_version = None
+        self.sidebar_key = None
+        self.dynamic_rects = []
+        self.full_redraw = True
+    
+    def build_static_layer(self, screen, game):
+        if self.static_layer is None:
+            self.static_layer = pygame.Surface(screen.get_size()).convert()
+        layer = self.static_layer
+        layer.fill(BLACK)
+        draw_grid(layer)
+        grid, _ = game.board_rows()
+        for y in range(GRID_HEIGHT):
+            row = grid[y]
+            for x in range(GRID_WIDTH):
+                if row[x] is not None:
+                    draw_cell(layer, x, y, row[x])
+        draw_sidebar(layer, game)
+        self.static_version = game.board_version
+        self.sidebar_key = sidebar_state(game)
+    
+    def draw(self, screen, game, interpolation=1.0):
+        """Draw a frame and return the list of screen rects that changed"""
+        if has_overlay(game):
+            # Menus and game over cover the whole window, fall back to a full redraw
+            draw_game(screen, game, interpolation)
+            self.full_redraw = True
+            return [screen.get_rect()]
+        
+        rects = []
+        if self.static_layer is None or self.static_version != game.board_version:
+            self.build_static_layer(screen, game)
+            self.full_redraw = True
+        else:
+            token = profiler.start()
+            key = sidebar_state(game)
+            if key != self.sidebar_key:
+                self.static_layer.fill(BLACK, self.SIDEBAR_RECT)
+                draw_sidebar(self.static_layer, game)
+                self.sidebar_key = key
+                screen.blit(self.static_layer, self.SIDEBAR_RECT, self.SIDEBAR_RECT)
+                rects.append(self.SIDEBAR_RECT)
+            profiler.stop('ui', token)
+        
+        if self.full_redraw:
+            screen.blit(self.static_layer, (0, 0))
+        else:
+            # Restore whatever the dynamic layer covered last frame
+            for rect in self.dynamic_rects:
+                screen.blit(self.static_layer, rect, rect)
+            rects.extend(self.dynamic_rects)
+        
+        self.dynamic_rects = self.draw_dynamic(screen, game, interpolation)
+        if self.full_redraw:
+            self.full_redraw = False
+            return [screen.get_rect()]
+        return rects + self.dynamic_rects
+    
+    def track(self, rect):
+        """Restore rect from the static layer next frame, for things drawn over this frame"""
+        self.dynamic_rects.append(rect)
+    
+    def draw_dynamic(self, screen, game, interpolation):
+        screen_rect = screen.get_rect()
+        rects = []
+        
+        # Golden cubes sparkle every frame
+        for y, golden in enumerate(game.board_rows()[1]):
+            if golden:
+                for x in range(GRID_WIDTH):
+                    if golden >> x & 1:
+                        rect = cell_rect(x, y)
+                        draw_golden_overlay(screen, rect)
+                        rects.append(rect)
+        
+        if game.current_piece:
+            piece = game.current_piece
+            token = profiler.start()
+            ghost_y = game.get_ghost_position()
+            if ghost_y is not None and ghost_y != piece.y:
+                for dx, dy in piece.get_offsets():
+                    x, y = piece.x + dx, ghost_y + dy
+                    if 0 <= x < GRID_WIDTH and y >= 0:
+                        draw_cell(screen, x, y, piece.color, alpha=80)
+                        rects.append(cell_rect(x, y).inflate(self.CELL_MARGIN, self.CELL_MARGIN))
+            profiler.stop('ghost', token)
+            
+            for x, y in piece.get_cells():
+                if 0 <= x < GRID_WIDTH and y >= 0:
+                    draw_cell(screen, x, y, piece.color)
+                    rects.append(cell_rect(x, y).inflate(self.CELL_MARGIN, self.CELL_MARGIN))
+        
+        if game.settings['show_particles'] and len(game.particles):
+            token = profiler.start()
+            particle_rects = []
+            for x, y, size, color, alpha in game.particles.draw_items(interpolation):
+                draw_particle(screen, x, y, size, color, alpha)
+                particle_rects.append(pygame.Rect(BORDER_WIDTH + x - size, BORDER_WIDTH + y - size,
+                                                  size * 2 + 1, size * 2 + 1))
+            if len(particle_rects) > self.MAX_PARTICLE_RECTS:
+                particle_rects = [particle_rects[0].unionall(particle_rects)]
+            rects.extend(particle_rects)
+            profiler.stop('particles', token)
+        
+        return [rect.clip(screen_rect) for rect in rects]
+
+class ProfilerHud:
+    """Frame timing overlay, percentiles are recomputed every `interval` frames"""
+    def __init__(self, interval=30):
+        self.interval = interval
+        self.lines = []
+        self.updated_at = None
+        self.background = None
+    
+    def draw(self, screen, profiler, particles=None):
+        """Draw the overlay in the top-left corner and return its rect"""
+        if self.updated_at is None or profiler.count - self.updated_at >= self.interval:
+            self.updated_at = profiler.count
+            self.lines = [("ms", "p50", "p95", "p99")]
+            for phase in ('frame',) + FRAME_PHASES + SUB_PHASES:
+                self.lines.append((phase,) + tuple(f"{value:.2f}" for value in profiler.percentiles(phase)))
+            if particles is not None:
+                stats = particles.stats()
+                self.lines.append(("particles", "live", "peak", "over"))
+                self.lines.append((f"of {stats['capacity']}", str(stats['live']), str(stats['peak']),
+                                   str(stats['overflow'])))
+        
+        line_height = FONT_SMALL - 4
+        column_right = (0, 105, 145, 185)  # Values are right-aligned at these offsets
+        rect = pygame.Rect(BORDER_WIDTH, BORDER_WIDTH, 190, line_height * len(self.lines) + 6)
+        if self.background is None or self.background.get_size() != rect.size:
+            self.background = pygame.Surface(rect.size)
+            self.background.set_alpha(180)
+            self.background.fill(BLACK)
+        screen.blit(self.background, rect.topleft)
+        for i, line in enumerate(self.lines):
+            y = rect.y + 3 + i * line_height
+            screen.blit(text_cache.render(line[0], FONT_SMALL, WHITE), (rect.x + 4, y))
+            for text, right in zip(line[1:], column_right[1:]):
+                surface = text_cache.render(text, FONT_SMALL, WHITE)
+                screen.blit(surface, (rect.x + right - surface.get_width(), y))
+        return rect
+
 def draw_settings_menu(screen, game):
     """Draw the settings menu overlay"""
-    font_large = pygame.font.Font(None, 36)
-    font_medium = pygame.font.Font(None, 24)
-    font_small = pygame.font.Font(None, 18)
-    
     # Dark overlay
-    overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
-    overlay.set_alpha(200)
-    overlay.fill(BLACK)
-    screen.blit(overlay, (0, 0))
+    screen.blit(dim_overlay(200), (0, 0))
     
     # Settings window
     settings_width = 400
@@ -1095,7 +717,7 @@ def draw_settings_menu(screen, game):
     pygame.draw.rect(screen, WHITE, (settings_x, settings_y, settings_width, settings_height), 2)
     
     # Title
-    title_text = font_large.render("SETTINGS", True, WHITE)
+    title_text = text_cache.render("SETTINGS", FONT_LARGE, WHITE)
     title_rect = title_text.get_rect(center=(WINDOW_WIDTH // 2, settings_y + 30))
     screen.blit(title_text, title_rect)
     
@@ -1112,7 +734,7 @@ def draw_settings_menu(screen, game):
             pygame.draw.rect(screen, WHITE, highlight_rect, 1)
         
         # Option name
-        option_text = font_medium.render(option_name, True, WHITE)
+        option_text = text_cache.render(option_name, FONT_MEDIUM, WHITE)
         screen.blit(option_text, (settings_x + 20, option_y + i * 40))
         
         # Option value
@@ -1123,7 +745,7 @@ def draw_settings_menu(screen, game):
             value_text = f"{setting_value:.1f}"
             value_color = WHITE
         
-        value_surface = font_medium.render(value_text, True, value_color)
+        value_surface = text_cache.render(value_text, FONT_MEDIUM, value_color)
         value_rect = value_surface.get_rect(right=settings_x + settings_width - 20, top=option_y + i * 40)
         screen.blit(value_surface, value_rect)
     
@@ -1136,39 +758,229 @@ def draw_settings_menu(screen, game):
     ]
     
     for i, help_text in enumerate(help_texts):
-        help_surface = font_small.render(help_text, True, LIGHT_GRAY)
+        help_surface = text_cache.render(help_text, FONT_SMALL, LIGHT_GRAY)
         help_rect = help_surface.get_rect(center=(WINDOW_WIDTH // 2, help_y + i * 20))
         screen.blit(help_surface, help_rect)
 
-def main():
-    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+# Overlay labels the first frame does not draw
+OVERLAY_LABELS = (
+    ("PAUSED", FONT_LARGE), ("Press P to resume", FONT_MEDIUM), ("Press C for settings", FONT_MEDIUM),
+    ("GAME OVER", FONT_LARGE), ("Press R to restart", FONT_MEDIUM),
+)
+
+def warm_caches(game):
+    """Render what later frames need but the first one does not, one piece of work per step.
+    
+    A generator, so the main loop can spread it over the idle time between
+    frames instead of stalling the first pause or the first line clear.
+    """
+    draw_settings_menu(pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT)), game)
+    yield
+    for text, size in OVERLAY_LABELS:
+        text_cache.render(text, size, WHITE)
+        yield
+    dim_overlay(128)
+    yield
+    low, high = LINE_CLEAR_SIZES
+    for color in dict.fromkeys(LINE_CLEAR_COLORS + GOLDEN_CLEAR_COLORS):
+        for size in range(low, high + 1):
+            particle_sprites.prerender(color, size)
+            yield
+
+def run_until(tasks, deadline):
+    """Step the tasks generator until deadline passes, at least once. Returns None when it is done."""
+    for _ in tasks:
+        if time.perf_counter() >= deadline:
+            return tasks
+    return None
+
+# The game simulates in fixed steps, independent of how often frames are drawn.
+# Steps are whole milliseconds so recorded sessions replay exactly.
+SIM_STEP_MS = 4
+# Longest stretch of time one frame catches up on, a stall beyond this
+# (window drag, breakpoint) slows the game down instead of fast-forwarding it
+MAX_CATCH_UP_MS = 250
+# Idle time left before the next frame when cache warm-up stops
+WARMUP_MARGIN = 0.002
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tetris")
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help="cache the board and only push changed screen areas each frame")
+    parser.add_argument('--tick-ms', type=int, default=SIM_STEP_MS,
+                        help=f"fixed simulation step in whole milliseconds (default {SIM_STEP_MS}, "
+                             f"{1000 // SIM_STEP_MS} Hz)")
+    parser.add_argument('--render', choices=('capped', 'uncapped', 'vsync'), default='capped',
+                        help="frame pacing: capped at --fps, as fast as possible, or synced to the display")
+    parser.add_argument('--fps', type=int, default=60, help="frame rate cap for --render capped")
+    parser.add_argument('--das', type=int, default=None,
+                        help="ms a held left/right waits before it repeats (default 150)")
+    parser.add_argument('--arr', type=int, default=None,
+                        help="ms between repeated shifts once DAS has charged, 0 shifts straight to the wall "
+                             "(default 150)")
+    parser.add_argument('--interpolate', action='store_true',
+                        help="blend particle positions between simulation steps for smoother motion")
+    parser.add_argument('--no-particle-governor', action='store_true',
+                        help="always use the full particle settings, even when frames run slow")
+    parser.add_argument('--seed', type=int, default=None, help="seed the game for a reproducible piece sequence")
+    parser.add_argument('--record', metavar='PATH',
+                        help="record every input to PATH, replay it with tetris_replay.py")
+    parser.add_argument('--profile', action='store_true',
+                        help="time every frame phase from the start (F3 shows the timings, F4 saves them)")
+    parser.add_argument('--profile-csv', metavar='PATH', default=None,
+                        help="profile and write the frame timings to PATH on exit (and on F4)")
+    parser.add_argument('--startup-report', action='store_true',
+                        help="print how long each startup step took once the first frame is on screen")
+    parser.add_argument('--max-frames', type=int, default=None, metavar='N',
+                        help="quit after N frames, for startup benchmarks and smoke tests")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global profiler
+    startup = StartupTimer(STARTUP_BEGIN)
+    startup.mark('imports')
+    args = parse_args(argv)
+    if args.profile or args.profile_csv:
+        profiler = FrameProfiler()
+    profile_csv = args.profile_csv or 'frame_times.csv'
+    hud = None
+    
+    # Only what the first frame needs, sound and joysticks are never used
+    pygame.display.init()
+    pygame.font.init()
+    startup.mark('init')
+    if args.render == 'vsync':
+        try:
+            screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SCALED, vsync=1)
+        except pygame.error:  # No vsync on this driver, cap the frame rate instead
+            args.render = 'capped'
+            screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    else:
+        screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
     pygame.display.set_caption("Tetris")
-    clock = pygame.time.Clock()
-    
-    game = TetrisGame()
-    
+    startup.mark('window')
+    frame_time = 1 / args.fps if args.render == 'capped' else 0
+    step_ms = args.tick_ms
+    
+    # Game time advances only through update(dt), so a seed and the recorded inputs replay exactly
+    game = TetrisGame(seed=args.seed)
+    if args.das is not None:
+        game.das = args.das
+    if args.arr is not None:
+        game.arr = args.arr
+    recorder = None
+    if args.record:
+        from tetris_replay import ReplayWriter
+        recorder = ReplayWriter(game, args.record)
+    renderer = DirtyRectRenderer() if args.dirty_rects else None
+    governor = None
+    if not args.no_particle_governor:
+        governor = ParticleGovernor(target_ms=1000 / (args.fps if args.render == 'capped' else 60))
+    
+    inputs = InputQueue()
+    pending = deque()  # (game time, event) key events waiting for the step they happened in
+    keys_down = set()
+    accumulator = 0.0
+    last_time = time.perf_counter()
+    next_frame = last_time - frame_time  # Draw the first frame straight away
+    startup.mark('game')
+    warmup = None  # Started once the first frame is up
+    frames = 0
     running = True
     while running:
-        dt = clock.tick(60)
-        keys_pressed = pygame.key.get_pressed()
-        
-        for event in pygame.event.get():
+        if frame_time:
+            next_frame = max(next_frame + frame_time, time.perf_counter() - frame_time)
+            if warmup is not None:
+                warmup = run_until(warmup, next_frame - WARMUP_MARGIN)
+            inputs.wait_until(next_frame)
+        elif warmup is not None:
+            warmup = run_until(warmup, 0)
+        inputs.collect()
+        now = time.perf_counter()
+        accumulator += min((now - last_time) * 1000, MAX_CATCH_UP_MS)
+        last_time = now
+        
+        token = profiler.start()
+        # The game clock stands `accumulator` ms behind now, place key events on that timeline
+        frame_start_ms = game.clock()
+        for stamp, event in inputs.drain():
             if event.type == pygame.QUIT:
                 running = False
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    running = False
-                else:
-                    game.handle_key_down(event.key)
-        
-        game.handle_input(keys_pressed, dt)
-        game.update(dt)
-        
-        draw_game(screen, game)
-        pygame.display.flip()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                # Timing overlay, starts profiling if it was off
+                if not profiler.enabled:
+                    profiler = FrameProfiler()
+                    token = profiler.start()
+                hud = ProfilerHud() if hud is None else None
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                if profiler.enabled:
+                    profiler.write_csv(profile_csv)
+            elif event.type in (pygame.KEYDOWN, pygame.KEYUP):
+                at = frame_start_ms + max(0, int(accumulator - (now - stamp) * 1000))
+                if pending:
+                    at = max(at, pending[-1][0])
+                pending.append((at, event))
+        profiler.stop('input', token)
+        
+        # Run as many fixed steps as the elapsed time covers, each taking the key events that fell inside it
+        token = profiler.start()
+        while accumulator >= step_ms:
+            accumulator -= step_ms
+            step_end = game.clock() + step_ms
+            while pending and pending[0][0] < step_end:
+                at, event = pending.popleft()
+                handle_key_event(game, event, max(at, game.clock()), keys_down, recorder)
+            if recorder is not None:
+                recorder.record_tick(step_ms)
+            game.update(step_ms)
+        profiler.stop('update', token)
+        
+        interpolation = game.particle_interpolation() if args.interpolate else 1.0
+        token = profiler.start()
+        if renderer is not None:
+            rects = renderer.draw(screen, game, interpolation)
+            if hud is not None:
+                hud_rect = hud.draw(screen, profiler, game.particles)
+                renderer.track(hud_rect)
+                rects.append(hud_rect)
+        else:
+            draw_game(screen, game, interpolation)
+            if hud is not None:
+                hud.draw(screen, profiler, game.particles)
+        profiler.stop('draw', token)
+        drawn = time.perf_counter()
+        
+        token = profiler.start()
+        if renderer is not None:
+            pygame.display.update(rects)
+        else:
+            pygame.display.flip()
+        profiler.stop('present', token)
+        profiler.end_frame()
+        
+        frames += 1
+        if frames == 1:
+            startup.mark('first_frame')
+            if args.startup_report:
+                print(startup.report(), flush=True)
+            warmup = warm_caches(game)
+        if frames == args.max_frames:
+            running = False
+        
+        if governor is not None:
+            # Waiting for vsync is not work, leave presenting out of the measure there
+            work_end = drawn if args.render == 'vsync' else time.perf_counter()
+            game.particle_quality = governor.record((work_end - now) * 1000)
+    
+    if recorder is not None:
+        recorder.close()
+    if args.profile_csv:
+        profiler.write_csv(args.profile_csv)
     
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
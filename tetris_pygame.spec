@@ -10,7 +10,13 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Never imported by the game. setuptools and pkg_resources also bring runtime
+    # hooks that import them, and everything they pull in, on every launch.
+    excludes=[
+        'setuptools', 'pkg_resources', '_distutils_hack', 'distutils', 'wheel', 'yaml',
+        'tkinter', 'unittest', 'pydoc', 'doctest',
+        'pygame.tests', 'pygame.examples', 'pygame.docs',
+    ],
     noarchive=False,
     optimize=0,
 )
@@ -26,7 +32,7 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,  # UPX-packed libraries are unpacked again on every start, leave them as they are
     upx_exclude=[],
     runtime_tmpdir=None,
     console=False,
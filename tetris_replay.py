@@ -0,0 +1,480 @@
+"""Input recording and headless replay.
+
+A recording holds a game's seed, its starting configuration and every input
+the front end fed it, in order and stamped with the game clock: discrete
+actions, presses and releases of held actions (with the millisecond inside
+the step they happened at) and the dt of every simulation step.
+Replaying feeds the same inputs to a fresh TetrisGame with no rendering or
+frame pacing, so a session runs as fast as the CPU allows and must end in
+exactly the recorded state.
+
+Recordings are stored in a compact binary format (see ReplayWriter) that
+is written while the game runs and read back as a stream. InputRecorder
+keeps a recording in memory instead and saves it as JSON.
+
+    python tetris_pygame.py --record session.trp
+    python tetris_replay.py session.trp
+    python tetris_replay.py session.trp --compare-formats
+"""
+import argparse
+import io
+import json
+import queue
+import sys
+import threading
+import time
+
+from tetris_engine import ACTIONS, HELD_ACTIONS, TetrisGame
+
+RECORDING_VERSION = 4
+
+# Event kinds, each event is (game_time_ms, kind, value)
+ACTION = 'action'  # value: action name passed to apply_action
+PRESS = 'press'  # value: [held action, ms after the event's timestamp it was pressed]
+RELEASE = 'release'  # value: [held action, ms after the event's timestamp it was released]
+TICK = 'tick'  # value: dt passed to update
+
+class ReplayError(Exception):
+    """The replayed game drifted away from the recording"""
+
+class ReplayFormatError(ValueError):
+    """A replay file is not in a format this module can read"""
+
+def game_config(game):
+    """Settings and timings that shape a game but are not derived from its seed"""
+    return {
+        'settings': dict(game.settings),
+        'fall_speed': game.fall_speed,
+        'combo_delay': game.combo_delay,
+        'repeat_delay': game.repeat_delay,
+        'das': game.das,
+        'arr': game.arr,
+    }
+
+def apply_config(game, config):
+    game.settings.update(config['settings'])
+    game.fall_speed = config['fall_speed']
+    game.combo_delay = config['combo_delay']
+    game.repeat_delay = config['repeat_delay']
+    game.das = config['das']
+    game.arr = config['arr']
+
+class InputRecorder:
+    """Collects the inputs the front end feeds a game, in the order it feeds them, in memory"""
+    def __init__(self, game):
+        self.game = game
+        self.seed = game.seed
+        self.bitboard = game.bitboard
+        self.config = game_config(game)
+        self.events = []
+    
+    def record_action(self, action):
+        self.append(ACTION, action)
+    
+    def record_press(self, action, at):
+        """Record game.press(action, at), at being no earlier than the game clock"""
+        self.append(PRESS, [action, at - self.game.clock()])
+    
+    def record_release(self, action, at):
+        self.append(RELEASE, [action, at - self.game.clock()])
+    
+    def record_tick(self, dt):
+        self.append(TICK, dt)
+    
+    def append(self, kind, value):
+        self.events.append((self.game.clock(), kind, value))
+    
+    def header(self):
+        return {'version': RECORDING_VERSION, 'seed': self.seed, 'bitboard': self.bitboard, 'config': self.config}
+    
+    def footer(self):
+        return {'final_digest': self.game.state_digest(), 'final_score': self.game.score}
+    
+    def to_dict(self):
+        return {**self.header(), 'events': self.events, **self.footer()}
+    
+    def save(self, path):
+        """Write the recording as JSON"""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+
+# Binary format, all integers are LEB128 varints:
+#
+#   magic, format version byte
+#   header: zigzag seed, flags (bitboard, particle_effects, show_particles),
+#           particle_density and particle_lifetime in hundredths,
+#           fall_speed, combo_delay, repeat_delay, das, arr
+#   events: one opcode byte each, timestamps are implied by the ticks
+#       0x00-0x7f  tick, dt is the opcode
+#       0x80-0xbf  action, ACTIONS[opcode - 0x80]
+#       0xc0-0xc3  press HELD_ACTIONS[opcode - 0xc0], ms offset follows
+#       0xc4-0xc7  release HELD_ACTIONS[opcode - 0xc4], ms offset follows
+#       0xfd       tick with dt >= 128, dt follows
+#   end: 0xfe, 32-byte state digest, final score
+#
+# A file cut short by a crash still replays up to its last complete event.
+REPLAY_MAGIC = b'TTRP'
+OP_ACTION = 0x80
+OP_PRESS = 0xc0
+OP_RELEASE = 0xc4
+OP_LONG_TICK = 0xfd
+OP_END = 0xfe
+ACTION_CODES = {action: i for i, action in enumerate(ACTIONS)}
+HELD_CODES = {action: i for i, action in enumerate(HELD_ACTIONS)}
+# Longest encoding of one event, the reader keeps at least this much buffered
+MAX_EVENT_BYTES = 1 + 32 + 10
+CHUNK_SIZE = 1 << 16
+
+def write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+def read_varint(data, pos):
+    """Return (value, new_pos); IndexError if data ends inside the varint"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def encode_header(header):
+    config = header['config']
+    settings = config['settings']
+    buffer = bytearray(REPLAY_MAGIC)
+    buffer.append(header['version'])
+    seed = header['seed']
+    write_varint(buffer, seed * 2 if seed >= 0 else -seed * 2 - 1)
+    buffer.append(bool(header['bitboard']) | bool(settings['particle_effects']) << 1
+                  | bool(settings['show_particles']) << 2)
+    write_varint(buffer, round(settings['particle_density'] * 100))
+    write_varint(buffer, round(settings['particle_lifetime'] * 100))
+    write_varint(buffer, config['fall_speed'])
+    write_varint(buffer, config['combo_delay'])
+    write_varint(buffer, config['repeat_delay'])
+    write_varint(buffer, config['das'])
+    write_varint(buffer, config['arr'])
+    return buffer
+
+def decode_header(data):
+    """Return (header, bytes consumed)"""
+    if data[:len(REPLAY_MAGIC)] != REPLAY_MAGIC:
+        raise ReplayFormatError("not a Tetris replay file")
+    pos = len(REPLAY_MAGIC)
+    version = data[pos]
+    if version != RECORDING_VERSION:
+        raise ReplayFormatError(f"unsupported replay version {version}")
+    seed, pos = read_varint(data, pos + 1)
+    flags = data[pos]
+    density, pos = read_varint(data, pos + 1)
+    lifetime, pos = read_varint(data, pos)
+    fall_speed, pos = read_varint(data, pos)
+    combo_delay, pos = read_varint(data, pos)
+    repeat_delay, pos = read_varint(data, pos)
+    das, pos = read_varint(data, pos)
+    arr, pos = read_varint(data, pos)
+    header = {
+        'version': version,
+        'seed': seed >> 1 if not seed & 1 else -(seed >> 1) - 1,
+        'bitboard': bool(flags & 1),
+        'config': {
+            'settings': {
+                'particle_density': density / 100,
+                'particle_lifetime': lifetime / 100,
+                'particle_effects': bool(flags & 2),
+                'show_particles': bool(flags & 4),
+            },
+            'fall_speed': fall_speed,
+            'combo_delay': combo_delay,
+            'repeat_delay': repeat_delay,
+            'das': das,
+            'arr': arr,
+        },
+    }
+    return header, pos
+
+def encode_event(buffer, kind, value):
+    if kind == TICK:
+        if value < OP_ACTION:
+            buffer.append(value)
+        else:
+            buffer.append(OP_LONG_TICK)
+            write_varint(buffer, value)
+    elif kind == ACTION:
+        buffer.append(OP_ACTION + ACTION_CODES[value])
+    elif kind == PRESS or kind == RELEASE:
+        action, offset = value
+        buffer.append((OP_PRESS if kind == PRESS else OP_RELEASE) + HELD_CODES[action])
+        write_varint(buffer, offset)
+    else:
+        raise ValueError(f"unknown event kind {kind!r}")
+
+def encode_footer(buffer, footer):
+    buffer.append(OP_END)
+    buffer.extend(bytes.fromhex(footer['final_digest']))
+    write_varint(buffer, footer['final_score'])
+
+def encode_recording(recording):
+    """Encode an in-memory recording (InputRecorder.to_dict layout) to bytes"""
+    buffer = encode_header(recording)
+    for _, kind, value in recording['events']:
+        encode_event(buffer, kind, value)
+    encode_footer(buffer, recording)
+    return bytes(buffer)
+
+class ReplayWriter(InputRecorder):
+    """Streams a recording to a binary file while the game runs.
+    
+    Events are encoded into a small in-memory buffer, and full chunks go to
+    a background thread that does the file writes, so the frame loop never
+    waits on disk. close() writes the final state and flushes everything.
+    """
+    def __init__(self, game, path, chunk_size=4096):
+        super().__init__(game)
+        self.chunk_size = chunk_size
+        self.file = open(path, 'wb')
+        self.file.write(encode_header(self.header()))
+        self.buffer = bytearray()
+        self.chunks = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._write_chunks, daemon=True)
+        self.thread.start()
+    
+    def _write_chunks(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                break
+            self.file.write(chunk)
+            self.file.flush()  # Keep crash recordings replayable
+    
+    def append(self, kind, value):
+        encode_event(self.buffer, kind, value)
+        if len(self.buffer) >= self.chunk_size:
+            self.chunks.put(bytes(self.buffer))
+            self.buffer.clear()
+    
+    def close(self):
+        if self.file.closed:
+            return
+        encode_footer(self.buffer, self.footer())
+        self.chunks.put(bytes(self.buffer))
+        self.buffer.clear()
+        self.chunks.put(None)
+        self.thread.join()
+        self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ReplayReader:
+    """Reads a binary recording as a stream of (game_time_ms, kind, value) events.
+    
+    source is a path or a binary file object. Only the header is read up
+    front; iterating decodes the file a chunk at a time. Once iteration finishes, footer holds the recorded final state,
+    or stays empty if the file was cut short.
+    """
+    def __init__(self, source):
+        self.file = source if hasattr(source, 'read') else open(source, 'rb')
+        head = self.file.read(CHUNK_SIZE)
+        try:
+            self.header, self.start = decode_header(head)
+        except IndexError:
+            raise ReplayFormatError("truncated replay header") from None
+        self.footer = {}
+    
+    def __iter__(self):
+        f = self.file
+        f.seek(self.start)
+        data = f.read(CHUNK_SIZE)
+        pos = 0
+        now = 0
+        while True:
+            if len(data) - pos < MAX_EVENT_BYTES:
+                more = f.read(CHUNK_SIZE)
+                if more:
+                    data = data[pos:] + more
+                    pos = 0
+                elif pos >= len(data):
+                    return  # Cut short, no footer
+            op = data[pos]
+            pos += 1
+            if op < OP_ACTION:
+                yield now, TICK, op
+                now += op
+            elif op < OP_PRESS:
+                yield now, ACTION, ACTIONS[op - OP_ACTION]
+            elif op < OP_RELEASE + len(HELD_ACTIONS):
+                try:
+                    offset, pos = read_varint(data, pos)
+                except IndexError:
+                    return
+                if op < OP_RELEASE:
+                    yield now, PRESS, [HELD_ACTIONS[op - OP_PRESS], offset]
+                else:
+                    yield now, RELEASE, [HELD_ACTIONS[op - OP_RELEASE], offset]
+            elif op == OP_LONG_TICK:
+                try:
+                    dt, pos = read_varint(data, pos)
+                except IndexError:
+                    return
+                yield now, TICK, dt
+                now += dt
+            elif op == OP_END:
+                try:
+                    score, _ = read_varint(data, pos + 32)
+                except IndexError:
+                    return
+                self.footer.update(final_digest=data[pos:pos + 32].hex(), final_score=score)
+                return
+            else:
+                raise ReplayFormatError(f"unknown opcode {op:#x}")
+    
+    def close(self):
+        self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def open_recording(path):
+    """Return (header, events, footer) for a binary or JSON recording.
+    
+    Binary events are a stream and their footer fills in once the stream
+    has been consumed.
+    """
+    with open(path, 'rb') as f:
+        binary = f.read(len(REPLAY_MAGIC)) == REPLAY_MAGIC
+    if binary:
+        reader = ReplayReader(path)
+        return reader.header, iter(reader), reader.footer
+    
+    with open(path) as f:
+        recording = json.load(f)
+    if recording.get('version') != RECORDING_VERSION:
+        raise ReplayFormatError(f"{path}: unsupported recording version {recording.get('version')!r}")
+    return recording, recording['events'], recording
+
+def replay(header, events, particle_effects=None):
+    """Re-run recorded events on a fresh game and return the game in its final state.
+    
+    The inputs reach the game exactly as the front end's main loop delivers
+    them, in order between update(dt) steps, presses and releases with
+    their recorded time inside the step. particle_effects overrides the
+    game's setting (particles never affect game state, only speed).
+    """
+    game = TetrisGame(bitboard=header['bitboard'], seed=header['seed'])
+    if 'config' in header:
+        apply_config(game, header['config'])
+    if particle_effects is not None:
+        game.settings['particle_effects'] = particle_effects
+    
+    for index, (timestamp, kind, value) in enumerate(events):
+        if game.clock() != timestamp:
+            raise ReplayError(f"event {index} was recorded at {timestamp} ms but replayed at {game.clock()} ms")
+        if kind == TICK:
+            game.update(value)
+        elif kind == ACTION:
+            game.apply_action(value)
+        elif kind == PRESS:
+            game.press(value[0], timestamp + value[1])
+        elif kind == RELEASE:
+            game.release(value[0], timestamp + value[1])
+        else:
+            raise ValueError(f"event {index}: unknown event kind {kind!r}")
+    return game
+
+def verify(footer, game):
+    """Raise ReplayError unless game ended in the recorded final state"""
+    expected = footer.get('final_digest')
+    if expected is None:
+        raise ReplayError("recording has no final state, it was cut short")
+    if game.state_digest() != expected:
+        raise ReplayError(f"final state differs from the recording (score {game.score}, "
+                          f"recorded {footer.get('final_score')})")
+
+def compare_formats(recording, repeat=5):
+    """Size and best-of-repeat encode/decode times of the binary format and plain JSON"""
+    events = len(recording['events'])
+    results = {}
+    
+    def best_time(fn):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+    
+    text = json.dumps(recording, separators=(',', ':')).encode()
+    results['json'] = (len(text),
+                       best_time(lambda: json.dumps(recording, separators=(',', ':')).encode()),
+                       best_time(lambda: json.loads(text)['events']))
+    
+    data = encode_recording(recording)
+    results['binary'] = (len(data),
+                         best_time(lambda: encode_recording(recording)),
+                         best_time(lambda: list(ReplayReader(io.BytesIO(data)))))
+    
+    lines = [f"{events} events"]
+    for name, (size, encode_time, decode_time) in results.items():
+        lines.append(f"{name:>7}: {size:>9} bytes ({size / events:.2f} B/event)  "
+                     f"encode {events / encode_time / 1e6:.2f}M events/s  "
+                     f"decode {events / decode_time / 1e6:.2f}M events/s")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded Tetris session headlessly and check its final state")
+    parser.add_argument('recording', help="file written by tetris_pygame.py --record (binary) or InputRecorder.save (JSON)")
+    parser.add_argument('--repeat', type=int, default=1, help="replay this many times and report the best time")
+    parser.add_argument('--no-particles', action='store_true',
+                        help="skip particle simulation, which never affects game state")
+    parser.add_argument('--compare-formats', action='store_true',
+                        help="benchmark size and speed of the binary format against JSON on this recording")
+    args = parser.parse_args(argv)
+    
+    header, events, footer = open_recording(args.recording)
+    if args.compare_formats:
+        # Re-encoding needs every event at once; this is a one-off benchmark, not the replay path
+        events = list(events)
+        print(compare_formats({**header, 'events': events, **footer}))
+        return
+    
+    # Counted from the stream, so memory stays bounded however long the recording is
+    frames = 0
+    game_ms = 0
+    for _, kind, value in events:
+        if kind == TICK:
+            frames += 1
+            game_ms += value
+    
+    best = None
+    for _ in range(args.repeat):
+        header, events, footer = open_recording(args.recording)
+        start = time.perf_counter()
+        game = replay(header, events, particle_effects=False if args.no_particles else None)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        try:
+            verify(footer, game)
+        except ReplayError as e:
+            print(f"MISMATCH: {e}")
+            sys.exit(1)
+    
+    speedup = game_ms / 1000 / best if best > 0 else float('inf')
+    print(f"OK: {frames} steps, {game_ms / 1000:.1f}s of play "
+          f"replayed in {best * 1000:.1f} ms ({frames / best:.0f} steps/s, {speedup:.0f}x real time)")
+    print(f"final score {game.score}, level {game.level}, lines {game.lines_cleared}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Headless self-play runner: plays batches of games on a process pool.
+
+Each game runs the real TetrisGame rules (line clears, combos, golden
+cubes, buffs and leveling) with a placement policy choosing where every
+piece goes, and the results are aggregated into one report.
+
+    python tetris_selfplay.py --games 1000 --policy greedy --workers 8
+    python tetris_selfplay.py --policy mybots:policy --json
+"""
+import argparse
+import concurrent.futures
+import importlib
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+from tetris_engine import (
+    GRID_WIDTH, GRID_HEIGHT, FULL_ROW_MASK, ROTATION_COUNTS, SHAPE_CELLS, Tetromino, TetrisGame,
+)
+
+def random_policy(game, rng):
+    """Pick any rotation and column"""
+    piece = game.current_piece
+    return rng.randrange(ROTATION_COUNTS[piece.type]), rng.randrange(-2, GRID_WIDTH)
+
+def evaluate_board(row_masks):
+    """Heuristic board score (higher is better) from aggregate height, holes and bumpiness"""
+    heights = [0] * GRID_WIDTH
+    holes = 0
+    for x in range(GRID_WIDTH):
+        bit = 1 << x
+        top = None
+        for y, mask in enumerate(row_masks):
+            if mask & bit:
+                if top is None:
+                    top = y
+            elif top is not None:
+                holes += 1
+        heights[x] = GRID_HEIGHT - top if top is not None else 0
+    bumpiness = sum(abs(heights[x] - heights[x + 1]) for x in range(GRID_WIDTH - 1))
+    return -0.51 * sum(heights) - 0.36 * holes - 0.18 * bumpiness
+
+def greedy_policy(game, rng):
+    """Try every rotation and column as a straight hard drop and keep the best resulting board"""
+    piece = game.current_piece
+    best = None
+    best_score = None
+    for rotation in range(ROTATION_COUNTS[piece.type]):
+        offsets = SHAPE_CELLS[piece.type][rotation]
+        for x in range(-min(dx for dx, _ in offsets), GRID_WIDTH - max(dx for dx, _ in offsets)):
+            candidate = Tetromino(piece.type, x, piece.y, rotation)
+            if not game.is_valid_position(candidate):
+                continue
+            landing_y = candidate.y + game.get_drop_distance(candidate)
+            
+            row_masks = list(game.row_masks)
+            for dx, dy in offsets:
+                if landing_y + dy >= 0:
+                    row_masks[landing_y + dy] |= 1 << (x + dx)
+            remaining = [mask for mask in row_masks if mask != FULL_ROW_MASK]
+            lines = GRID_HEIGHT - len(remaining)
+            row_masks = [0] * lines + remaining
+            
+            score = evaluate_board(row_masks) + 0.76 * lines
+            if best_score is None or score > best_score:
+                best, best_score = (rotation, x), score
+    return best
+
+POLICIES = {
+    'random': random_policy,
+    'greedy': greedy_policy,
+}
+
+def load_policy(spec):
+    """Resolve a built-in policy name or a 'module:function' path"""
+    if spec in POLICIES:
+        return POLICIES[spec]
+    module_name, _, attr = spec.partition(':')
+    if not attr:
+        raise ValueError(f"Unknown policy {spec!r}, expected one of {sorted(POLICIES)} or module:function")
+    return getattr(importlib.import_module(module_name), attr)
+
+def apply_placement(game, rotation, x):
+    """Steer the current piece to (rotation, x) with the normal movement rules, then hard drop"""
+    piece = game.current_piece
+    for _ in range(rotation % ROTATION_COUNTS[piece.type]):
+        game.rotate_piece(clockwise=True)
+    step = 1 if x > piece.x else -1
+    while piece.x != x and game.move_piece(step, 0):
+        pass
+    game.hard_drop()
+
+def play_game(seed, policy_spec='greedy', max_pieces=1000, ms_per_piece=1000):
+    """Play one headless game and return its statistics"""
+    policy = load_policy(policy_spec)
+    rng = random.Random(seed)
+    
+    game = TetrisGame(bitboard=True, seed=seed)
+    game.settings['particle_effects'] = False  # Nothing renders the effects
+    game.combo_delay = 0  # Nor the line clear animation, so play never holds for it
+    
+    while not game.game_over and game.pieces_placed < max_pieces:
+        # Let game time pass so buffs expire at a realistic pace, with the new piece
+        # waiting at its spawn for the policy rather than falling (and at high levels
+        # locking) before it gets a say
+        game.update(ms_per_piece, gravity=False)
+        if game.game_over or not game.current_piece:
+            continue
+        
+        placement = policy(game, rng)
+        if placement is None:
+            game.hard_drop()
+        else:
+            apply_placement(game, *placement)
+    
+    return {
+        'seed': seed,
+        'score': game.score,
+        'level': game.level,
+        'lines': game.lines_cleared,
+        'pieces': game.pieces_placed,
+        'game_over': game.game_over,
+        'golden_spawned': game.golden_cubes_spawned,
+        'golden_cleared': game.golden_cubes_cleared,
+        'buffs': dict(game.buff_activations),
+    }
+
+def summarize(values):
+    return {
+        'mean': statistics.fmean(values),
+        'median': statistics.median(values),
+        'stdev': statistics.pstdev(values),
+        'min': min(values),
+        'max': max(values),
+    }
+
+def aggregate(results, elapsed):
+    """Combine per-game results into one report"""
+    buffs = {}
+    for result in results:
+        for buff_type, count in result['buffs'].items():
+            buffs[buff_type] = buffs.get(buff_type, 0) + count
+    golden_spawned = sum(r['golden_spawned'] for r in results)
+    golden_cleared = sum(r['golden_cleared'] for r in results)
+    return {
+        'games': len(results),
+        'seconds': elapsed,
+        'games_per_second': len(results) / elapsed if elapsed > 0 else 0.0,
+        'score': summarize([r['score'] for r in results]),
+        'level': summarize([r['level'] for r in results]),
+        'lines': summarize([r['lines'] for r in results]),
+        'pieces': summarize([r['pieces'] for r in results]),
+        'game_over_rate': sum(r['game_over'] for r in results) / len(results),
+        'golden_spawned': golden_spawned,
+        'golden_cleared': golden_cleared,
+        'golden_per_game': golden_spawned / len(results),
+        'buff_activations': dict(sorted(buffs.items())),
+    }
+
+def run_batch(games, policy='greedy', seed=0, workers=None, max_pieces=1000, ms_per_piece=1000):
+    """Play `games` games on a process pool, game i using seed + i"""
+    seeds = range(seed, seed + games)
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, games // ((workers or os.cpu_count() or 1) * 4))
+        results = list(executor.map(play_game, seeds,
+                                    [policy] * games, [max_pieces] * games, [ms_per_piece] * games,
+                                    chunksize=chunksize))
+    return results, time.perf_counter() - start
+
+def format_report(report):
+    lines = [f"{report['games']} games in {report['seconds']:.1f}s ({report['games_per_second']:.1f} games/s)"]
+    for key in ('score', 'level', 'lines', 'pieces'):
+        s = report[key]
+        lines.append(f"{key:>7}: mean {s['mean']:.1f}  median {s['median']:.1f}  "
+                     f"stdev {s['stdev']:.1f}  min {s['min']}  max {s['max']}")
+    lines.append(f"game over rate: {report['game_over_rate']:.1%}")
+    lines.append(f"golden cubes: {report['golden_spawned']} spawned, {report['golden_cleared']} cleared "
+                 f"({report['golden_per_game']:.2f} spawned per game)")
+    lines.append("buff activations:")
+    for buff_type, count in report['buff_activations'].items():
+        lines.append(f"  {buff_type}: {count}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play headless Tetris games in parallel and report statistics")
+    parser.add_argument('--games', type=int, default=100, help="number of games to play")
+    parser.add_argument('--policy', default='greedy',
+                        help="placement policy: 'greedy', 'random' or module:function")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first game, game i uses seed + i")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--max-pieces', type=int, default=1000, help="stop a game after this many pieces")
+    parser.add_argument('--ms-per-piece', type=int, default=1000,
+                        help="simulated game time per piece, drives buff expiry")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args(argv)
+    
+    load_policy(args.policy)  # Fail fast on a bad policy name
+    results, elapsed = run_batch(args.games, args.policy, args.seed, args.workers,
+                                 args.max_pieces, args.ms_per_piece)
+    report = aggregate(results, elapsed)
+    
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print(format_report(report))
+
+if __name__ == "__main__":
+    main()
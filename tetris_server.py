@@ -0,0 +1,358 @@
+"""Game server: many TetrisGame sessions in one asyncio process.
+
+Every connection is one session with its own game. Clients send one JSON
+object per line and get JSON lines back:
+
+    {"op": "action", "action": "rotate_cw"}   one of tetris_engine.ACTIONS
+    {"op": "press", "action": "left"}         start holding one of HELD_ACTIONS
+    {"op": "release", "action": "left"}
+    {"op": "state"}                           -> {"op": "state", "time": ..., "score": ..., "rows": [...], ...}
+    {"op": "stats"}                           -> {"op": "stats", "sessions": ..., "session_bytes": ..., ...}
+
+On connect the server sends {"op": "welcome", "session": ..., "seed": ...},
+and {"op": "game_over", ...} whenever a game ends. Bad messages get an
+{"op": "error"} reply and the session carries on.
+
+There is no thread or timer per game. Games keep their own simulation
+clock, moved along from the event loop's monotonic clock, and one
+scheduler task wakes each game only when TetrisGame.next_update_due()
+says something happens: a gravity step, a held key repeating, a buff
+running out. Inputs are stamped with their arrival time. An idle game
+costs a couple of updates a second and a finished one nothing, so
+thousands of mostly idle sessions fit on one core.
+
+    python tetris_server.py --port 7777
+    python tetris_loadtest.py --clients 2000 --duration 30
+"""
+import argparse
+import asyncio
+import gc
+import heapq
+import itertools
+import json
+import random
+import sys
+import time
+from types import FunctionType, ModuleType
+
+try:
+    import resource
+except ImportError:  # Not on Windows, max RSS is left out of stats there
+    resource = None
+
+import tetris_engine
+from tetris_engine import ACTIONS, HELD_ACTIONS, TetrisGame
+
+DEFAULT_PORT = 7777
+# How often the scheduler looks for games that fell due, in milliseconds
+TICK_MS = 4
+# A client that lets this much of our output pile up unread is dropped
+WRITE_BUFFER_LIMIT = 256 * 1024
+# Sessions measured for the mean session size in stats
+MEMORY_SAMPLE = 16
+# Seconds between moving everything alive into the collector's permanent generation
+FREEZE_INTERVAL = 1.0
+# Closed sessions, at the least, before frozen connection garbage is swept (see freeze_objects)
+SWEEP_MIN_CLOSED = 1000
+
+def shared_objects(module=tetris_engine):
+    """ids of the module-level tables every game points into, left out of session sizes"""
+    seen = set()
+    stack = [value for value in vars(module).values()
+             if not isinstance(value, (type, ModuleType, FunctionType))]
+    while stack:
+        obj = stack.pop()
+        if id(obj) not in seen and not isinstance(obj, (type, ModuleType, FunctionType)):
+            seen.add(id(obj))
+            stack.extend(gc.get_referents(obj))
+    return seen
+
+def deep_sizeof(root, skip):
+    """Bytes of root and everything it references that is not in skip (ids) or shared code.
+    
+    Strings are not counted, a game only holds names that live in the code.
+    """
+    seen = set()
+    size = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or id(obj) in skip or isinstance(obj, (str, type, ModuleType, FunctionType)):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return size
+
+class Session:
+    """One connected player: the game, its output stream and its place in the schedule"""
+    __slots__ = ('id', 'game', 'writer', 'started', 'due', 'inputs', 'over_reported')
+    
+    def __init__(self, session_id, game, writer, started):
+        self.id = session_id
+        self.game = game
+        self.writer = writer
+        self.started = started  # Server time in ms at game time 0
+        self.due = None  # Server time of the next scheduled update, None when only input can change the game
+        self.inputs = 0
+        self.over_reported = False
+
+class GameServer:
+    def __init__(self, tick_ms=TICK_MS, max_sessions=10000, seed=None):
+        self.tick_ms = tick_ms
+        self.max_sessions = max_sessions
+        self.seeds = random.Random(seed)
+        self.sessions = {}
+        self.wakeups = []  # Heap of (server ms, session id), entries whose due moved on are skipped
+        self.session_ids = itertools.count(1)
+        self.shared = shared_objects()
+        self.epoch = None
+        self.updates = 0  # advance_to() calls made, by the scheduler and for inputs
+        self.max_lag_ms = 0  # Latest the scheduler has run a due update since the last stats
+        self.closed_since_sweep = 0
+        self.sweeps = 0
+        self.last_sweep_ms = 0
+        self.started_cpu = time.process_time()
+    
+    def now(self):
+        """Server time in whole milliseconds, from the event loop's monotonic clock"""
+        return int((asyncio.get_running_loop().time() - self.epoch) * 1000)
+    
+    def new_game(self, seed):
+        game = TetrisGame(bitboard=True, seed=seed, particle_capacity=0)
+        self.configure(game)
+        return game
+    
+    def configure(self, game):
+        game.settings['particle_effects'] = False  # Nobody here to see them, also after a restart
+    
+    def open_session(self, writer):
+        session = Session(next(self.session_ids), self.new_game(self.seeds.randrange(1 << 32)), writer, self.now())
+        self.sessions[session.id] = session
+        self.schedule(session, session.game.next_update_due())
+        self.send(session, {'op': 'welcome', 'session': session.id, 'seed': session.game.seed})
+        return session
+    
+    def close_session(self, session):
+        self.sessions.pop(session.id, None)
+        session.due = None
+        self.closed_since_sweep += 1
+    
+    def schedule(self, session, due):
+        """Wake the session at game time due, as given by next_update_due()"""
+        session.due = None if due is None else session.started + due
+        if session.due is not None:
+            heapq.heappush(self.wakeups, (session.due, session.id))
+    
+    def catch_up(self, session, now):
+        """Play the session's game through everything that fell due up to server time now.
+        
+        Returns the game time of the next update, session.due being current on entry.
+        """
+        game = session.game
+        target = now - session.started
+        due = None if session.due is None else session.due - session.started
+        while due is not None and due <= target:
+            game.advance_to(max(due, game.clock() + 1))
+            self.updates += 1
+            due = game.next_update_due()
+        self.report_game_over(session)
+        return due
+    
+    def report_game_over(self, session):
+        game = session.game
+        if game.game_over:
+            if not session.over_reported:
+                session.over_reported = True
+                self.send(session, {'op': 'game_over', 'score': game.score, 'lines': game.lines_cleared,
+                                    'level': game.level, 'time': game.clock()})
+        else:
+            session.over_reported = False
+    
+    def advance(self, session, now):
+        """Bring the session's game to server time now, ready for an input"""
+        self.catch_up(session, now)
+        game = session.game
+        if game.clock() < now - session.started:
+            game.advance_to(now - session.started)
+            self.updates += 1
+    
+    async def run_scheduler(self):
+        heap = self.wakeups
+        sessions = self.sessions
+        while True:
+            await asyncio.sleep(self.tick_ms / 1000)
+            now = self.now()
+            while heap and heap[0][0] <= now:
+                due, session_id = heapq.heappop(heap)
+                session = sessions.get(session_id)
+                if session is None or session.due != due:
+                    continue
+                self.max_lag_ms = max(self.max_lag_ms, now - due)
+                self.schedule(session, self.catch_up(session, now))
+    
+    def send(self, session, message):
+        writer = session.writer
+        if writer.is_closing():
+            return
+        writer.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+        if writer.transport.get_write_buffer_size() > WRITE_BUFFER_LIMIT:
+            writer.close()
+    
+    def handle_message(self, session, line):
+        try:
+            message = json.loads(line)
+            op = message['op']
+            action = message.get('action')
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.send(session, {'op': 'error', 'message': 'expected a JSON object with an "op"'})
+            return
+        
+        game = session.game
+        if op == 'action' and action in ACTIONS:
+            self.advance(session, self.now())
+            game.apply_action(action)
+            if action == 'restart':
+                self.configure(game)
+        elif op in ('press', 'release') and action in HELD_ACTIONS:
+            self.advance(session, self.now())
+            if op == 'press':
+                game.press(action)
+            elif action in game.held_actions:
+                game.release(action)
+        elif op == 'state':
+            self.advance(session, self.now())
+            self.send(session, self.state(session))
+            return
+        elif op == 'stats':
+            self.send(session, self.stats(session))
+            return
+        else:
+            self.send(session, {'op': 'error', 'message': f"unknown op or action: {line.strip()[:80]!r}"})
+            return
+        session.inputs += 1
+        self.schedule(session, game.next_update_due())
+        self.report_game_over(session)
+    
+    def state(self, session):
+        game = session.game
+        piece = game.current_piece
+        return {
+            'op': 'state', 'time': game.clock(), 'score': game.score, 'level': game.level,
+            'lines': game.lines_cleared, 'game_over': game.game_over, 'paused': game.paused,
+            'piece': [piece.type, piece.x, piece.y, piece.rotation] if piece else None,
+            'next': game.next_piece, 'hold': game.hold_piece,
+            'rows': game.row_masks, 'golden': game.golden_rows,
+        }
+    
+    def session_bytes(self, session):
+        return deep_sizeof(session.game, self.shared)
+    
+    def stats(self, session=None):
+        """Server load and memory; session_bytes is for the asking session, mean over a sample of all"""
+        sessions = list(self.sessions.values())
+        sample = random.sample(sessions, min(MEMORY_SAMPLE, len(sessions)))
+        stats = {
+            'op': 'stats', 'sessions': len(sessions),
+            'scheduled': sum(1 for s in sessions if s.due is not None),
+            'games_over': sum(1 for s in sessions if s.game.game_over),
+            'updates': self.updates, 'max_lag_ms': self.max_lag_ms,
+            'frozen_objects': gc.get_freeze_count(), 'gc_sweeps': self.sweeps, 'last_sweep_ms': self.last_sweep_ms,
+            'cpu_seconds': round(time.process_time() - self.started_cpu, 3),
+            'uptime_ms': self.now(),
+            'mean_session_bytes': round(sum(map(self.session_bytes, sample)) / len(sample)) if sample else 0,
+        }
+        if session is not None:
+            stats['session_bytes'] = self.session_bytes(session)
+        if resource is not None:
+            # Kilobytes on Linux, bytes on macOS
+            scale = 1 if sys.platform == 'darwin' else 1024
+            stats['max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        self.max_lag_ms = 0
+        return stats
+    
+    async def handle_client(self, reader, writer):
+        if len(self.sessions) >= self.max_sessions:
+            writer.write(b'{"op":"error","message":"server full"}\n')
+            writer.close()
+            return
+        session = self.open_session(writer)
+        try:
+            async for line in reader:
+                self.handle_message(session, line)
+                if writer.is_closing():
+                    break
+                if writer.transport.get_write_buffer_size():
+                    await writer.drain()
+        except (ConnectionError, ValueError):  # ValueError: a line past the reader's limit
+            pass
+        except asyncio.CancelledError:  # Server shutting down, end quietly
+            pass
+        finally:
+            self.close_session(session)
+            writer.close()
+    
+    async def serve(self, host='127.0.0.1', port=DEFAULT_PORT, unix=None, stats_interval=None):
+        self.epoch = asyncio.get_running_loop().time()
+        if unix:
+            server = await asyncio.start_unix_server(self.handle_client, unix, backlog=1024)
+            where = unix
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port, backlog=1024)
+            where = f"{host}:{port}"
+        print(f"listening on {where}", flush=True)
+        tasks = [asyncio.create_task(self.run_scheduler()), asyncio.create_task(self.freeze_objects())]
+        if stats_interval:
+            tasks.append(asyncio.create_task(self.report(stats_interval)))
+        async with server:
+            await server.serve_forever()
+    
+    async def freeze_objects(self):
+        """Keep long-lived games out of the cyclic garbage collector.
+        
+        Thousands of games are hundreds of thousands of lists and tuples, and a
+        full collection over them stalls every session for hundreds of
+        milliseconds. Games hold no reference cycles, so a closed session's
+        game is freed by reference counting even when frozen. asyncio's socket
+        transports do hold one (a bound method on themselves), so a connection
+        frozen while open outlives its close. Once closed sessions outnumber a
+        quarter of the live ones, the ratio CPython schedules its own full
+        collections by, everything is unfrozen, collected once and frozen again.
+        """
+        while True:
+            await asyncio.sleep(FREEZE_INTERVAL)
+            if self.closed_since_sweep >= max(SWEEP_MIN_CLOSED, len(self.sessions) // 4):
+                start = time.perf_counter()
+                gc.unfreeze()
+                gc.collect()
+                self.last_sweep_ms = round((time.perf_counter() - start) * 1000, 1)
+                self.sweeps += 1
+                self.closed_since_sweep = 0
+            gc.freeze()
+    
+    async def report(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            print(json.dumps(self.stats()), flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host many Tetris games over a line-based JSON protocol")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--tick-ms', type=int, default=TICK_MS,
+                        help=f"how often the scheduler runs games that fell due (default {TICK_MS})")
+    parser.add_argument('--max-sessions', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=None, help="seed the sequence of game seeds handed out")
+    parser.add_argument('--stats-interval', type=float, default=None, metavar='SECONDS',
+                        help="print server stats as a JSON line this often")
+    args = parser.parse_args(argv)
+    
+    server = GameServer(args.tick_ms, args.max_sessions, args.seed)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix, args.stats_interval))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""Delta-compressed game state snapshots for spectators and remote clients.
+
+SnapshotEncoder turns a game into one frame per tick. A keyframe holds
+everything a viewer draws, a delta only the fields and board rows that
+changed since the previous frame. Keyframes go out every
+keyframe_interval frames, and keyframe() builds one on demand for a viewer
+joining mid-stream, so one encoded stream fans out to any number of
+spectators. SnapshotDecoder applies frames to a GameView, which has the
+attributes and methods the pygame renderer reads from a TetrisGame.
+
+Frame layout, integers are LEB128 varints as in tetris_replay:
+
+    kind byte (FRAME_KEY or FRAME_DELTA), sequence number byte
+    game time: absolute in keyframes, since the previous frame in deltas
+    field mask, then every field whose bit is set, in FIELD_* order
+    rows field: changed row count, then per row its y, cells (3 bits per
+    column, the engine's CELL_CODES) and golden mask
+
+Rows are sent as they show on screen, with the rows of a running line
+clear animation still in place, and the ghost piece's y travels with the
+piece, so a view needs none of the game rules.
+
+    python tetris_snapshot.py                       # stream self-play, report bytes/s and encode times
+    python tetris_snapshot.py --ticks 20000 --keyframe-interval 120
+"""
+import argparse
+import json
+import random
+import time
+
+from tetris_engine import (
+    GRID_WIDTH, GRID_HEIGHT, GAME_WIDTH, GAME_HEIGHT, BUFF_TYPES, BUFF_CODES, BUFF_NAMES, CELL_CODES, CELL_COLORS,
+    PIECE_CODES, PIECE_NAMES, Tetromino, TetrisGame,
+)
+from tetris_particles import make_particle_system
+from tetris_replay import read_varint, write_varint
+
+FRAME_KEY = 0x4b
+FRAME_DELTA = 0x44
+KEYFRAME_INTERVAL = 300  # Frames, 5 seconds at 60 ticks per second
+
+# Field mask bits
+FIELD_SCORE = 1 << 0
+FIELD_LEVEL = 1 << 1
+FIELD_LINES = 1 << 2
+FIELD_PIECE = 1 << 3  # Current piece and its ghost y
+FIELD_NEXT = 1 << 4
+FIELD_HOLD = 1 << 5  # Hold piece and can_hold
+FIELD_FLAGS = 1 << 6  # game_over, paused
+FIELD_GOLDEN = 1 << 7  # golden_count
+FIELD_BUFFS = 1 << 8
+FIELD_ROWS = 1 << 9
+ALL_FIELDS = (FIELD_ROWS << 1) - 1
+
+class SnapshotError(ValueError):
+    """A frame cannot be applied: malformed, or a delta that does not follow the decoder's last frame"""
+
+def zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+def row_code(row):
+    code = 0
+    for x, color in enumerate(row):
+        if color is not None:
+            code |= CELL_CODES[color] << 3 * x
+    return code
+
+def decode_row(code):
+    return [CELL_COLORS[code >> 3 * x & 7] for x in range(GRID_WIDTH)]
+
+class SnapshotEncoder:
+    """Encodes successive states of one game as a keyframe followed by deltas"""
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.sequence = -1
+        self.since_keyframe = 0
+        # State of the last encoded frame
+        self.time = None
+        self.fields = None
+        self.rows = None
+        # What the rows were built from, they are rebuilt only when this changes
+        self.board_version = None
+        self.golden_source = None
+    
+    def capture_fields(self, game):
+        piece = game.current_piece
+        return (
+            game.score, game.level, game.lines_cleared,
+            (piece.type, piece.x, piece.y, piece.rotation, game.get_ghost_position()) if piece else None,
+            game.next_piece, (game.hold_piece, game.can_hold), (game.game_over, game.paused),
+            game.golden_count,
+            tuple((buff_type, data['start_time'], data['duration']) for buff_type, data in game.active_buffs.items()),
+        )
+    
+    def capture_rows(self, game):
+        """(cells code, golden mask) per row as drawn, reusing the last rows while the board is unchanged"""
+        # Golden cubes can spawn without a board_version change, so their masks are compared too
+        if game.board_version == self.board_version and game.golden_rows == self.golden_source:
+            return self.rows
+        self.board_version = game.board_version
+        self.golden_source = list(game.golden_rows)
+        grid, golden_rows = game.board_rows()
+        return [(row_code(row), golden) for row, golden in zip(grid, golden_rows)]
+    
+    def encode(self, game):
+        """Frame for the game's current state: a delta, or a keyframe when one is due"""
+        now = game.clock()
+        fields = self.capture_fields(game)
+        rows = self.capture_rows(game)
+        self.sequence = (self.sequence + 1) & 0xff
+        self.since_keyframe += 1
+        if self.fields is None or self.since_keyframe >= self.keyframe_interval or now < self.time:
+            self.time, self.fields, self.rows = now, fields, rows
+            self.since_keyframe = 0
+            return self.keyframe()
+        
+        mask = 0
+        old = self.fields
+        for i in range(len(fields)):
+            if fields[i] != old[i]:
+                mask |= 1 << i
+        changed = ()
+        if rows is not self.rows:
+            old_rows = self.rows
+            changed = [y for y in range(GRID_HEIGHT) if rows[y] != old_rows[y]]
+            if changed:
+                mask |= FIELD_ROWS
+        
+        buffer = bytearray((FRAME_DELTA, self.sequence))
+        write_varint(buffer, now - self.time)
+        write_varint(buffer, mask)
+        if mask:
+            write_fields(buffer, mask, fields, now)
+            if changed:
+                write_rows(buffer, rows, changed)
+        self.time, self.fields, self.rows = now, fields, rows
+        return bytes(buffer)
+    
+    def keyframe(self):
+        """Keyframe of the last encoded state, for a viewer joining the stream after it"""
+        if self.fields is None:
+            raise ValueError("no state encoded yet")
+        buffer = bytearray((FRAME_KEY, self.sequence))
+        write_varint(buffer, self.time)
+        write_varint(buffer, ALL_FIELDS)
+        write_fields(buffer, ALL_FIELDS, self.fields, self.time)
+        write_rows(buffer, self.rows, range(GRID_HEIGHT))
+        return bytes(buffer)
+
+def write_fields(buffer, mask, fields, now):
+    score, level, lines, piece, next_piece, (hold, can_hold), (game_over, paused), golden_count, buffs = fields
+    if mask & FIELD_SCORE:
+        write_varint(buffer, score)
+    if mask & FIELD_LEVEL:
+        write_varint(buffer, level)
+    if mask & FIELD_LINES:
+        write_varint(buffer, lines)
+    if mask & FIELD_PIECE:
+        if piece is None:
+            buffer.append(0)
+        else:
+            piece_type, x, y, rotation, ghost_y = piece
+            buffer.append(PIECE_CODES[piece_type] | rotation << 4)
+            write_varint(buffer, zigzag(x))
+            write_varint(buffer, zigzag(y))
+            write_varint(buffer, zigzag(ghost_y))
+    if mask & FIELD_NEXT:
+        buffer.append(PIECE_CODES[next_piece])
+    if mask & FIELD_HOLD:
+        buffer.append(PIECE_CODES[hold] | can_hold << 4)
+    if mask & FIELD_FLAGS:
+        buffer.append(game_over | paused << 1)
+    if mask & FIELD_GOLDEN:
+        write_varint(buffer, golden_count)
+    if mask & FIELD_BUFFS:
+        buffer.append(len(buffs))
+        for buff_type, start_time, duration in buffs:
+            buffer.append(BUFF_CODES[buff_type])
+            write_varint(buffer, zigzag(now - start_time))  # Age, a small number while the buff runs
+            write_varint(buffer, duration)
+
+def write_rows(buffer, rows, ys):
+    buffer.append(len(ys))
+    for y in ys:
+        code, golden = rows[y]
+        buffer.append(y)
+        write_varint(buffer, code)
+        write_varint(buffer, golden)
+
+class GameView:
+    """A game as a remote viewer knows it, with the TetrisGame attributes the renderer reads"""
+    def __init__(self):
+        self.time = 0
+        self.grid = [[None] * GRID_WIDTH for _ in range(GRID_HEIGHT)]
+        self.golden_rows = [0] * GRID_HEIGHT
+        self.board_version = 0
+        self.score = 0
+        self.level = 1
+        self.lines_cleared = 0
+        self.current_piece = None
+        self.ghost_y = None
+        self.next_piece = None
+        self.hold_piece = None
+        self.can_hold = True
+        self.game_over = False
+        self.paused = False
+        self.in_settings = False
+        self.golden_count = 0
+        self.active_buffs = {}
+        self.buff_types = BUFF_TYPES
+        # Particles are effects of the simulation and are not streamed
+        self.particles = make_particle_system(GAME_WIDTH, GAME_HEIGHT, 0)
+        self.settings = {'particle_density': 1.0, 'particle_lifetime': 1.0,
+                         'particle_effects': False, 'show_particles': False}
+    
+    def clock(self):
+        return self.time
+    
+    def board_rows(self):
+        return self.grid, self.golden_rows
+    
+    def get_ghost_position(self):
+        return self.ghost_y
+
+class SnapshotDecoder:
+    """Applies a stream of frames to one GameView.
+    
+    A delta is only accepted right after the frame it was encoded against;
+    after a lost or out of order frame apply() raises SnapshotError and keeps
+    refusing deltas until the next keyframe.
+    """
+    def __init__(self, view=None):
+        self.view = view if view is not None else GameView()
+        self.sequence = None  # Sequence number of the last applied frame, None until a keyframe
+    
+    def apply(self, data):
+        """Apply one frame and return the view"""
+        try:
+            kind, sequence = data[0], data[1]
+            if kind == FRAME_DELTA:
+                if self.sequence is None:
+                    raise SnapshotError("delta frame without a keyframe before it")
+                if sequence != (self.sequence + 1) & 0xff:
+                    last, self.sequence = self.sequence, None
+                    raise SnapshotError(f"delta frame {sequence} does not follow frame {last}, waiting for a keyframe")
+            elif kind != FRAME_KEY:
+                raise SnapshotError(f"unknown frame kind {kind:#x}")
+            view = self.view
+            value, pos = read_varint(data, 2)
+            view.time = value if kind == FRAME_KEY else view.time + value
+            mask, pos = read_varint(data, pos)
+            if mask:
+                pos = self.read_fields(data, pos, mask)
+            if pos != len(data):
+                raise SnapshotError(f"{len(data) - pos} unread bytes at the end of a frame")
+        except (IndexError, KeyError) as e:
+            self.sequence = None
+            raise SnapshotError(f"truncated or malformed frame ({e!r})") from None
+        self.sequence = sequence
+        return view
+    
+    def read_fields(self, data, pos, mask):
+        view = self.view
+        if mask & FIELD_SCORE:
+            view.score, pos = read_varint(data, pos)
+        if mask & FIELD_LEVEL:
+            view.level, pos = read_varint(data, pos)
+        if mask & FIELD_LINES:
+            view.lines_cleared, pos = read_varint(data, pos)
+        if mask & FIELD_PIECE:
+            code = data[pos]
+            pos += 1
+            if code:
+                x, pos = read_varint(data, pos)
+                y, pos = read_varint(data, pos)
+                ghost_y, pos = read_varint(data, pos)
+                view.current_piece = Tetromino(PIECE_NAMES[code & 15], unzigzag(x), unzigzag(y), code >> 4)
+                view.ghost_y = unzigzag(ghost_y)
+            else:
+                view.current_piece = None
+                view.ghost_y = None
+        if mask & FIELD_NEXT:
+            code = data[pos]
+            pos += 1
+            view.next_piece = PIECE_NAMES[code]
+        if mask & FIELD_HOLD:
+            code = data[pos]
+            pos += 1
+            view.hold_piece = PIECE_NAMES[code & 15]
+            view.can_hold = bool(code >> 4)
+        if mask & FIELD_FLAGS:
+            flags = data[pos]
+            pos += 1
+            view.game_over = bool(flags & 1)
+            view.paused = bool(flags & 2)
+        if mask & FIELD_GOLDEN:
+            view.golden_count, pos = read_varint(data, pos)
+        if mask & FIELD_BUFFS:
+            count = data[pos]
+            pos += 1
+            buffs = {}
+            for _ in range(count):
+                buff_type = BUFF_NAMES[data[pos]]
+                age, pos = read_varint(data, pos + 1)
+                duration, pos = read_varint(data, pos)
+                buffs[buff_type] = {'start_time': view.time - unzigzag(age), 'duration': duration}
+            view.active_buffs = buffs
+        if mask & FIELD_ROWS:
+            count = data[pos]
+            pos += 1
+            for _ in range(count):
+                y = data[pos]
+                code, pos = read_varint(data, pos + 1)
+                golden, pos = read_varint(data, pos)
+                view.grid[y] = decode_row(code)
+                view.golden_rows[y] = golden
+            view.board_version += 1
+        return pos
+
+def full_state(game):
+    """What a viewer draws as plain JSON, the whole state every time, for comparison"""
+    piece = game.current_piece
+    grid, golden_rows = game.board_rows()
+    return json.dumps({
+        'time': game.clock(),
+        'grid': grid,
+        'golden_cubes': [(x, y) for y, mask in enumerate(golden_rows) for x in range(GRID_WIDTH) if mask >> x & 1],
+        'active_buffs': game.active_buffs,
+        'piece': (piece.type, piece.x, piece.y, piece.rotation) if piece else None,
+        'ghost_y': game.get_ghost_position(),
+        'next': game.next_piece, 'hold': game.hold_piece, 'can_hold': game.can_hold,
+        'score': game.score, 'level': game.level, 'lines': game.lines_cleared,
+        'golden_count': game.golden_count, 'game_over': game.game_over, 'paused': game.paused,
+    }, separators=(',', ':')).encode()
+
+def view_mismatches(view, game):
+    """Names of the attributes a view draws that differ from the game's"""
+    mismatches = [name for name in ('score', 'level', 'lines_cleared', 'next_piece', 'hold_piece', 'can_hold',
+                                    'game_over', 'paused', 'golden_count', 'active_buffs')
+                  if getattr(view, name) != getattr(game, name)]
+    if view.clock() != game.clock():
+        mismatches.append('clock')
+    if view.board_rows() != game.board_rows():
+        mismatches.append('board_rows')
+    piece, seen = game.current_piece, view.current_piece
+    if (piece and (piece.type, piece.x, piece.y, piece.rotation)) != (seen and (seen.type, seen.x, seen.y, seen.rotation)):
+        mismatches.append('current_piece')
+    if view.get_ghost_position() != game.get_ghost_position():
+        mismatches.append('ghost')
+    return mismatches
+
+def stream_selfplay(ticks, tick_ms, keyframe_interval, inputs_per_second, seed):
+    """Play greedy self-play at a human input pace, encoding and decoding every tick.
+    
+    Returns byte counts and best-effort timings; every decoded view is
+    checked against the game, outside the timings.
+    """
+    from tetris_selfplay import greedy_policy
+    
+    rng = random.Random(seed)
+    game = TetrisGame(bitboard=True, seed=seed, particle_capacity=0)
+    encoder = SnapshotEncoder(keyframe_interval)
+    decoder = SnapshotDecoder()
+    ticks_per_input = max(1, round(1000 / inputs_per_second / tick_ms))
+    target = None
+    totals = {'delta_bytes': 0, 'keyframes': 0, 'keyframe_bytes': 0, 'json_bytes': 0,
+              'encode_s': 0.0, 'decode_s': 0.0, 'json_s': 0.0, 'games': 1}
+    perf_counter = time.perf_counter
+    for tick in range(ticks):
+        if game.game_over:
+            game.restart()
+            totals['games'] += 1
+        piece = game.current_piece
+        if piece is None:
+            target = None
+        elif tick % ticks_per_input == 0:
+            # One input at a time towards the greedy placement, as a player would steer
+            if target is None or target[0] is not piece:
+                target = (piece, *(greedy_policy(game, rng) or (piece.rotation, piece.x)))
+            _, rotation, x = target
+            if piece.rotation != rotation:
+                if not game.rotate_piece(clockwise=True):
+                    target = (piece, piece.rotation, x)  # Blocked, drop it as it is
+            elif piece.x != x:
+                if not game.move_piece(1 if x > piece.x else -1, 0):
+                    target = (piece, rotation, piece.x)
+            else:
+                game.hard_drop()
+        game.update(tick_ms)
+        
+        start = perf_counter()
+        frame = encoder.encode(game)
+        encoded = perf_counter()
+        decoder.apply(frame)
+        decoded = perf_counter()
+        state = full_state(game)
+        totals['json_s'] += perf_counter() - decoded
+        totals['encode_s'] += encoded - start
+        totals['decode_s'] += decoded - encoded
+        
+        totals['delta_bytes'] += len(frame)
+        totals['json_bytes'] += len(state)
+        if frame[0] == FRAME_KEY:
+            totals['keyframes'] += 1
+            totals['keyframe_bytes'] += len(frame)
+        else:
+            totals['keyframe_bytes'] += len(encoder.keyframe())
+        mismatches = view_mismatches(decoder.view, game)
+        if mismatches:
+            raise AssertionError(f"tick {tick}: decoded view differs in {', '.join(mismatches)}")
+    return totals
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure snapshot stream size and codec speed on a self-play game")
+    parser.add_argument('--ticks', type=int, default=36000, help="ticks to stream (36000 is 10 minutes at 60 Hz)")
+    parser.add_argument('--tick-ms', type=int, default=16)
+    parser.add_argument('--keyframe-interval', type=int, default=KEYFRAME_INTERVAL, help="frames between keyframes")
+    parser.add_argument('--inputs-per-second', type=float, default=8, help="pace the bot steers pieces at")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    
+    totals = stream_selfplay(args.ticks, args.tick_ms, args.keyframe_interval, args.inputs_per_second, args.seed)
+    seconds = args.ticks * args.tick_ms / 1000
+    ticks = args.ticks
+    print(f"{ticks} ticks, {seconds:.0f}s of play over {totals['games']} game(s), "
+          f"every decoded view matched its game")
+    print(f"{'stream':<22} {'bytes/tick':>10} {'bytes/s':>10} {'encode us/tick':>15} {'decode us/tick':>15}")
+    rows = (
+        ('delta + keyframes', totals['delta_bytes'], totals['encode_s'], totals['decode_s']),
+        ('keyframes only', totals['keyframe_bytes'], None, None),
+        ('full JSON state', totals['json_bytes'], totals['json_s'], None),
+    )
+    for name, size, encode_s, decode_s in rows:
+        encode_us = f"{encode_s / ticks * 1e6:.2f}" if encode_s is not None else '-'
+        decode_us = f"{decode_s / ticks * 1e6:.2f}" if decode_s is not None else '-'
+        print(f"{name:<22} {size / ticks:>10.1f} {size / seconds:>10.0f} {encode_us:>15} {decode_us:>15}")
+    print(f"{totals['keyframes']} keyframes, delta stream is {totals['json_bytes'] / totals['delta_bytes']:.0f}x "
+          f"smaller than full JSON state")
+
+if __name__ == "__main__":
+    main()
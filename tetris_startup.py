@@ -0,0 +1,133 @@
+"""Startup benchmark: time from launching the game to its first frame on screen.
+
+Each run starts the game in a fresh process with --startup-report
+--max-frames 1. The wall time is measured from spawning the process to the
+report, so it also covers interpreter startup and, for a frozen build, the
+bootloader unpacking the executable. Windowed frozen builds have no
+stdout, their wall time runs to process exit instead. The first launch
+only warms the OS file cache and is not counted, the medians of the rest
+are reported.
+
+    python tetris_startup.py                               # python tetris_pygame.py
+    python tetris_startup.py --exe dist/tetris_pygame      # the PyInstaller build
+    python tetris_startup.py --save startup.json           # store a baseline
+    python tetris_startup.py --compare startup.json        # exit 1 if anything got >20% slower
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from tetris_bench import BASELINE_VERSION, environment
+
+GAME_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tetris_pygame.py')
+# Steps shorter than this in the baseline are shown but never flagged, launch noise swamps them
+NOISE_FLOOR_MS = 5
+
+def launch(command, env):
+    """Start the game once, return the wall time and the reported step times, in seconds"""
+    start = time.perf_counter()
+    process = subprocess.Popen(command + ['--startup-report', '--max-frames', '1'],
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env, text=True)
+    wall = None
+    steps = {}
+    in_report = False
+    for line in process.stdout:
+        fields = line.split()
+        if fields[:1] == ['startup']:
+            in_report = True
+        elif in_report and len(fields) == 3:
+            steps[fields[0]] = float(fields[1]) / 1000
+            if fields[0] == 'first_frame':
+                wall = time.perf_counter() - start
+    if process.wait() != 0:
+        raise RuntimeError(f"{' '.join(command)} exited with status {process.returncode}")
+    if wall is None:
+        wall = time.perf_counter() - start
+    return wall, steps
+
+def run_launches(command, env, runs):
+    """Median wall and step times over `runs` launches, as benchmark results"""
+    launch(command, env)  # Warm the file cache
+    walls = []
+    samples = {}
+    for _ in range(runs):
+        wall, steps = launch(command, env)
+        walls.append(wall)
+        for step, seconds in steps.items():
+            samples.setdefault(step, []).append(seconds)
+    
+    results = {'startup.first_frame_wall': {'ns_per_op': statistics.median(walls) * 1e9}}
+    for step, values in samples.items():
+        results[f"startup.{step}"] = {'ns_per_op': statistics.median(values) * 1e9}
+    for name, result in results.items():
+        print(f"{name:<34} {result['ns_per_op'] / 1e6:>10.1f} ms")
+    return results
+
+def compare(results, baseline, threshold):
+    """Return report lines and the steps that regressed beyond threshold"""
+    lines = []
+    regressions = []
+    for name, result in results.items():
+        ms = result['ns_per_op'] / 1e6
+        base = baseline['results'].get(name)
+        if base is None:
+            lines.append(f"{name:<34} {ms:>10.1f} ms  (new)")
+            continue
+        base_ms = base['ns_per_op'] / 1e6
+        ratio = ms / base_ms
+        flag = ''
+        if ratio > 1 + threshold and base_ms >= NOISE_FLOOR_MS:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        lines.append(f"{name:<34} {ms:>10.1f} ms  baseline {base_ms:>10.1f}  {ratio:>5.2f}x{flag}")
+    return lines, regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time launches of the game up to its first frame")
+    parser.add_argument('--exe', metavar='PATH', help="launch this frozen build instead of tetris_pygame.py")
+    parser.add_argument('--runs', type=int, default=10, help="timed launches, the medians are kept")
+    parser.add_argument('--headless', action='store_true',
+                        help="use SDL's dummy video and audio drivers, no window opens")
+    parser.add_argument('--save', metavar='PATH', help="write results as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="compare with a baseline, exit 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=0.20,
+                        help="allowed slowdown before a step counts as regressed (default 0.20 = 20%%)")
+    args = parser.parse_args(argv)
+    
+    command = [args.exe] if args.exe else [sys.executable, GAME_SCRIPT]
+    env = dict(os.environ)
+    if args.headless:
+        env['SDL_VIDEODRIVER'] = 'dummy'
+        env['SDL_AUDIODRIVER'] = 'dummy'
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('version') != BASELINE_VERSION:
+            parser.error(f"{args.compare}: unsupported baseline version {baseline.get('version')!r}")
+    
+    results = run_launches(command, env, args.runs)
+    
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'version': BASELINE_VERSION, 'environment': environment(), 'results': results}, f, indent=2)
+    
+    if baseline is None:
+        return
+    if baseline.get('environment') != environment():
+        print(f"note: baseline was recorded on {baseline.get('environment')}", file=sys.stderr)
+    lines, regressions = compare(results, baseline, args.threshold)
+    print()
+    print("\n".join(lines))
+    if regressions:
+        print(f"{len(regressions)} startup step(s) regressed by more than {args.threshold:.0%}: "
+              f"{', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()